@@ -0,0 +1,180 @@
+"""
+Static asset pipeline: fingerprinting, precompression and serving
+
+Run `python -m app.assets` as a build step, or let `start_app` build on
+startup. Source assets in app/assets are copied to static/build under a
+content-hashed name, and every compressible file under static gets .gz and
+(when the brotli package is installed) .br siblings. Files in static/build
+left over from earlier builds are deleted.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import stat
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+SOURCE_DIR = os.path.join(os.path.dirname(__file__), 'assets')
+STATIC_DIR = 'static'
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST_NAME = 'manifest.json'
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.json', '.svg', '.html', '.txt', '.xml', '.map', '.ico'}
+MIN_COMPRESS_SIZE = 256
+FINGERPRINT_PATTERN = re.compile(r'\.[0-9a-f]{12}\.[a-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest: Optional[Dict[str, str]] = None
+
+def build_assets(source_dir: str = SOURCE_DIR, static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Fingerprint source assets, precompress static files and write the manifest"""
+    global _manifest
+    build_dir = os.path.join(static_dir, 'build')
+    os.makedirs(build_dir, exist_ok=True)
+
+    manifest = {}
+    for name in sorted(os.listdir(source_dir)):
+        source_path = os.path.join(source_dir, name)
+        if not os.path.isfile(source_path):
+            continue
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        stem, extension = os.path.splitext(name)
+        hashed_name = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        target_path = os.path.join(build_dir, hashed_name)
+        if not os.path.exists(target_path):
+            with open(target_path, 'wb') as f:
+                f.write(data)
+        manifest[name] = f'/static/build/{hashed_name}'
+    prune_build(build_dir, manifest)
+
+    for root, _, names in os.walk(static_dir):
+        for name in names:
+            precompress(os.path.join(root, name))
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    _manifest = manifest
+    return manifest
+
+def prune_build(build_dir: str, manifest: Dict[str, str]) -> List[str]:
+    """Delete files under `build_dir` that `manifest` no longer refers to, returning their names"""
+    current = {MANIFEST_NAME, *(os.path.basename(url) for url in manifest.values())}
+    keep = current | {name + suffix for name in current for _, suffix in ENCODINGS}
+    removed = []
+    for name in sorted(os.listdir(build_dir)):
+        path = os.path.join(build_dir, name)
+        if name not in keep and os.path.isfile(path):
+            os.remove(path)
+            removed.append(name)
+    return removed
+
+def precompress(path: str):
+    """Write .gz and .br siblings of a file when they are missing or stale"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return
+    mtime = os.path.getmtime(path)
+    data = None
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        with open(target, 'wb') as f:
+            f.write(compressed)
+
+def asset_url(name: str) -> str:
+    """URL of the fingerprinted build of a source asset"""
+    global _manifest
+    if _manifest is None:
+        manifest_path = os.path.join(BUILD_DIR, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                _manifest = json.load(f)
+        else:
+            build_assets()
+    return _manifest[name]
+
+def parse_accept(header: str) -> Dict[str, float]:
+    """Values listed in an Accept or Accept-Encoding header, with their q-values"""
+    accepted = {}
+    for part in header.split(','):
+        item, *params = part.split(';')
+        item = item.strip().lower()
+        if not item:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = max(0.0, min(1.0, float(value)))
+                except ValueError:
+                    quality = 0.0
+        accepted[item] = quality
+    return accepted
+
+def negotiate_encodings(header: str) -> List[Tuple[str, str]]:
+    """Precompressed (encoding, suffix) pairs the client accepts, most preferred first
+
+    Encodings with q=0 are refused, `*` stands for any encoding not listed,
+    and equal q-values keep the server's order of ENCODINGS.
+    """
+    accepted = parse_accept(header)
+    wildcard = accepted.get('*', 0.0)
+    ranked = [(accepted.get(encoding, wildcard), encoding, suffix) for encoding, suffix in ENCODINGS]
+    ranked = sorted((entry for entry in ranked if entry[0] > 0), key=lambda entry: -entry[0])
+    return [(encoding, suffix) for _, encoding, suffix in ranked]
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings when the client accepts them
+
+    Fingerprinted files are served with an immutable Cache-Control header, so
+    repeat visitors never re-request them.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        accept_encoding = Headers(scope=scope).get('accept-encoding', '')
+        for encoding, suffix in negotiate_encodings(accept_encoding):
+            full_path, stat_result = self.lookup_path(path + suffix)
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers['content-type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                response.headers['content-encoding'] = encoding
+                return self._with_cache_headers(path, response)
+        response = await super().get_response(path, scope)
+        return self._with_cache_headers(path, response)
+
+    @staticmethod
+    def _with_cache_headers(path: str, response: Response) -> Response:
+        response.headers['vary'] = 'Accept-Encoding'
+        if FINGERPRINT_PATTERN.search(path) and response.status_code in (200, 304):
+            response.headers['cache-control'] = IMMUTABLE
+        return response
+
+if __name__ == "__main__":
+    for logical, url in build_assets().items():
+        print(f"{logical} -> {url}")
@@ -0,0 +1,12 @@
+// Filter buttons are plain HTML shared by every visitor of the store page.
+// Clicks highlight the selection here and reach the server as one "filter"
+// event; buttons marked data-toggle clear their group when clicked again.
+document.addEventListener("click", (event) => {
+  const button = event.target.closest("[data-filter]");
+  if (!button) return;
+  const group = button.dataset.filter;
+  const cleared = button.dataset.toggle !== undefined && button.classList.contains("active");
+  document.querySelectorAll(`[data-filter="${group}"]`).forEach((other) => other.classList.remove("active"));
+  if (!cleared) button.classList.add("active");
+  emitEvent("filter", { group: group, value: cleared ? null : button.dataset.value });
+});
@@ -0,0 +1,120 @@
+"""Cart sidebar component"""
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from nicegui import ui
+
+from core.cart import CartItem
+from core.orders import OrderTotals, to_money
+from models.product import Product
+
+class CartSidebar:
+    """Slide-in cart with quantities, totals and low-stock warnings
+
+    `show` is called whenever the cart or its products change. Only the item
+    list and suggestions are rebuilt, and only when their contents differ
+    from what is shown; the totals are updated in place.
+    """
+
+    def __init__(
+        self,
+        container: ui.element,
+        on_quantity: Callable[[str, int], None],
+        on_close: Optional[Callable] = None,
+        on_add: Optional[Callable[[Product], None]] = None
+    ):
+        self.container = container
+        self.on_quantity = on_quantity
+        self.on_add = on_add
+        self._shown_items: Optional[tuple] = None
+        self._shown_suggestions: Optional[tuple] = None
+
+        with container.classes('p-6 gap-4'):
+            with ui.row().classes('w-full justify-between items-center'):
+                ui.label('Your Cart').classes('text-2xl font-bold')
+                ui.button(icon='close', on_click=on_close).props('flat round')
+            self.items = ui.column().classes('w-full gap-3')
+            ui.separator()
+            self.subtotal = self._total_row('Subtotal')
+            self.tax = self._total_row('Tax')
+            self.total = self._total_row('Total', 'text-xl font-bold')
+            self.checkout = ui.button('Checkout', on_click=lambda: ui.navigate.to('/checkout')) \
+                .classes('w-full mt-4 bg-orange-500 text-white py-3 font-bold rounded-lg')
+            self.suggestions = ui.column().classes('w-full gap-2 mt-4')
+
+    @staticmethod
+    def _total_row(label: str, classes: str = '') -> ui.label:
+        with ui.row().classes(f'w-full justify-between items-center {classes}'):
+            ui.label(f'{label}:')
+            return ui.label('$0.00')
+
+    def show(
+        self,
+        items: List[CartItem],
+        totals: OrderTotals,
+        low_stock: Dict[str, int],
+        suggestions: Sequence[Product] = ()
+    ):
+        """Display cart items; `low_stock` maps product ids to units still available"""
+        shown = tuple(
+            (item.product.id, item.product.name, to_money(item.product.price), item.quantity, low_stock.get(item.product.id))
+            for item in items
+        )
+        if shown != self._shown_items:
+            self._shown_items = shown
+            self._render_items(shown)
+        self.subtotal.set_text(f'${totals.subtotal}')
+        self.tax.set_text(f'${totals.tax}')
+        self.total.set_text(f'${totals.total}')
+        self.checkout.set_enabled(bool(items))
+        shown_suggestions = tuple((product.id, product.name, to_money(product.price)) for product in suggestions)
+        if shown_suggestions != self._shown_suggestions:
+            self._shown_suggestions = shown_suggestions
+            self._render_suggestions(suggestions)
+
+    def _render_items(self, shown: tuple):
+        self.items.clear()
+        with self.items:
+            if not shown:
+                ui.label('Your cart is empty').classes('text-gray-500 py-8 text-center w-full')
+                return
+            for product_id, name, price, quantity, available in shown:
+                with ui.row().classes('w-full items-center justify-between border-b pb-3'):
+                    with ui.column().classes('gap-0 flex-1'):
+                        ui.label(name).classes('font-semibold')
+                        ui.label(f'${price * quantity}').classes('text-gray-600')
+                        if available is not None:
+                            warning = 'Out of stock' if available == 0 else f'Only {available} left'
+                            ui.label(warning).classes('text-sm text-red-600 font-semibold')
+                    with ui.row().classes('items-center gap-1'):
+                        ui.button(icon='remove', on_click=lambda p=product_id, q=quantity: self.on_quantity(p, q - 1)) \
+                            .props('flat round dense')
+                        ui.label(str(quantity)).classes('w-6 text-center')
+                        ui.button(icon='add', on_click=lambda p=product_id, q=quantity: self.on_quantity(p, q + 1)) \
+                            .props('flat round dense')
+                        ui.button(icon='delete', on_click=lambda p=product_id: self.on_quantity(p, 0)) \
+                            .props('flat round dense').classes('text-gray-500')
+
+    def _render_suggestions(self, suggestions: Sequence[Product]):
+        self.suggestions.clear()
+        if not suggestions:
+            return
+        with self.suggestions:
+            ui.label('You may also like').classes('font-semibold text-gray-700')
+            for product in suggestions:
+                with ui.row().classes('w-full items-center justify-between'):
+                    with ui.column().classes('gap-0 flex-1'):
+                        ui.label(product.name).classes('text-sm font-semibold')
+                        ui.label(f'${to_money(product.price)}').classes('text-sm text-gray-600')
+                    if self.on_add is not None:
+                        ui.button(icon='add_shopping_cart', on_click=lambda p=product: self.on_add(p)) \
+                            .props('flat round dense')
+
+async def create_cart_sidebar(
+    container: ui.element,
+    on_quantity: Callable[[str, int], None],
+    on_close: Optional[Callable] = None,
+    on_add: Optional[Callable[[Product], None]] = None
+) -> CartSidebar:
+    """Create the cart sidebar inside `container`"""
+    return CartSidebar(container, on_quantity, on_close, on_add)
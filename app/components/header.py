@@ -1,28 +1,40 @@
 """Header component for the Nike store"""
 
+from decimal import Decimal
+from typing import Callable, Optional
+
 from nicegui import ui
-from app.config import get_settings
+from app.shell import PageShell
 
-async def create_header():
-    """Create the main header with navigation and cart"""
-    settings = get_settings()
-    
+class CartIndicator:
+    """Cart item count and subtotal in the header, updated in place
+
+    Only values that actually changed are sent to the browser.
+    """
+
+    def __init__(self, badge: ui.badge, subtotal: ui.label):
+        self.badge = badge
+        self.subtotal = subtotal
+        self._shown: Optional[tuple] = None
+
+    def show(self, count: int, subtotal: Decimal):
+        if self._shown == (count, subtotal):
+            return
+        self._shown = (count, subtotal)
+        self.badge.set_text(str(count))
+        self.badge.set_visibility(count > 0)
+        self.subtotal.set_text(f'${subtotal}' if count else '')
+
+async def create_header(shell: PageShell, on_cart_click: Optional[Callable] = None) -> CartIndicator:
+    """Create the main header with navigation and cart
+
+    Branding and navigation come pre-rendered from the page shell; only the
+    buttons and the cart indicator are live elements.
+    """
     with ui.row().classes('nike-header w-full'):
         with ui.row().classes('w-full max-w-7xl mx-auto px-4 justify-between items-center'):
-            # Logo and brand
-            with ui.row().classes('items-center gap-4'):
-                ui.label('✓').classes('nike-logo text-3xl')
-                with ui.column().classes('gap-0'):
-                    ui.label(settings.store_name).classes('text-xl font-bold')
-                    ui.label(settings.store_tagline).classes('text-sm text-gray-300')
-            
-            # Navigation
-            with ui.row().classes('items-center gap-6'):
-                ui.link('Home', '/').classes('text-white hover:text-orange-300 font-medium')
-                ui.link('Men', '/').classes('text-white hover:text-orange-300 font-medium')
-                ui.link('Women', '/').classes('text-white hover:text-orange-300 font-medium')
-                ui.link('Kids', '/').classes('text-white hover:text-orange-300 font-medium')
-                ui.link('Sale', '/').classes('text-white hover:text-orange-300 font-medium')
+            ui.html(shell.brand, sanitize=False)
+            ui.html(shell.navigation, sanitize=False)
             
             # Cart and user actions
             with ui.row().classes('items-center gap-4'):
@@ -32,15 +44,10 @@ async def create_header():
                 # User account
                 ui.button(icon='person').props('flat round').classes('text-white')
                 
-                # Shopping cart
-                cart_button = ui.button(icon='shopping_cart').props('flat round').classes('text-white')
-                cart_button.on('click', lambda: toggle_cart())
-                
-                # Cart count badge
-                with ui.badge('0', color='orange').classes('absolute -top-2 -right-2'):
-                    pass
-
-def toggle_cart():
-    """Toggle cart sidebar visibility"""
-    # This will be connected to the main app's cart toggle function
-    pass
\ No newline at end of file
+                # Shopping cart with its item count badge
+                with ui.button(icon='shopping_cart', on_click=on_cart_click).props('flat round').classes('text-white'):
+                    badge = ui.badge('0', color='orange').props('floating')
+                    badge.set_visibility(False)
+                subtotal = ui.label('').classes('text-sm text-orange-300 font-semibold')
+    
+    return CartIndicator(badge, subtotal)
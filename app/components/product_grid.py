@@ -1,28 +1,139 @@
 """Product grid component"""
 
+from collections import deque
 from nicegui import ui
-from typing import List
+from typing import Awaitable, Callable, Deque, Optional, Sequence, Union
 from models.product import Product
+from app.metrics import timed
+from app.render_cache import card_cache
 
-async def create_product_grid(products: List[Product]):
-    """Create a responsive product grid"""
-    
-    if not products:
-        with ui.column().classes('w-full text-center py-12'):
-            ui.label('No products found').classes('text-xl text-gray-500')
-            ui.label('Try adjusting your filters or search terms').classes('text-gray-400')
-        return
-    
-    with ui.grid(columns='repeat(auto-fill, minmax(300px, 1fr))').classes('w-full gap-6'):
-        for product in products:
-            await create_product_card(product)
+DEFAULT_COLUMNS = 'repeat(auto-fill, minmax(300px, 1fr))'
+
+class ProductGrid:
+    """Windowed product grid that only keeps a few pages of cards alive
+
+    Cards are created one page at a time as the user scrolls. Once more than
+    `max_pages` pages are rendered, the page furthest from the viewport is
+    deleted, so the number of server-side elements per client stays bounded
+    no matter how many products match.
+    """
+
+    def __init__(
+        self,
+        container: ui.element,
+        card_factory: Optional[Callable[[Product], Awaitable[None]]] = None,
+        page_size: int = 24,
+        max_pages: int = 3,
+        columns: Union[int, str] = DEFAULT_COLUMNS
+    ):
+        self.container = container
+        self.card_factory = card_factory or create_product_card
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.columns = columns
+        self.products: Sequence[Product] = []
+        self._pages: Deque[ui.element] = deque()
+        self._first_page = 0
+        self._loading = False
+        self._pages_column: Optional[ui.column] = None
+        self._previous_button: Optional[ui.button] = None
+        self._more_button: Optional[ui.button] = None
+        self._status: Optional[ui.label] = None
+
+    @property
+    def page_count(self) -> int:
+        return -(-len(self.products) // self.page_size)
+
+    @timed('render_products')
+    async def show(self, products: Sequence[Product]):
+        """Replace the grid contents with a new result sequence"""
+        self.container.clear()
+        self.products = products
+        self._pages.clear()
+        self._first_page = 0
+
+        with self.container:
+            if not products:
+                with ui.column().classes('w-full text-center py-12'):
+                    ui.label('No products found').classes('text-xl text-gray-500')
+                    ui.label('Try adjusting your filters or search terms').classes('text-gray-400')
+                return
+
+            self._previous_button = ui.button('Show previous', icon='expand_less', on_click=self.load_previous) \
+                .props('flat').classes('w-full')
+            self._pages_column = ui.column().classes('w-full gap-6')
+            with ui.column().classes('w-full items-center py-4'):
+                self._status = ui.label().classes('text-sm text-gray-500')
+                # Loads the next page as soon as the end of the grid scrolls into view
+                ui.element('q-intersection').props('once=false').classes('w-full h-px') \
+                    .on('visibility', self._on_sentinel, ['args'])
+                self._more_button = ui.button('Load more', on_click=self.load_next).props('outline')
+
+        await self.load_next()
+
+    async def load_next(self):
+        """Render the page after the current window"""
+        next_page = self._first_page + len(self._pages)
+        if self._loading or next_page >= self.page_count:
+            return
+        self._loading = True
+        try:
+            self._pages.append(await self._render_page(next_page))
+            if len(self._pages) > self.max_pages:
+                self._pages.popleft().delete()
+                self._first_page += 1
+        finally:
+            self._loading = False
+        self._update_controls()
+
+    async def load_previous(self):
+        """Render the page before the current window"""
+        if self._loading or self._first_page == 0:
+            return
+        self._loading = True
+        try:
+            self._first_page -= 1
+            page = await self._render_page(self._first_page)
+            page.move(self._pages_column, target_index=0)
+            self._pages.appendleft(page)
+            if len(self._pages) > self.max_pages:
+                self._pages.pop().delete()
+        finally:
+            self._loading = False
+        self._update_controls()
+
+    async def _on_sentinel(self, e):
+        if e.args:
+            await self.load_next()
+
+    async def _render_page(self, page: int) -> ui.element:
+        start = page * self.page_size
+        with self._pages_column:
+            with ui.grid(columns=self.columns).classes('w-full gap-6') as grid:
+                for product in self.products[start:start + self.page_size]:
+                    await self.card_factory(product)
+        return grid
+
+    def _update_controls(self):
+        shown_from = self._first_page * self.page_size
+        shown_to = min(len(self.products), (self._first_page + len(self._pages)) * self.page_size)
+        self._status.set_text(f'Showing {shown_from + 1}–{shown_to} of {len(self.products)}')
+        self._previous_button.set_visibility(self._first_page > 0)
+        self._more_button.set_visibility(shown_to < len(self.products))
+
+async def create_product_grid(products: Sequence[Product], page_size: int = 24, max_pages: int = 3) -> ProductGrid:
+    """Create a responsive, windowed product grid"""
+    grid = ProductGrid(ui.column().classes('w-full'), page_size=page_size, max_pages=max_pages)
+    await grid.show(products)
+    return grid
 
 async def create_product_card(product: Product):
     """Create individual product card"""
+    view = card_cache.get(product)
     with ui.card().classes('product-card cursor-pointer hover:shadow-lg transition-all duration-300'):
         # Product image
         with ui.element('div').classes('relative overflow-hidden'):
-            ui.image(product.image_url).classes('w-full h-64 object-cover')
+            ui.image(view.image_url).classes('w-full h-64 object-cover')
             
             # Quick view overlay
             with ui.element('div').classes('absolute inset-0 bg-black bg-opacity-50 opacity-0 hover:opacity-100 transition-opacity duration-300 flex items-center justify-center'):
@@ -30,18 +141,18 @@ async def create_product_card(product: Product):
         
         with ui.card_section().classes('p-4'):
             # Product name
-            ui.label(product.name).classes('text-lg font-semibold text-gray-800 mb-1 line-clamp-2')
+            ui.label(view.name).classes('text-lg font-semibold text-gray-800 mb-1 line-clamp-2')
             
             # Product category
-            ui.label(product.category.title()).classes('text-sm text-gray-500 mb-2')
+            ui.label(view.category_title).classes('text-sm text-gray-500 mb-2')
             
             # Product description (truncated)
-            if product.description:
-                ui.label(product.description[:100] + '...' if len(product.description) > 100 else product.description).classes('text-sm text-gray-600 mb-3 line-clamp-2')
+            if view.short_description:
+                ui.label(view.short_description).classes('text-sm text-gray-600 mb-3 line-clamp-2')
             
             # Price and actions
             with ui.row().classes('w-full justify-between items-center'):
-                ui.label(f'${product.price:.2f}').classes('price-tag text-xl')
+                ui.label(view.price_text).classes('price-tag text-xl')
                 
                 with ui.row().classes('gap-2'):
                     # Wishlist button
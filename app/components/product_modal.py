@@ -0,0 +1,60 @@
+"""Product details modal"""
+
+from typing import Callable, Optional, Sequence
+
+from nicegui import ui
+
+from app.images import image_url
+from models.product import Product
+
+def create_product_modal(
+    product: Product,
+    similar: Sequence[Product] = (),
+    available: Optional[int] = None,
+    on_add_to_cart: Optional[Callable[[Product], None]] = None,
+    on_select: Optional[Callable[[Product], None]] = None
+) -> ui.dialog:
+    """Open a dialog with the product's details and similar shoes
+
+    Selecting a similar shoe closes this dialog and calls `on_select` with it.
+    The dialog deletes itself once closed.
+    """
+    with ui.dialog() as dialog, ui.card().classes('w-full max-w-3xl p-0 gap-0'):
+        with ui.row().classes('w-full no-wrap gap-6 p-6'):
+            ui.image(image_url(product, '400x400')).classes('w-72 h-72 object-cover rounded-lg')
+            with ui.column().classes('flex-1 gap-2'):
+                ui.label(product.category.title()).classes('text-sm text-gray-500')
+                ui.label(product.name).classes('text-2xl font-bold text-gray-800')
+                ui.label(f'${product.price:.2f}').classes('price-tag')
+                ui.label(product.description).classes('text-gray-700')
+                if available is not None:
+                    if available <= 0:
+                        ui.label('Out of stock').classes('text-sm text-red-600 font-semibold')
+                    else:
+                        ui.label(f'{available} in stock').classes('text-sm text-gray-500')
+                with ui.row().classes('gap-2 mt-4'):
+                    if on_add_to_cart is not None:
+                        ui.button('Add to Cart', on_click=lambda: on_add_to_cart(product)) \
+                            .classes('cart-button').props('dense')
+                    ui.button('Close', on_click=dialog.close).props('flat')
+
+        if similar:
+            ui.separator()
+            with ui.column().classes('w-full p-6 gap-3'):
+                ui.label('Similar shoes').classes('text-lg font-semibold text-gray-800')
+                with ui.row().classes('w-full no-wrap gap-4'):
+                    for other in similar:
+                        with ui.column().classes('w-36 gap-1 cursor-pointer') \
+                                .on('click', lambda p=other: _select(dialog, on_select, p)):
+                            ui.image(image_url(other, '200x200')).classes('w-36 h-36 object-cover rounded')
+                            ui.label(other.name).classes('text-sm font-semibold')
+                            ui.label(f'${other.price:.2f}').classes('text-sm text-gray-600')
+
+    dialog.on('hide', dialog.delete)
+    dialog.open()
+    return dialog
+
+def _select(dialog: ui.dialog, on_select: Optional[Callable[[Product], None]], product: Product):
+    dialog.close()
+    if on_select is not None:
+        return on_select(product)
@@ -1,10 +1,33 @@
-"""Application configuration management"""
+"""Application configuration management
 
+Settings are parsed from the environment and validated once, then shared by
+the whole process as one immutable object; `get_settings()` only returns it.
+With SETTINGS_RELOAD_INTERVAL set, a `SettingsWatcher` re-reads the .env file
+when it changes and tells `on_settings_change` listeners about the new values.
+"""
+
+import asyncio
+import logging
 import os
-from typing import Optional
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, List, Mapping, Optional
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
 
-@dataclass
+CART_BACKENDS = ('memory', 'sqlite')
+IMAGE_QUALITIES = ('low', 'medium', 'high', 'max')
+# Settings read while serving; anything else is consumed at startup and only
+# changes after a restart
+LIVE_SETTINGS = frozenset({
+    'store_name', 'store_tagline', 'tax_rate', 'low_stock_threshold',
+    'default_image_size', 'image_quality', 'search_debounce_ms',
+    'grid_page_size', 'grid_max_pages', 'ui_update_ms'
+})
+
+@dataclass(frozen=True)
 class Settings:
     """Application settings"""
     app_name: str = "Nike Shoe Store"
@@ -14,39 +37,289 @@ class Settings:
     # Server settings
     host: str = "0.0.0.0"
     port: int = 8000
+    workers: int = 1
     
     # Store settings
     store_name: str = "Nike Official Store"
     store_tagline: str = "Just Do It"
     currency: str = "USD"
     tax_rate: float = 0.08
+    low_stock_threshold: int = 5
     
     # Image settings
     default_image_size: str = "400x400"
     image_quality: str = "high"
+    image_cache_dir: str = "data/images"
+    image_cache_max_mb: int = 512
+    image_workers: int = 2
     
     # Session settings
     session_timeout: int = 3600
     cart_expiry: int = 7200
+    max_carts: int = 100000
+    storage_secret: str = "change-me"
+    cart_backend: str = "memory"
+    cart_db_path: str = "data/carts.db"
+    cart_flush_ms: int = 50
+    cart_cache_ttl: float = 2.0
+    
+    # Order settings
+    order_db_path: str = "data/orders.db"
+    order_workers: int = 2
+    order_queue_size: int = 1000
+    
+    # Catalog settings
+    catalog_refresh_interval: int = 300
+    product_api_url: str = ""
+    product_api_page_size: int = 500
+    product_api_concurrency: int = 8
+    product_api_retries: int = 4
+    catalog_snapshot_path: str = ""
+    snapshot_poll_interval: int = 5
+    search_debounce_ms: int = 40
+    grid_page_size: int = 24
+    grid_max_pages: int = 3
+    ui_update_ms: int = 50
+    recommendation_count: int = 8
+    
+    # Instrumentation
+    metrics_enabled: bool = False
+    
+    # Seconds between checks of the .env file for changes; 0 disables hot reload
+    settings_reload_interval: float = 0.0
+    
+    def __post_init__(self):
+        problems = self.problems()
+        if problems:
+            raise ValueError(f"Invalid settings: {'; '.join(problems)}")
 
-def get_settings() -> Settings:
-    """Get application settings from environment variables"""
+    def problems(self) -> List[str]:
+        """Everything wrong with these settings"""
+        problems = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            expected = (int, float) if field.type is float else field.type
+            if not isinstance(value, expected) or (field.type is int and isinstance(value, bool)):
+                problems.append(f'{field.name} must be {field.type.__name__}, got {value!r}')
+        if problems:
+            return problems
+
+        def check(ok: bool, message: str):
+            if not ok:
+                problems.append(message)
+
+        check(1 <= self.port <= 65535, f'port must be 1-65535, got {self.port}')
+        check(0 <= self.tax_rate < 1, f'tax_rate must be a fraction in [0, 1), got {self.tax_rate}')
+        check(re.fullmatch(r'[A-Z]{3}', self.currency) is not None,
+              f'currency must be an ISO 4217 code such as USD, got {self.currency!r}')
+        check(re.fullmatch(r'[1-9]\d*x[1-9]\d*', self.default_image_size.lower()) is not None,
+              f'default_image_size must be WIDTHxHEIGHT, got {self.default_image_size!r}')
+        check(self.image_quality in IMAGE_QUALITIES
+              or (self.image_quality.isdigit() and 1 <= int(self.image_quality) <= 100),
+              f"image_quality must be one of {', '.join(IMAGE_QUALITIES)} or 1-100, got {self.image_quality!r}")
+        check(self.cart_backend in CART_BACKENDS,
+              f"cart_backend must be one of {', '.join(CART_BACKENDS)}, got {self.cart_backend!r}")
+        for name in ('workers', 'image_cache_max_mb', 'image_workers', 'session_timeout', 'cart_expiry',
+                     'max_carts', 'order_workers', 'order_queue_size', 'catalog_refresh_interval',
+                     'product_api_page_size', 'product_api_concurrency', 'snapshot_poll_interval',
+                     'grid_page_size', 'grid_max_pages', 'recommendation_count'):
+            check(getattr(self, name) > 0, f'{name} must be positive, got {getattr(self, name)}')
+        for name in ('low_stock_threshold', 'cart_flush_ms', 'cart_cache_ttl', 'product_api_retries',
+                     'search_debounce_ms', 'ui_update_ms', 'settings_reload_interval'):
+            check(getattr(self, name) >= 0, f'{name} must not be negative, got {getattr(self, name)}')
+        return problems
+
+def _int(environ: Mapping[str, str], name: str, default: int) -> int:
+    value = environ.get(name)
+    try:
+        return default if value is None else int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer, got {value!r}') from None
+
+def _float(environ: Mapping[str, str], name: str, default: float) -> float:
+    value = environ.get(name)
+    try:
+        return default if value is None else float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number, got {value!r}') from None
+
+def _bool(environ: Mapping[str, str], name: str, default: bool) -> bool:
+    value = environ.get(name)
+    if value is None:
+        return default
+    if value.lower() in ("true", "1", "yes", "on"):
+        return True
+    if value.lower() in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(f'{name} must be true or false, got {value!r}')
+
+def load_settings(environ: Mapping[str, str] = os.environ) -> Settings:
+    """Parse and validate settings from environment variables, raising ValueError when invalid"""
     return Settings(
-        app_name=os.getenv("APP_NAME", "Nike Shoe Store"),
-        app_version=os.getenv("APP_VERSION", "1.0.0"),
-        debug=os.getenv("DEBUG", "true").lower() == "true",
+        app_name=environ.get("APP_NAME", "Nike Shoe Store"),
+        app_version=environ.get("APP_VERSION", "1.0.0"),
+        debug=_bool(environ, "DEBUG", True),
+        
+        host=environ.get("HOST", "0.0.0.0"),
+        port=_int(environ, "PORT", 8000),
+        workers=_int(environ, "WORKERS", 1),
+        
+        store_name=environ.get("STORE_NAME", "Nike Official Store"),
+        store_tagline=environ.get("STORE_TAGLINE", "Just Do It"),
+        currency=environ.get("CURRENCY", "USD"),
+        tax_rate=_float(environ, "TAX_RATE", 0.08),
+        low_stock_threshold=_int(environ, "LOW_STOCK_THRESHOLD", 5),
         
-        host=os.getenv("HOST", "0.0.0.0"),
-        port=int(os.getenv("PORT", "8000")),
+        default_image_size=environ.get("DEFAULT_IMAGE_SIZE", "400x400"),
+        image_quality=environ.get("IMAGE_QUALITY", "high"),
+        image_cache_dir=environ.get("IMAGE_CACHE_DIR", "data/images"),
+        image_cache_max_mb=_int(environ, "IMAGE_CACHE_MAX_MB", 512),
+        image_workers=_int(environ, "IMAGE_WORKERS", 2),
         
-        store_name=os.getenv("STORE_NAME", "Nike Official Store"),
-        store_tagline=os.getenv("STORE_TAGLINE", "Just Do It"),
-        currency=os.getenv("CURRENCY", "USD"),
-        tax_rate=float(os.getenv("TAX_RATE", "0.08")),
+        session_timeout=_int(environ, "SESSION_TIMEOUT", 3600),
+        cart_expiry=_int(environ, "CART_EXPIRY", 7200),
+        max_carts=_int(environ, "MAX_CARTS", 100000),
+        storage_secret=environ.get("STORAGE_SECRET", "change-me"),
+        cart_backend=environ.get("CART_BACKEND", "memory"),
+        cart_db_path=environ.get("CART_DB_PATH", "data/carts.db"),
+        cart_flush_ms=_int(environ, "CART_FLUSH_MS", 50),
+        cart_cache_ttl=_float(environ, "CART_CACHE_TTL", 2.0),
         
-        default_image_size=os.getenv("DEFAULT_IMAGE_SIZE", "400x400"),
-        image_quality=os.getenv("IMAGE_QUALITY", "high"),
+        order_db_path=environ.get("ORDER_DB_PATH", "data/orders.db"),
+        order_workers=_int(environ, "ORDER_WORKERS", 2),
+        order_queue_size=_int(environ, "ORDER_QUEUE_SIZE", 1000),
         
-        session_timeout=int(os.getenv("SESSION_TIMEOUT", "3600")),
-        cart_expiry=int(os.getenv("CART_EXPIRY", "7200"))
-    )
\ No newline at end of file
+        catalog_refresh_interval=_int(environ, "CATALOG_REFRESH_INTERVAL", 300),
+        product_api_url=environ.get("PRODUCT_API_URL", ""),
+        product_api_page_size=_int(environ, "PRODUCT_API_PAGE_SIZE", 500),
+        product_api_concurrency=_int(environ, "PRODUCT_API_CONCURRENCY", 8),
+        product_api_retries=_int(environ, "PRODUCT_API_RETRIES", 4),
+        catalog_snapshot_path=environ.get("CATALOG_SNAPSHOT_PATH", ""),
+        snapshot_poll_interval=_int(environ, "SNAPSHOT_POLL_INTERVAL", 5),
+        search_debounce_ms=_int(environ, "SEARCH_DEBOUNCE_MS", 40),
+        grid_page_size=_int(environ, "GRID_PAGE_SIZE", 24),
+        grid_max_pages=_int(environ, "GRID_MAX_PAGES", 3),
+        ui_update_ms=_int(environ, "UI_UPDATE_MS", 50),
+        recommendation_count=_int(environ, "RECOMMENDATION_COUNT", 8),
+        
+        metrics_enabled=_bool(environ, "METRICS_ENABLED", False),
+        
+        settings_reload_interval=_float(environ, "SETTINGS_RELOAD_INTERVAL", 0.0)
+    )
+
+_settings: Optional[Settings] = None
+_listeners: List[Callable[[Settings, Settings], None]] = []
+
+def get_settings() -> Settings:
+    """Get the process-wide settings, loading them on first use"""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+def on_settings_change(listener: Callable[[Settings, Settings], None]):
+    """Call `listener(old, new)` whenever the settings are replaced"""
+    _listeners.append(listener)
+
+def replace_settings(settings: Settings) -> List[str]:
+    """Make `settings` the process-wide settings, returning the names of fields that changed"""
+    global _settings
+    old = get_settings()
+    changed = [field.name for field in fields(Settings) if getattr(old, field.name) != getattr(settings, field.name)]
+    if not changed:
+        return changed
+    _settings = settings
+    logger.info('Settings changed: %s', ', '.join(changed))
+    deferred = [name for name in changed if name not in LIVE_SETTINGS]
+    if deferred:
+        logger.warning('Changes to %s take effect after a restart', ', '.join(deferred))
+    for listener in list(_listeners):
+        try:
+            listener(old, settings)
+        except Exception:
+            logger.exception('Settings listener failed')
+    return changed
+
+class SettingsWatcher:
+    """Reloads the settings when the .env file changes
+
+    Like `load_dotenv`, variables set in the real environment take precedence
+    over the file; only variables the file provided follow its changes. A
+    file that fails validation is logged and ignored, keeping the current
+    settings.
+    """
+
+    def __init__(self, path: str = '.env', interval: float = 2.0):
+        self.path = path
+        self.interval = interval
+        self._mtime = self._modified()
+        self._values = self._read()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def check(self) -> List[str]:
+        """Reload if the file changed since last seen, returning the changed setting names"""
+        mtime = self._modified()
+        if mtime == self._mtime:
+            return []
+        self._mtime = mtime
+        return self.reload()
+
+    def reload(self) -> List[str]:
+        """Re-read the file and apply it, returning the changed setting names"""
+        values = self._read()
+        # None marks a variable removed from the file
+        updates = {
+            name: values.get(name) for name in set(self._values) | set(values)
+            if name not in os.environ or os.environ[name] == self._values.get(name)
+        }
+        environ = dict(os.environ)
+        for name, value in updates.items():
+            if value is None:
+                environ.pop(name, None)
+            else:
+                environ[name] = value
+        try:
+            settings = load_settings(environ)
+        except ValueError as error:
+            logger.error('Ignoring changes to %s: %s', self.path, error)
+            return []
+        # Keep the environment in step for processes started from here on
+        for name, value in updates.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self._values = values
+        return replace_settings(settings)
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Checking %s for changes failed', self.path)
+
+    def _modified(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> Dict[str, str]:
+        if not os.path.exists(self.path):
+            return {}
+        return {name: value for name, value in dotenv_values(self.path).items() if value is not None}
@@ -0,0 +1,308 @@
+"""Resizing image proxy with an on-disk cache"""
+
+import asyncio
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from nicegui import App
+
+from app.assets import parse_accept
+from app.config import get_settings
+from models.product import Product
+from services.http_client import get_http_client
+
+# Pillow is optional and only imported where images are encoded, so startup
+# and page rendering never pay for loading it
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+QUALITY_LEVELS = {'low': 50, 'medium': 70, 'high': 85, 'max': 95}
+MEDIA_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+STANDARD_SIZES = ('200x200', '400x400', '800x800')
+CACHE_HEADERS = {'Cache-Control': 'public, max-age=31536000, immutable', 'Vary': 'Accept'}
+# How often a cache rescans its directory for files written by other processes
+RESCAN_INTERVAL = 30.0
+# Temporary files older than this were left behind by a process that died mid-write
+STALE_TEMP_SECONDS = 300.0
+
+def parse_size(size: str) -> Tuple[int, int]:
+    """Parse a 'WIDTHxHEIGHT' string"""
+    width, _, height = size.lower().partition('x')
+    return int(width), int(height)
+
+def parse_quality(quality: str) -> int:
+    """Map IMAGE_QUALITY ('low', 'medium', 'high', 'max' or 1-100) to an encoder quality"""
+    if quality.isdigit():
+        return max(1, min(100, int(quality)))
+    return QUALITY_LEVELS.get(quality.lower(), QUALITY_LEVELS['high'])
+
+def image_url(product: Product, size: str = 'default') -> str:
+    """URL of a product image served through the proxy
+
+    The query string changes with the source URL and with the size and
+    quality the rendition is made with, so immutable caching never pins a
+    replaced image or a rendition from before an image setting was reloaded.
+    """
+    if not product.image_url:
+        return ''
+    settings = get_settings()
+    rendition = settings.default_image_size if size == 'default' else size
+    source = f'{product.image_url}|{rendition}|{parse_quality(settings.image_quality)}'
+    version = hashlib.sha1(source.encode()).hexdigest()[:8]
+    return f'/img/{product.id}/{size}?v={version}'
+
+def render_image(data: bytes, width: int, height: int, fmt: str, quality: int) -> bytes:
+    """Crop-resize and encode an image; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format=fmt.upper(), quality=quality)
+        return output.getvalue()
+
+class DiskCache:
+    """Size-capped directory of files evicted least recently used first
+
+    Worker processes share the directory, so it is the directory that is
+    accounted, not what this process wrote: the cache rescans it on start and
+    at most every `rescan_interval` seconds as files are added, and a hit
+    touches the file's modification time, which orders eviction across
+    processes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, rescan_interval: float = RESCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.rescan()
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.{extension}')
+
+    def get(self, path: str) -> Optional[str]:
+        """Return `path` if cached and mark it recently used"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted, possibly by another process
+            self.total_bytes -= self._entries.pop(path, 0)
+            return None
+        if path in self._entries:
+            self._entries.move_to_end(path)
+        else:
+            # Written by another process since the last scan
+            size = os.stat(path).st_size
+            self._entries[path] = size
+            self.total_bytes += size
+        return path
+
+    @staticmethod
+    def write_file(path: str, data: bytes):
+        """Atomically write a cache file; safe to run off the event loop"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def add(self, path: str, size: int):
+        """Record a written file and evict old entries beyond the size cap"""
+        self.total_bytes += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+        self.total_bytes = self._evict(self._entries, self.total_bytes)
+
+    @property
+    def rescan_due(self) -> bool:
+        return time.monotonic() - self._scanned_at >= self.rescan_interval
+
+    def rescan(self):
+        """Recount the directory, then evict beyond the size cap; safe to run off the event loop"""
+        self._scanned_at = time.monotonic()
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith('.tmp'):
+                        # Another process may still be writing a recent one
+                        if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        entries: 'OrderedDict[str, int]' = OrderedDict()
+        for _, path, size in sorted(files):
+            entries[path] = size
+        total = self._evict(entries, sum(entries.values()))
+        # Swapped in whole; entries added meanwhile are on disk for the next scan
+        self._entries, self.total_bytes = entries, total
+
+    def _evict(self, entries: 'OrderedDict[str, int]', total: int) -> int:
+        while total > self.max_bytes and len(entries) > 1:
+            old_path, size = entries.popitem(last=False)
+            total -= size
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+        return total
+
+class ImageProxy:
+    """Serves `/img/{product_id}/{size}` renditions of product images
+
+    The original is fetched once through the shared HTTP client, resized and
+    re-encoded in a process pool (AVIF or WebP when the client accepts them,
+    JPEG otherwise) and stored in a disk cache. The cache key and ETag are a
+    hash of the source URL and rendition, so responses can be cached forever
+    and revalidations answered with 304 without touching the disk.
+    """
+
+    def __init__(
+        self,
+        product_lookup: Callable[[str], Optional[Product]],
+        cache_dir: str,
+        max_cache_bytes: int,
+        default_size: str = '400x400',
+        quality: str = 'high',
+        workers: int = 2
+    ):
+        self.product_lookup = product_lookup
+        self.configure(default_size, quality)
+        self.cache = DiskCache(cache_dir, max_cache_bytes)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._formats: Optional[List[str]] = None
+
+    def configure(self, default_size: str, quality: str):
+        """Change the default size and encoder quality of new renditions
+
+        Both are part of the cache key and of the URLs `image_url` builds, so
+        renditions made with the previous values are simply no longer requested.
+        """
+        self.default_size = default_size
+        self.quality = parse_quality(quality)
+        self.allowed_sizes = set(STANDARD_SIZES) | {default_size}
+
+    def install(self, app: App):
+        """Register the image route and pool lifecycle on the app"""
+        app.add_api_route('/img/{product_id}/{size}', self.handle, methods=['GET'], include_in_schema=False)
+        app.on_shutdown(self.shutdown)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @property
+    def formats(self) -> List[str]:
+        """Output formats in order of preference, detected on first use"""
+        if self._formats is None:
+            self._formats = ['jpeg']
+            if PILLOW_AVAILABLE:
+                from PIL import features
+                if features.check('webp'):
+                    self._formats.insert(0, 'webp')
+                if features.check('avif'):
+                    self._formats.insert(0, 'avif')
+        return self._formats
+
+    def negotiate_format(self, accept: str) -> str:
+        """Pick the output format the client prefers by q-value
+
+        AVIF and WebP must be listed explicitly with q > 0, since wildcards
+        are also sent by browsers that cannot decode them. JPEG is always
+        acceptable and is the fallback; equal q-values keep the order of
+        `formats`.
+        """
+        accepted = parse_accept(accept)
+        wildcard = max(accepted.get('image/*', 0.0), accepted.get('*/*', 0.0))
+        best, best_quality = 'jpeg', 0.0
+        for fmt in self.formats:
+            quality = accepted.get(MEDIA_TYPES[fmt], wildcard if fmt == 'jpeg' else 0.0)
+            if quality > best_quality:
+                best, best_quality = fmt, quality
+        return best
+
+    async def handle(self, product_id: str, size: str, request: Request) -> Response:
+        product = self.product_lookup(product_id)
+        if product is None or not product.image_url:
+            return Response(status_code=404)
+        if size == 'default':
+            size = self.default_size
+        if size not in self.allowed_sizes:
+            return Response(status_code=404)
+        if not PILLOW_AVAILABLE:
+            return RedirectResponse(product.image_url)
+
+        fmt = self.negotiate_format(request.headers.get('accept', ''))
+        key = hashlib.sha256(f'{product.image_url}|{size}|{fmt}|{self.quality}'.encode()).hexdigest()
+        etag = f'"{key[:32]}"'
+        headers = dict(CACHE_HEADERS, ETag=etag)
+        if etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=headers)
+
+        path = self.cache.path_for(key, fmt)
+        if self.cache.get(path) is None:
+            try:
+                await self._render_once(key, path, product.image_url, size, fmt)
+            except Exception:
+                logger.exception('Rendering image for %s failed', product_id)
+                return RedirectResponse(product.image_url)
+        return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+    async def _render_once(self, key: str, path: str, url: str, size: str, fmt: str):
+        """Render a rendition, sharing the work between concurrent requests for it"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await get_http_client().get(url)
+            response.raise_for_status()
+            width, height = parse_size(size)
+            data = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), render_image, response.content, width, height, fmt, self.quality
+            )
+            await asyncio.to_thread(self.cache.write_file, path, data)
+            self.cache.add(path, len(data))
+            future.set_result(None)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                # Cancelled along with its request; waiting requests fall back to the original image
+                future.set_exception(RuntimeError(f'Rendering {url} was cancelled'))
+            # Mark retrieved so an unawaited failure is not logged twice
+            future.exception()
+        if self.cache.rescan_due:
+            await asyncio.to_thread(self.cache.rescan)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
@@ -0,0 +1,42 @@
+"""Live page updates driven by the in-process event bus"""
+
+from typing import Callable, Hashable, Iterable, List
+
+from nicegui import Client
+
+from core.events import EventBus, Subscriptions, UpdateBatch
+
+class LiveUpdates:
+    """Event subscriptions and batched UI updates of one connected client
+
+    Event handlers schedule named updates instead of touching elements
+    directly. Updates scheduled within `delay` seconds of each other are
+    coalesced by name and applied together in the client's context, so
+    NiceGUI sends them over the websocket as one batch. Everything is torn
+    down when the client is deleted.
+    """
+
+    def __init__(self, events: EventBus, client: Client, delay: float = 0.05):
+        self.client = client
+        self.subscriptions = Subscriptions(events)
+        self.batch = UpdateBatch(self._apply, delay)
+        client.on_delete(self.close)
+
+    def on(self, topic: str, key: Hashable, name: str, update: Callable[[], None]):
+        """Schedule `update` under `name` whenever an event for `key` arrives"""
+        self.subscriptions.subscribe(topic, key, lambda _: self.batch.schedule(name, update))
+
+    def follow(self, topic: str, keys: Iterable[Hashable], name: str, update: Callable[[], None]):
+        """Like `on` for exactly `keys`, dropping subscriptions to other keys of the topic"""
+        self.subscriptions.follow(topic, keys, lambda _: self.batch.schedule(name, update))
+
+    def close(self):
+        self.subscriptions.cancel()
+        self.batch.close()
+
+    def _apply(self, updates: List[Callable[[], None]]):
+        if self.client.is_deleted:
+            return
+        with self.client:
+            for update in updates:
+                update()
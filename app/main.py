@@ -4,163 +4,214 @@ Modern e-commerce interface with shopping cart functionality
 """
 
 from nicegui import ui, app
-from typing import Dict, List, Optional
+from nicegui.client import ClientConnectionTimeout
+from typing import TYPE_CHECKING, Dict, List, Optional
 import asyncio
+import logging
+import os
+import uuid
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from fastapi.responses import JSONResponse
 
-from core.store import StoreManager
+from core.catalog import CatalogManager
 from core.cart import CartManager
+from core.events import EventBus
+from core.sessions import CartStore
+from core.storage import create_cart_backend
 from models.product import Product
+from services.http_client import close_http_client
 from services.product_service import ProductService
-from app.components.header import create_header
-from app.components.product_grid import create_product_grid
-from app.components.cart_sidebar import create_cart_sidebar
-from app.components.product_modal import create_product_modal
-from app.config import get_settings
+from app.config import Settings, SettingsWatcher, get_settings, on_settings_change
+from app.assets import PrecompressedStaticFiles, build_assets
+from app.live import LiveUpdates
+from app.render_cache import card_cache
+from app.search import IncrementalSearch
+from app.shell import page_shells, price_range
+
+# Components, optional catalog sources, orders, recommendations, images and
+# metrics are imported where first used, so a process becomes ready without
+# loading modules no request has needed yet
+if TYPE_CHECKING:
+    from app.components.cart_sidebar import CartSidebar
+    from app.components.header import CartIndicator
+    from core.orders import OrderPipeline
+    from core.recommendations import Recommender
+
+logger = logging.getLogger(__name__)
+
+def create_product_service(settings) -> ProductService:
+    """Create the product service for the configured catalog source"""
+    if settings.catalog_snapshot_path:
+        # Worker process: the supervisor owns the upstream source and publishes snapshots
+        from core.snapshot import SnapshotProductSource
+        return ProductService(source=SnapshotProductSource(settings.catalog_snapshot_path))
+    if settings.product_api_url:
+        from services.http_source import HttpProductSource
+        return ProductService(source=HttpProductSource(
+            settings.product_api_url,
+            page_size=settings.product_api_page_size,
+            concurrency=settings.product_api_concurrency,
+            max_retries=settings.product_api_retries
+        ))
+    return ProductService()
 
 # Global state management
-store_manager = StoreManager()
-cart_manager = CartManager()
-product_service = ProductService()
+settings = get_settings()
+events = EventBus()
+product_service = create_product_service(settings)
+catalog = CatalogManager(
+    product_service,
+    refresh_interval=settings.snapshot_poll_interval if settings.catalog_snapshot_path else settings.catalog_refresh_interval,
+    events=events
+)
+catalog.add_listener(lambda snapshot: card_cache.reset(snapshot.version, snapshot.store.index.columns))
+_recommender: Optional['Recommender'] = None
+
+def get_recommender() -> 'Recommender':
+    """The recommender, created when the first catalog is published"""
+    global _recommender
+    if _recommender is None:
+        from core.recommendations import Recommender
+        _recommender = Recommender(k=settings.recommendation_count)
+    return _recommender
+
+catalog.add_listener(lambda snapshot: get_recommender().catalog_changed(snapshot.store.index.columns))
+
+def timed(name: str):
+    """`metrics.timed` when metrics are enabled; app.metrics is not even loaded otherwise"""
+    if not settings.metrics_enabled:
+        return lambda func: func
+    from app.metrics import metrics
+    return metrics.timed(name)
+
+def observe_page(page: str):
+    """Record the size of the page being built, when metrics are enabled"""
+    if settings.metrics_enabled:
+        from app.metrics import metrics
+        metrics.observe_page(ui.context.client, page)
+
+def observe_build(snapshot):
+    from app.metrics import metrics
+    metrics.histogram('catalog_build_seconds', 'Time to load and index a new catalog snapshot').observe(snapshot.build_seconds)
+
+if settings.metrics_enabled:
+    catalog.add_listener(observe_build)
+cart_store = CartStore(
+    product_lookup=lambda product_id: catalog.store.get_product(product_id),
+    cart_ttl=settings.cart_expiry,
+    empty_ttl=settings.session_timeout,
+    max_carts=settings.max_carts,
+    events=events,
+    backend=create_cart_backend(
+        settings.cart_backend,
+        path=settings.cart_db_path,
+        flush_interval=settings.cart_flush_ms / 1000,
+        cache_ttl=settings.cart_cache_ttl
+    )
+)
+_order_pipeline: Optional['OrderPipeline'] = None
+
+def get_order_pipeline() -> 'OrderPipeline':
+    """The order pipeline, created by the startup hook or by the first page that prices a cart"""
+    global _order_pipeline
+    if _order_pipeline is None:
+        from core.orders import OrderPipeline, OrderStore
+        settings = get_settings()
+        pipeline = OrderPipeline(
+            OrderStore(settings.order_db_path),
+            tax_rate=settings.tax_rate,
+            workers=settings.order_workers,
+            queue_size=settings.order_queue_size
+        )
+        pipeline.add_listener(lambda order: logger.info(
+            'Order %s confirmed: %d items, total %s', order.id, sum(line.quantity for line in order.lines), order.totals.total
+        ))
+        # Units sold lower what is available, which pages showing those products display
+        pipeline.add_listener(lambda order: [
+            events.publish('product', line.product_id, catalog.store.get_product(line.product_id)) for line in order.lines
+        ])
+        _order_pipeline = pipeline
+    return _order_pipeline
+
+async def start_order_pipeline():
+    await get_order_pipeline().start()
+
+async def stop_order_pipeline():
+    if _order_pipeline is not None:
+        await _order_pipeline.stop()
+
+async def stop_recommender():
+    if _recommender is not None:
+        await _recommender.stop()
+
+def apply_settings(old: Settings, new: Settings):
+    """Carry reloaded settings over to the long-lived objects built from them"""
+    if _order_pipeline is not None:
+        _order_pipeline.tax_rate = new.tax_rate
+
+on_settings_change(apply_settings)
 
 # UI State
-current_category = "all"
-search_query = ""
-cart_visible = False
 selected_product: Optional[Product] = None
+SIMILAR_IN_MODAL = 4
+SUGGESTIONS_IN_CART = 3
+# How long a served store page waits for its browser to connect before giving up on it
+CONNECT_TIMEOUT = 30.0
+# How long a request waits for the first catalog before showing it as unavailable;
+# well inside the page's response timeout, so the visitor gets that message
+CATALOG_WAIT_TIMEOUT = 2.0
 
-async def initialize_store():
-    """Initialize store with product data"""
-    await product_service.load_products()
-    store_manager.set_products(product_service.get_all_products())
+@dataclass
+class StorePage:
+    """The live parts of one visitor's store page"""
+    session_id: str
+    search: IncrementalSearch
+    cart_indicator: 'CartIndicator'
+    sidebar: 'CartSidebar'
 
 @ui.page('/')
 async def home_page():
-    """Main store page with product catalog"""
-    await initialize_store()
+    """Main store page with product catalog
+
+    The first response only carries the shell, which costs the same however
+    large the catalog or complex the filters; products and the cart are
+    streamed in over the websocket once the browser has connected.
+    """
+    # Startup hooks run in the background; only the first requests ever wait here
+    if not await catalog.wait_ready(timeout=CATALOG_WAIT_TIMEOUT):
+        show_catalog_unavailable()
+        return
+    page = await build_store_shell()
+    try:
+        await ui.context.client.connected(timeout=CONNECT_TIMEOUT)
+    except ClientConnectionTimeout:
+        return
+    await fill_store_page(page)
+
+@timed('home_page')
+async def build_store_shell() -> StorePage:
+    """Build everything of the store page except its products"""
+    from app.components.cart_sidebar import create_cart_sidebar
+    from app.components.header import create_header
+    from app.components.product_grid import ProductGrid
+
+    settings = get_settings()
+    session_id = get_session_id()
+    shell = page_shells.get(catalog.version, settings, catalog.store.get_categories)
     
-    # Add custom CSS for Nike branding
-    ui.add_head_html('''
-        <style>
-            .nike-header {
-                background: linear-gradient(135deg, #000000 0%, #1a1a1a 100%);
-                color: white;
-                padding: 1rem 0;
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            }
-            .nike-logo {
-                font-size: 2rem;
-                font-weight: bold;
-                color: #ff6b35;
-            }
-            .product-card {
-                transition: transform 0.3s ease, box-shadow 0.3s ease;
-                border-radius: 12px;
-                overflow: hidden;
-                background: white;
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-            }
-            .product-card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 8px 25px rgba(0,0,0,0.15);
-            }
-            .price-tag {
-                color: #ff6b35;
-                font-weight: bold;
-                font-size: 1.2rem;
-            }
-            .cart-button {
-                background: #ff6b35;
-                color: white;
-                border: none;
-                padding: 0.75rem 1.5rem;
-                border-radius: 8px;
-                font-weight: bold;
-                transition: background 0.3s ease;
-            }
-            .cart-button:hover {
-                background: #e55a2b;
-            }
-            .category-filter {
-                background: #f8f9fa;
-                border-radius: 8px;
-                padding: 0.5rem 1rem;
-                margin: 0.25rem;
-                border: 2px solid transparent;
-                transition: all 0.3s ease;
-            }
-            .category-filter.active {
-                background: #ff6b35;
-                color: white;
-                border-color: #ff6b35;
-            }
-            .search-container {
-                max-width: 400px;
-                margin: 0 auto;
-            }
-            .cart-sidebar {
-                position: fixed;
-                right: 0;
-                top: 0;
-                height: 100vh;
-                width: 400px;
-                background: white;
-                box-shadow: -5px 0 15px rgba(0,0,0,0.1);
-                transform: translateX(100%);
-                transition: transform 0.3s ease;
-                z-index: 1000;
-                overflow-y: auto;
-            }
-            .cart-sidebar.visible {
-                transform: translateX(0);
-            }
-            .overlay {
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100vw;
-                height: 100vh;
-                background: rgba(0,0,0,0.5);
-                z-index: 999;
-                opacity: 0;
-                visibility: hidden;
-                transition: all 0.3s ease;
-            }
-            .overlay.visible {
-                opacity: 1;
-                visibility: visible;
-            }
-        </style>
-    ''')
+    # Nike branding styles and the filter script
+    ui.add_head_html(shell.head)
     
     # Create main layout
     with ui.column().classes('w-full min-h-screen bg-gray-50'):
         # Header
-        await create_header()
+        cart_indicator = await create_header(shell, on_cart_click=lambda: toggle_cart(cart_sidebar, overlay))
         
         # Main content
         with ui.row().classes('w-full max-w-7xl mx-auto px-4 py-8 gap-8'):
-            # Sidebar filters
-            with ui.column().classes('w-64 space-y-4'):
-                ui.label('Categories').classes('text-xl font-bold text-gray-800')
-                
-                categories = ['all', 'running', 'basketball', 'lifestyle', 'training']
-                for category in categories:
-                    with ui.button(
-                        category.title(), 
-                        on_click=lambda c=category: filter_by_category(c)
-                    ).classes(f'category-filter w-full text-left {"active" if category == current_category else ""}'):
-                        pass
-                
-                ui.separator()
-                
-                # Price filter
-                ui.label('Price Range').classes('text-lg font-semibold text-gray-700 mt-6')
-                with ui.column().classes('space-y-2'):
-                    ui.button('Under $100', on_click=lambda: filter_by_price(0, 100)).classes('category-filter w-full text-left')
-                    ui.button('$100 - $150', on_click=lambda: filter_by_price(100, 150)).classes('category-filter w-full text-left')
-                    ui.button('$150 - $200', on_click=lambda: filter_by_price(150, 200)).classes('category-filter w-full text-left')
-                    ui.button('Over $200', on_click=lambda: filter_by_price(200, 999)).classes('category-filter w-full text-left')
+            # Sidebar filters, pre-rendered; clicks arrive as "filter" events
+            ui.html(shell.filters, sanitize=False).classes('w-64')
             
             # Product grid
             with ui.column().classes('flex-1'):
@@ -168,133 +219,196 @@ async def home_page():
                 with ui.row().classes('search-container mb-6'):
                     search_input = ui.input(
                         placeholder='Search Nike shoes...',
-                        on_change=lambda e: search_products(e.value)
+                        on_change=lambda e: search_products(search, e.value)
                     ).classes('flex-1')
                     search_input.props('outlined dense')
                 
-                # Products container
+                # Products container; only this is re-rendered when filters change
                 products_container = ui.column().classes('w-full')
-                await render_products(products_container)
+                with products_container:
+                    ui.spinner(size='lg').classes('mx-auto my-12')
+                grid = ProductGrid(
+                    products_container,
+                    card_factory=lambda product: create_product_card(product, session_id),
+                    page_size=settings.grid_page_size,
+                    max_pages=settings.grid_max_pages,
+                    columns=3
+                )
+                search = IncrementalSearch(
+                    catalog,
+                    grid.show,
+                    debounce=settings.search_debounce_ms / 1000
+                )
         
         # Cart sidebar
         cart_sidebar = ui.column().classes('cart-sidebar')
-        await create_cart_sidebar(cart_sidebar)
+        sidebar = await create_cart_sidebar(
+            cart_sidebar,
+            on_quantity=lambda product_id, quantity: update_quantity(session_id, product_id, quantity),
+            on_close=lambda: toggle_cart(cart_sidebar, overlay),
+            on_add=lambda product: add_to_cart(session_id, product)
+        )
         
         # Overlay
         overlay = ui.element('div').classes('overlay')
-        overlay.on('click', toggle_cart)
-
-async def render_products(container):
-    """Render product grid"""
-    container.clear()
-    
-    products = store_manager.get_filtered_products(
-        category=current_category if current_category != 'all' else None,
-        search_query=search_query if search_query else None
-    )
-    
-    if not products:
-        with container:
-            ui.label('No products found').classes('text-center text-gray-500 text-xl py-12')
-        return
+        overlay.on('click', lambda: toggle_cart(cart_sidebar, overlay))
     
-    with container:
-        with ui.grid(columns=3).classes('w-full gap-6'):
-            for product in products:
-                await create_product_card(product)
+    ui.on('filter', lambda e: apply_filter(search, e.args))
+    return StorePage(session_id, search, cart_indicator, sidebar)
 
-async def create_product_card(product: Product):
+def show_catalog_unavailable():
+    """Tell the visitor the store cannot be shown until the catalog loads"""
+    with ui.column().classes('w-full min-h-screen items-center justify-center gap-4 bg-gray-50'):
+        ui.label('The store is temporarily unavailable').classes('text-2xl font-bold text-gray-800')
+        ui.label('We could not load our products. Please try again in a moment.').classes('text-gray-600')
+        ui.button('Try again', on_click=ui.navigate.reload).classes('cart-button')
+
+@timed('home_page_content')
+async def fill_store_page(page: StorePage):
+    """Render the products and cart of a connected store page"""
+    await page.search.refresh()
+    await watch_cart(page.session_id, page.cart_indicator, page.sidebar)
+
+    observe_page('/')
+
+async def create_product_card(product: Product, session_id: str):
     """Create individual product card"""
-    with ui.card().classes('product-card cursor-pointer').on('click', lambda p=product: show_product_details(p)):
+    view = card_cache.get(product)
+    with ui.card().classes('product-card cursor-pointer').on('click', lambda p=product: show_product_details(p, session_id)):
         # Product image
-        ui.image(product.image_url).classes('w-full h-64 object-cover')
+        ui.image(view.image_url).classes('w-full h-64 object-cover')
         
         with ui.card_section().classes('p-4'):
             # Product name
-            ui.label(product.name).classes('text-lg font-semibold text-gray-800 mb-2')
+            ui.label(view.name).classes('text-lg font-semibold text-gray-800 mb-2')
             
             # Product category
-            ui.label(product.category.title()).classes('text-sm text-gray-500 mb-2')
+            ui.label(view.category_title).classes('text-sm text-gray-500 mb-2')
             
             # Price and cart button
             with ui.row().classes('w-full justify-between items-center'):
-                ui.label(f'${product.price:.2f}').classes('price-tag')
+                ui.label(view.price_text).classes('price-tag')
                 
                 ui.button(
                     'Add to Cart',
-                    on_click=lambda p=product: add_to_cart(p)
+                    on_click=lambda p=product: add_to_cart(session_id, p)
                 ).classes('cart-button').props('dense')
 
-def filter_by_category(category: str):
-    """Filter products by category"""
-    global current_category
-    current_category = category
-    # Trigger re-render
-    ui.run_javascript('location.reload()')
-
-def filter_by_price(min_price: float, max_price: float):
-    """Filter products by price range"""
-    # Implementation for price filtering
-    pass
-
-def search_products(query: str):
-    """Search products by name"""
-    global search_query
-    search_query = query
-    # Trigger re-render
-    ui.run_javascript('location.reload()')
-
-def add_to_cart(product: Product):
+def apply_filter(search: IncrementalSearch, selection: Dict[str, Optional[str]]):
+    """Apply a category or price filter clicked in the page shell"""
+    if selection.get('group') == 'category':
+        search.set_category(selection.get('value') or 'all')
+    elif selection.get('group') == 'price':
+        search.set_price_range(price_range(selection.get('value')))
+
+def search_products(search: IncrementalSearch, query: str):
+    """Search products by name and description as the user types"""
+    search.set_query(query)
+
+def get_session_id() -> str:
+    """Get the browser session id of the page being built"""
+    return app.storage.browser['id']
+
+async def get_cart(session_id: str) -> CartManager:
+    """Get the cart for a browser session"""
+    return await cart_store.load(session_id)
+
+@timed('add_to_cart')
+async def add_to_cart(session_id: str, product: Product):
     """Add product to shopping cart"""
-    cart_manager.add_item(product)
+    cart = await get_cart(session_id)
+    cart.add_item(product)
     ui.notify(f'Added {product.name} to cart!', type='positive')
-    update_cart_display()
 
-def show_product_details(product: Product):
+async def update_quantity(session_id: str, product_id: str, quantity: int):
+    """Change the quantity of a cart item, removing it at zero"""
+    cart = await get_cart(session_id)
+    cart.update_quantity(product_id, quantity)
+
+def show_product_details(product: Product, session_id: str):
     """Show product details modal"""
+    from app.components.product_modal import create_product_modal
+
     global selected_product
     selected_product = product
-    create_product_modal(product)
+    create_product_modal(
+        product,
+        similar=current_products(get_recommender().index.similar(product.id, SIMILAR_IN_MODAL)),
+        available=get_order_pipeline().available(product),
+        on_add_to_cart=lambda p: add_to_cart(session_id, p),
+        on_select=lambda p: show_product_details(p, session_id)
+    )
 
-def toggle_cart():
-    """Toggle cart sidebar visibility"""
-    global cart_visible
-    cart_visible = not cart_visible
-    
-    # Update UI classes
-    ui.run_javascript(f'''
-        document.querySelector('.cart-sidebar').classList.toggle('visible', {str(cart_visible).lower()});
-        document.querySelector('.overlay').classList.toggle('visible', {str(cart_visible).lower()});
-    ''')
+def current_products(products: List[Product]) -> List[Product]:
+    """Recommended products as the current catalog has them
+
+    The recommendation index catches up with a new catalog shortly after it
+    is published; until then its products are looked up again.
+    """
+    if get_recommender().index.products is catalog.store.index.columns:
+        return products
+    return [current for current in map(catalog.store.get_product, (product.id for product in products)) if current is not None]
+
+def toggle_cart(sidebar: ui.element, overlay: ui.element):
+    """Toggle cart sidebar visibility on this page"""
+    sidebar.classes(toggle='visible')
+    overlay.classes(toggle='visible')
+
+async def watch_cart(session_id: str, indicator: 'CartIndicator', sidebar: 'CartSidebar'):
+    """Keep the cart badge and sidebar of this page in step with the session's cart
+
+    The page hears about its own session's cart and about the products in
+    it, nothing else; bursts of changes are rendered once per update window.
+    """
+    live = LiveUpdates(events, ui.context.client, delay=get_settings().ui_update_ms / 1000)
+    await get_cart(session_id)
+    order_pipeline = get_order_pipeline()
 
-def update_cart_display():
-    """Update cart display with current items"""
-    # This will be implemented in the cart sidebar component
-    pass
+    def render():
+        cart = cart_store.peek(session_id)
+        items = cart.get_items() if cart is not None else []
+        _, totals = order_pipeline.quote(items)
+        available = {item.product.id: order_pipeline.available(item.product) for item in items}
+        threshold = get_settings().low_stock_threshold
+        low_stock = {product_id: units for product_id, units in available.items() if units <= threshold}
+        suggestions = current_products(get_recommender().index.suggest(available, SUGGESTIONS_IN_CART))
+        indicator.show(sum(item.quantity for item in items), totals.subtotal)
+        sidebar.show(items, totals, low_stock, suggestions)
+        live.follow('product', available, 'cart', render)
+
+    live.on('cart', session_id, 'cart', render)
+    render()
 
 @ui.page('/checkout')
+@timed('checkout_page')
 async def checkout_page():
     """Checkout page"""
+    session_id = get_session_id()
+    
     ui.label('Checkout').classes('text-3xl font-bold text-center py-8')
     
     with ui.column().classes('max-w-2xl mx-auto p-6'):
         ui.label('Order Summary').classes('text-xl font-semibold mb-4')
         
         # Cart items
-        cart_items = cart_manager.get_items()
-        total = 0
+        lines, totals = get_order_pipeline().quote((await get_cart(session_id)).get_items())
         
-        for item in cart_items:
+        for line in lines:
             with ui.row().classes('w-full justify-between items-center py-2 border-b'):
-                ui.label(f'{item.product.name} x{item.quantity}')
-                item_total = item.product.price * item.quantity
-                ui.label(f'${item_total:.2f}')
-                total += item_total
+                ui.label(f'{line.name} x{line.quantity}')
+                ui.label(f'${line.total}')
+        
+        with ui.row().classes('w-full justify-between items-center pt-4'):
+            ui.label('Subtotal:')
+            ui.label(f'${totals.subtotal}')
+        with ui.row().classes('w-full justify-between items-center py-2'):
+            ui.label('Tax:')
+            ui.label(f'${totals.tax}')
         
         # Total
         with ui.row().classes('w-full justify-between items-center py-4 text-xl font-bold'):
             ui.label('Total:')
-            ui.label(f'${total:.2f}').classes('price-tag')
+            ui.label(f'${totals.total}').classes('price-tag')
         
         # Checkout form
         ui.separator()
@@ -323,24 +437,106 @@ async def checkout_page():
             ui.input('Expiry Date').props('outlined')
             ui.input('CVV').props('outlined')
         
-        # Place order button
+        # Place order button; the key makes repeated clicks and resubmits one order
+        idempotency_key = uuid.uuid4().hex
         ui.button(
             'Place Order',
-            on_click=lambda: place_order()
+            on_click=lambda e: place_order(session_id, idempotency_key, e.sender)
         ).classes('w-full mt-8 bg-orange-500 text-white py-3 text-lg font-bold rounded-lg hover:bg-orange-600')
+    
+    observe_page('/checkout')
 
-def place_order():
-    """Simulate order placement"""
-    cart_manager.clear()
-    ui.notify('Order placed successfully! Thank you for your purchase.', type='positive')
+@timed('place_order')
+async def place_order(session_id: str, idempotency_key: str, button: ui.button):
+    """Queue the order and take what it holds out of the cart once it is stored"""
+    cart = await get_cart(session_id)
+    if cart.is_empty():
+        ui.notify('Your cart is empty.', type='warning')
+        return
+    button.disable()
+    try:
+        order = await get_order_pipeline().submit(idempotency_key, session_id, cart.get_items())
+    except Exception:
+        logger.exception('Placing order for session %s failed', session_id)
+        ui.notify('We could not place your order. Please try again.', type='negative')
+        button.enable()
+        return
+    # Only what was ordered; items added while the order was being stored stay in the cart
+    cart.subtract({line.product_id: line.quantity for line in order.lines})
+    ui.notify(f'Order {order.id[:8].upper()} placed! Thank you for your purchase.', type='positive')
     ui.navigate.to('/')
 
+@app.get('/healthz')
+def healthz():
+    """Readiness probe reporting the process and catalog it serves; 503 until a catalog is loaded"""
+    status = {
+        'status': 'ok' if catalog.ready else 'unavailable',
+        'pid': os.getpid(),
+        'catalog_version': catalog.version,
+        'products': len(catalog.store),
+        'catalog_failures': catalog.failures,
+        'catalog_error': catalog.last_error
+    }
+    return status if catalog.ready else JSONResponse(status, status_code=503)
+
+def configure_app(build_static: bool = True):
+    """Register static files, routes and lifecycle hooks"""
+    settings = get_settings()
+    
+    if build_static:
+        build_assets()
+    app.mount('/static', PrecompressedStaticFiles(directory='static'), name='static')
+    from app.images import ImageProxy
+
+    image_proxy = ImageProxy(
+        product_lookup=lambda product_id: catalog.store.get_product(product_id),
+        cache_dir=settings.image_cache_dir,
+        max_cache_bytes=settings.image_cache_max_mb * 1024 * 1024,
+        default_size=settings.default_image_size,
+        quality=settings.image_quality,
+        workers=settings.image_workers
+    )
+    image_proxy.install(app)
+    on_settings_change(lambda old, new: image_proxy.configure(new.default_image_size, new.image_quality))
+    # Cards hold image URLs, which change with the image settings
+    on_settings_change(lambda old, new: card_cache.clear() if (
+        (old.default_image_size, old.image_quality) != (new.default_image_size, new.image_quality)
+    ) else None)
+    if settings.metrics_enabled:
+        from app.metrics import metrics
+
+        metrics.install(app)
+        metrics.gauge('card_cache', 'Product card render cache statistics', card_cache.stats)
+        metrics.gauge('page_shell', 'Page shell cache statistics', page_shells.stats)
+        metrics.gauge('carts', 'Cart store statistics', lambda: asdict(cart_store.metrics()))
+        metrics.gauge('orders', 'Order pipeline statistics', lambda: get_order_pipeline().stats())
+        metrics.gauge('events', 'Event bus statistics', events.stats)
+        metrics.gauge('recommendations', 'Recommendation index statistics', lambda: get_recommender().stats())
+        metrics.gauge('catalog_products', 'Products in the current catalog', lambda: len(catalog.store))
+    app.on_startup(catalog.start)
+    app.on_startup(cart_store.start)
+    app.on_startup(start_order_pipeline)
+    app.on_shutdown(catalog.stop)
+    app.on_shutdown(cart_store.stop)
+    app.on_shutdown(stop_order_pipeline)
+    app.on_shutdown(stop_recommender)
+    app.on_shutdown(close_http_client)
+    if settings.settings_reload_interval:
+        watcher = SettingsWatcher('.env', interval=settings.settings_reload_interval)
+        app.on_startup(watcher.start)
+        app.on_shutdown(watcher.stop)
+
 def start_app():
     """Start the Nike Shoe Store application"""
     settings = get_settings()
     
-    # Configure the app
-    app.add_static_files('/static', 'static')
+    if settings.workers > 1:
+        # Production mode: a supervisor process spawns workers sharing one socket
+        from app.workers import run_workers
+        run_workers(settings)
+        return
+    
+    configure_app()
     
     # Run the application
     ui.run(
@@ -349,5 +545,8 @@ def start_app():
         title=settings.store_name,
         favicon='🏃',
         dark=False,
-        show=False
+        show=False,
+        # The reloader would serve from a second process that re-imports everything
+        reload=False,
+        storage_secret=settings.storage_secret
     )
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Opt-in performance instrumentation with a Prometheus /metrics endpoint
+
+Instrumentation is switched on with METRICS_ENABLED. When it is off,
+`timed` returns the decorated function unchanged and `install` registers
+nothing, so instrumented code pays no overhead at all. With several workers
+every process keeps its own metrics; a scrape reports the worker that
+answered it.
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi.responses import PlainTextResponse
+from nicegui import App, Client
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ELEMENT_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LOOP_LAG_INTERVAL = 0.5
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+def _escape(text: str, quote: bool = True) -> str:
+    # The text format escapes backslash and newline in HELP lines and label
+    # values, and double quotes in label values
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quote else text
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Monotonically increasing count"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f'{self.name}_total{_format_labels(labels)} {_format_value(value)}'
+
+class Gauge:
+    """A value that goes up and down, set directly or read from a callback at scrape time
+
+    A callback may return a dict of values, which become samples labelled
+    with `stat`, so one call can feed a family of related numbers.
+    """
+
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], Union[float, Dict[str, float]]]] = None):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self.values[_labels(labels)] = value
+
+    def samples(self) -> Iterable[str]:
+        if self.callback is not None:
+            try:
+                value = self.callback()
+                if isinstance(value, dict):
+                    for stat, stat_value in value.items():
+                        self.values[(('stat', stat),)] = stat_value
+                else:
+                    self.values[()] = value
+            except Exception:
+                logger.exception('Gauge %s callback failed', self.name)
+        for labels, value in self.values.items():
+            yield f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        series = self.series.get(key)
+        if series is None:
+            # One slot per bucket plus +Inf, then the sum
+            series = self.series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(labels, ("le", _format_value(bound)))} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(labels)} {_format_value(series[-1])}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative}'
+
+class Metrics:
+    """Registry of metrics and the instrumentation helpers built on it"""
+
+    TYPES = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}
+
+    def __init__(self, enabled: bool = False, namespace: str = 'store'):
+        self.enabled = enabled
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        name = f'{self.namespace}_{name}'
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter, name, help)
+
+    def gauge(self, name: str, help: str, callback: Optional[Callable[[], Union[float, Dict[str, float]]]] = None) -> Gauge:
+        return self._register(Gauge, name, help, callback)
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, buckets)
+
+    def timed(self, name: str) -> Callable:
+        """Record the duration of every call of a function, sync or async
+
+        Durations go to the `<namespace>_call_seconds` histogram labelled with
+        `name`; failures also count in `<namespace>_call_errors_total`.
+        """
+        def decorator(func: Callable) -> Callable:
+            if not self.enabled:
+                return func
+            histogram = self.histogram('call_seconds', 'Duration of instrumented calls')
+            errors = self.counter('call_errors', 'Instrumented calls that raised')
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception:
+                        errors.inc(function=name)
+                        raise
+                    finally:
+                        histogram.observe(time.perf_counter() - start, function=name)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    errors.inc(function=name)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start, function=name)
+            return wrapper
+        return decorator
+
+    def observe_page(self, client: Client, page: str):
+        """Record how many elements a freshly built page holds"""
+        if self.enabled:
+            self.histogram('page_elements', 'Elements per page after it is built', ELEMENT_BUCKETS) \
+                .observe(len(client.elements), page=page)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {_escape(metric.help, quote=False)}')
+            lines.append(f'# TYPE {name} {self.TYPES[type(metric)]}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def install(self, app: App):
+        """Register /metrics, client gauges and the loop lag monitor"""
+        if not self.enabled:
+            return
+        self.gauge('clients', 'Connected NiceGUI clients',
+                   lambda: sum(1 for client in Client.instances.values() if client.has_socket_connection))
+        self.gauge('elements', 'NiceGUI elements alive across all clients',
+                   lambda: sum(len(client.elements) for client in Client.instances.values()))
+        self.histogram('event_loop_lag_seconds', 'Delay of a timer on the event loop beyond its deadline')
+        app.add_api_route('/metrics', self.handle, methods=['GET'], include_in_schema=False)
+        app.on_startup(self._start_lag_monitor)
+        app.on_shutdown(self._stop_lag_monitor)
+
+    def handle(self) -> PlainTextResponse:
+        return PlainTextResponse(self.render(), media_type='text/plain; version=0.0.4')
+
+    def _start_lag_monitor(self):
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+
+    def _stop_lag_monitor(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _monitor_loop_lag(self):
+        histogram = self.histogram('event_loop_lag_seconds', 'Delay of a timer on the event loop beyond its deadline')
+        gauge = self.gauge('event_loop_lag_last_seconds', 'Most recent event loop lag sample')
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+            histogram.observe(lag)
+            gauge.set(lag)
+
+metrics = Metrics(enabled=get_settings().metrics_enabled)
+timed = metrics.timed
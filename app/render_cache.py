@@ -0,0 +1,93 @@
+"""Cache of precomputed display data for product cards"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from core.columnar import ProductColumns
+from models.product import Product
+
+DESCRIPTION_LIMIT = 100
+
+@dataclass(frozen=True)
+class CardView:
+    """Everything a product card displays, already formatted"""
+    product_id: str
+    name: str
+    category_title: str
+    price_text: str
+    short_description: str
+    image_url: str
+
+    @classmethod
+    def from_product(cls, product: Product) -> 'CardView':
+        from app.images import image_url
+
+        description = product.description
+        if len(description) > DESCRIPTION_LIMIT:
+            description = description[:DESCRIPTION_LIMIT] + '...'
+        return cls(
+            product_id=product.id,
+            name=product.name,
+            category_title=product.category.title(),
+            price_text=f'${product.price:.2f}',
+            short_description=description,
+            image_url=image_url(product)
+        )
+
+class CardRenderCache:
+    """LRU cache of CardViews of the current catalog's products, keyed by product id
+
+    Card content only changes when the catalog does, so views are shared by
+    every client and every render until the next catalog refresh calls
+    `reset`. Pages can still hold products of an older catalog for a while;
+    their views are built on every call and never cached, so they cannot
+    stand in for the current catalog's products.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._products: Optional[ProductColumns] = None
+        self._views: 'OrderedDict[str, CardView]' = OrderedDict()
+
+    def get(self, product: Product) -> CardView:
+        """Get the display data for a product, computing it on first use"""
+        if self._products is None or not self._products.owns(product):
+            self.misses += 1
+            return CardView.from_product(product)
+        view = self._views.get(product.id)
+        if view is not None:
+            self.hits += 1
+            self._views.move_to_end(product.id)
+            return view
+        self.misses += 1
+        view = CardView.from_product(product)
+        self._views[product.id] = view
+        if len(self._views) > self.max_entries:
+            self._views.popitem(last=False)
+        return view
+
+    def reset(self, version: int, products: ProductColumns):
+        """Drop all views because the catalog changed to `products`"""
+        self.version = version
+        self._products = products
+        self.clear()
+
+    def clear(self):
+        """Drop all views, e.g. because the image URLs they hold changed"""
+        self._views.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._views),
+        }
+
+card_cache = CardRenderCache()
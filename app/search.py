@@ -0,0 +1,131 @@
+"""Per-client incremental product search"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.catalog import CatalogManager
+from core.index import tokenize
+from core.search import SearchResult
+from models.product import Product
+
+@dataclass
+class BrowseState:
+    """Filters selected by one client"""
+    category: str = 'all'
+    search_query: str = ''
+    price_range: Optional[Tuple[float, float]] = None
+
+@dataclass(frozen=True)
+class _SearchResult:
+    catalog_version: int
+    category: str
+    price_range: Optional[Tuple[float, float]]
+    search_query: str
+    ids: np.ndarray
+    # The ranked search behind `ids`, if there was search text
+    result: Optional[SearchResult] = None
+
+class IncrementalSearch:
+    """Debounced search for one client that only re-renders the product list
+
+    Search text is ranked by the catalog's search engine, whose cached full
+    results are narrowed to the selected category and price range, so
+    switching filters under the same query costs no new search. When the
+    query grows by appending characters and nothing else changed, only the
+    previous matches are scored, as long as the engine can tell that every
+    match of the longer query is among them. A newer keystroke cancels any
+    search that has not rendered yet.
+    """
+
+    def __init__(
+        self,
+        catalog: CatalogManager,
+        render: Callable[[Sequence[Product]], Awaitable[None]],
+        debounce: float = 0.04
+    ):
+        self.catalog = catalog
+        self.render = render
+        self.debounce = debounce
+        self.state = BrowseState()
+        self._last: Optional[_SearchResult] = None
+        self._task: Optional[asyncio.Task] = None
+        self._generation = 0
+
+    def set_query(self, query: str):
+        """Update the search text and schedule a debounced search"""
+        self.state.search_query = query or ''
+        self._schedule(self.debounce)
+
+    def set_category(self, category: str):
+        """Switch category and search immediately"""
+        self.state.category = category
+        self._schedule(0)
+
+    def set_price_range(self, price_range: Optional[Tuple[float, float]]):
+        """Switch price range and search immediately"""
+        self.state.price_range = price_range
+        self._schedule(0)
+
+    async def refresh(self):
+        """Search and render now, superseding anything pending"""
+        self._cancel_pending()
+        self._generation += 1
+        await self._run(0, self._generation)
+
+    def _cancel_pending(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def _schedule(self, delay: float):
+        self._cancel_pending()
+        self._generation += 1
+        self._task = asyncio.create_task(self._run(delay, self._generation))
+
+    async def _run(self, delay: float, generation: int):
+        if delay:
+            await asyncio.sleep(delay)
+        index = self.catalog.store.index
+        ids = self._search()
+        if generation != self._generation:
+            return
+        await self.render(index.view(ids))
+
+    def _search(self) -> np.ndarray:
+        state = self.state
+        version = self.catalog.version
+        store = self.catalog.store
+        query = state.search_query.strip().lower()
+        last = self._last
+        filters = dict(
+            category=state.category if state.category != 'all' else None,
+            min_price=state.price_range[0] if state.price_range else None,
+            max_price=state.price_range[1] if state.price_range else None
+        )
+
+        same_filters = (
+            last is not None
+            and last.catalog_version == version
+            and last.category == state.category
+            and last.price_range == state.price_range
+        )
+        if same_filters and last.search_query == query:
+            return last.ids
+
+        result = None
+        if not tokenize(query):
+            ids = store.index.query_ids(**filters)
+        else:
+            if same_filters and last.result is not None and query.startswith(last.search_query):
+                result = store.search.refine(query, last.result)
+            if result is None:
+                has_filters = any(value is not None for value in filters.values())
+                result = store.search.search(query, store.index.query_ids(**filters) if has_filters else None)
+            ids = result.rows
+
+        # Index and search arrays are never modified, so keeping a reference is safe
+        self._last = _SearchResult(version, state.category, state.price_range, query, ids, result)
+        return ids
@@ -0,0 +1,104 @@
+"""Pre-rendered shell of the store page
+
+The header branding, navigation and filter sidebar look the same for every
+visitor until the catalog or the settings change, so they are rendered to
+HTML once per catalog version and settings and sent as a few raw HTML
+elements instead of dozens of NiceGUI elements per page. Filter clicks are
+handled by app/assets/store.js, which emits a page-level "filter" event.
+"""
+
+from dataclasses import dataclass
+from html import escape
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.assets import asset_url
+from app.config import Settings
+
+NAVIGATION = ('Home', 'Men', 'Women', 'Kids', 'Sale')
+PRICE_RANGES = [
+    ('Under $100', (0, 100)),
+    ('$100 - $150', (100, 150)),
+    ('$150 - $200', (150, 200)),
+    ('Over $200', (200, 999)),
+]
+
+@dataclass(frozen=True)
+class PageShell:
+    """HTML of the parts of the store page shared by every visitor"""
+    catalog_version: int
+    settings: Settings
+    head: str
+    brand: str
+    navigation: str
+    filters: str
+
+def render_shell(catalog_version: int, settings: Settings, categories: List[str]) -> PageShell:
+    """Render the shell for a catalog version and settings"""
+    brand = (
+        '<div class="flex items-center gap-4">'
+        '<span class="nike-logo text-3xl">✓</span>'
+        '<div class="flex flex-col">'
+        f'<span class="text-xl font-bold">{escape(settings.store_name)}</span>'
+        f'<span class="text-sm text-gray-300">{escape(settings.store_tagline)}</span>'
+        '</div></div>'
+    )
+    navigation = '<nav class="flex items-center gap-6">' + ''.join(
+        f'<a href="/" class="text-white hover:text-orange-300 font-medium">{label}</a>' for label in NAVIGATION
+    ) + '</nav>'
+
+    category_buttons = ''.join(
+        f'<button class="category-filter w-full{" active" if category == "all" else ""}" '
+        f'data-filter="category" data-value="{escape(category)}">{escape(category.title())}</button>'
+        for category in ['all'] + categories
+    )
+    price_buttons = ''.join(
+        f'<button class="category-filter w-full" data-filter="price" data-toggle data-value="{index}">{escape(label)}</button>'
+        for index, (label, _) in enumerate(PRICE_RANGES)
+    )
+    filters = (
+        '<div class="flex flex-col gap-1">'
+        '<div class="text-xl font-bold text-gray-800 mb-2">Categories</div>'
+        f'{category_buttons}'
+        '<hr class="my-4">'
+        '<div class="text-lg font-semibold text-gray-700 mb-2">Price Range</div>'
+        f'{price_buttons}'
+        '</div>'
+    )
+    head = (
+        f'<link rel="stylesheet" href="{asset_url("store.css")}">'
+        f'<script src="{asset_url("store.js")}" defer></script>'
+    )
+    return PageShell(catalog_version, settings, head=head, brand=brand, navigation=navigation, filters=filters)
+
+def price_range(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """The price range a filter button's value stands for; None clears the filter"""
+    if value is None or not value.isdigit() or int(value) >= len(PRICE_RANGES):
+        return None
+    return PRICE_RANGES[int(value)][1]
+
+class ShellCache:
+    """The shell of the current catalog version and settings
+
+    Only the latest shell is kept; a new catalog or a settings reload
+    renders the next one on the first request that sees it.
+    """
+
+    def __init__(self):
+        self._shell: Optional[PageShell] = None
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, catalog_version: int, settings: Settings, categories: Callable[[], List[str]]) -> PageShell:
+        shell = self._shell
+        # Settings are replaced as a whole on reload, so identity tells them apart
+        if shell is not None and shell.catalog_version == catalog_version and shell.settings is settings:
+            self.hits += 1
+            return shell
+        self.builds += 1
+        shell = self._shell = render_shell(catalog_version, settings, categories())
+        return shell
+
+    def stats(self) -> Dict[str, int]:
+        return {'builds': self.builds, 'hits': self.hits}
+
+page_shells = ShellCache()
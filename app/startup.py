@@ -0,0 +1,138 @@
+"""Startup profiling: where a cold start spends its time
+
+`python main.py --profile-startup` prints two breakdowns and exits without
+serving. The import breakdown comes from a fresh interpreter running
+`python -X importtime`, so nothing this process already loaded hides in it.
+The init breakdown times each startup phase in this process, up to the
+point where the catalog is ready and the first page could be served.
+"""
+
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Distribution name -> module to look up
+REQUIRED_PACKAGES = {
+    'nicegui': 'nicegui',
+    'uvicorn': 'uvicorn',
+    'python-dotenv': 'dotenv',
+    'httpx': 'httpx',
+    'numpy': 'numpy',
+}
+APP_PACKAGES = ('app', 'core', 'models', 'services')
+# Seconds the profile waits for the first catalog before giving up
+CATALOG_READY_TIMEOUT = 60.0
+
+def missing_packages(packages: Dict[str, str] = REQUIRED_PACKAGES) -> List[str]:
+    """Distributions whose module cannot be found, checked without importing them"""
+    return [package for package, module in packages.items() if importlib.util.find_spec(module) is None]
+
+class PhaseTimer:
+    """Wall-clock durations of named startup phases"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        lines = [f"{'phase':<28} {'ms':>9} {'share':>6}"]
+        for name, seconds in self.phases:
+            lines.append(f'{name:<28} {seconds * 1000:>9.1f} {seconds / total:>6.0%}' if total else name)
+        lines.append(f"{'total':<28} {total * 1000:>9.1f}")
+        return '\n'.join(lines)
+
+def import_times(module: str = 'app.main') -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of every import made by `import module` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+def import_report(times: List[Tuple[str, int, int]], top: int = 15) -> str:
+    """Import time grouped by top-level package, then this application's slowest modules"""
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in times:
+        by_package[name.split('.')[0]] += self_us
+    total = sum(by_package.values())
+
+    lines = [f"{'package':<28} {'ms':>9} {'share':>6}"]
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f'{package:<28} {self_us / 1000:>9.1f} {self_us / total:>6.0%}')
+    lines.append(f"{'total':<28} {total / 1000:>9.1f}")
+
+    own = [entry for entry in times if entry[0].split('.')[0] in APP_PACKAGES]
+    lines.append('')
+    lines.append(f"{'application module':<28} {'self ms':>9} {'incl. ms':>9}")
+    for name, self_us, cumulative_us in sorted(own, key=lambda entry: -entry[2])[:top]:
+        lines.append(f'{name:<28} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}')
+    return '\n'.join(lines)
+
+def profile_startup(timer: PhaseTimer, top: int = 15) -> bool:
+    """Print import and init breakdowns of a cold start; `timer` holds phases already run
+
+    Returns False, after reporting why, if the catalog did not load within
+    `CATALOG_READY_TIMEOUT` seconds.
+    """
+    print('Import time (python -X importtime -c "import app.main")')
+    print(import_report(import_times(), top))
+    print()
+
+    with timer.phase('import app.main'):
+        import app.main as store
+    with timer.phase('configure_app'):
+        store.configure_app()
+
+    async def run_startup_hooks():
+        # The same hooks, in the same order, as app.on_startup runs them
+        with timer.phase('catalog ready'):
+            await store.catalog.start()
+            ready = await store.catalog.wait_ready(timeout=CATALOG_READY_TIMEOUT)
+        if not ready:
+            await store.catalog.stop()
+            return False
+        with timer.phase('cart store'):
+            await store.cart_store.start()
+        with timer.phase('order pipeline'):
+            await store.start_order_pipeline()
+        recommender = store.get_recommender()
+        await recommender.wait_built()
+        await recommender.stop()
+        await store.stop_order_pipeline()
+        await store.cart_store.stop()
+        await store.catalog.stop()
+        return True
+
+    if not asyncio.run(run_startup_hooks()):
+        error = store.catalog.last_error or 'no error reported'
+        print(f'Catalog not ready after {CATALOG_READY_TIMEOUT:.0f}s: {error}')
+        return False
+    print(f'Init time ({len(store.catalog.store)} products)')
+    print(timer.report())
+    # Built off the critical path, after the catalog is already being served
+    print(f'recommendations, in background {store.get_recommender().index.build_seconds * 1000:>9.1f}')
+    return True
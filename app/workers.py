@@ -0,0 +1,369 @@
+"""
+Multi-worker production mode
+
+The supervisor process binds the listening socket once, loads the catalog
+from the configured source and publishes it as a memory-mapped snapshot
+file, then spawns WORKERS processes that each serve on their own unix socket
+and read the catalog from the snapshot instead of loading their own copy.
+
+A NiceGUI page lives in the worker that rendered it, and its websocket has
+to reach that same worker. The supervisor therefore accepts connections
+itself and forwards them with a StickyProxy: the first response a browser
+gets sets a cookie naming its worker, and later connections carrying the
+cookie go back to that worker for as long as it is up.
+
+The supervisor restarts workers that exit or whose event loop stops
+heartbeating, performs a rolling restart on SIGHUP and shuts everything down
+gracefully on SIGTERM/SIGINT.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import re
+import shutil
+import socket
+import tempfile
+import time
+from itertools import count
+from typing import Callable, List, Optional, Tuple
+
+from app.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 15.0
+STARTUP_TIMEOUT = 60.0
+SHUTDOWN_TIMEOUT = 20.0
+RESTART_BACKOFF_MAX = 30.0
+WORKER_COOKIE = 'store_worker'
+# Request and response heads larger than this are refused
+MAX_HEAD_BYTES = 64 * 1024
+PIPE_CHUNK = 64 * 1024
+
+def _worker_main(address: str, index: int, heartbeat):
+    """Entry point of a worker process"""
+    import uvicorn
+    from fastapi import FastAPI
+    from nicegui import app, ui
+
+    from app.main import catalog, configure_app
+
+    settings = get_settings()
+    configure_app(build_static=False)
+
+    async def beat():
+        await catalog.wait_ready()
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    app.on_startup(beat)
+
+    fastapi_app = FastAPI()
+    ui.run_with(
+        fastapi_app,
+        title=settings.store_name,
+        favicon='🏃',
+        dark=False,
+        storage_secret=settings.storage_secret,
+        show_welcome_message=False
+    )
+    config = uvicorn.Config(
+        fastapi_app,
+        uds=address,
+        log_level='debug' if settings.debug else 'info',
+        timeout_graceful_shutdown=int(SHUTDOWN_TIMEOUT / 2)
+    )
+    logger.info('Worker %d started (pid %d)', index, os.getpid())
+    uvicorn.Server(config).run()
+
+class Worker:
+    """A worker process slot supervised by the Supervisor"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        # Unix socket the current process serves on
+        self.address: Optional[str] = None
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.failures = 0
+        # When a worker that failed is due to be spawned again
+        self.restart_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.heartbeat is not None and self.heartbeat.value > 0
+
+    @property
+    def serving(self) -> bool:
+        """Whether the proxy may send connections to this worker"""
+        return self.ready and self.restart_at is None and self.process is not None and self.process.is_alive()
+
+    def healthy(self, now: float) -> bool:
+        if self.process is None or not self.process.is_alive():
+            return False
+        if self.ready:
+            return now - self.heartbeat.value < HEARTBEAT_TIMEOUT
+        return now - self.started_at < STARTUP_TIMEOUT
+
+class StickyProxy:
+    """Forwards client connections to workers, keeping each browser on one worker
+
+    A connection goes to the worker named by its WORKER_COOKIE if that
+    worker is serving; otherwise the next serving worker is picked round
+    robin and the first response on the connection sets the cookie. Each
+    connection is forwarded as a whole, so keep-alive requests and upgraded
+    websockets stay on the worker their first request went to.
+    """
+
+    def __init__(self, workers: Callable[[], List[Worker]]):
+        self.workers = workers
+        self._cookie = re.compile(rf'^cookie:.*\b{WORKER_COOKIE}=(\d+)'.encode(), re.I | re.M)
+        self._next = 0
+
+    def choose(self, head: bytes) -> Tuple[Optional[Worker], bool]:
+        """The worker for a request head, and whether the cookie must be (re)set"""
+        serving = [worker for worker in self.workers() if worker.serving]
+        if not serving:
+            return None, False
+        match = self._cookie.search(head)
+        if match is not None:
+            for worker in serving:
+                if worker.index == int(match.group(1)):
+                    return worker, False
+        self._next = (self._next + 1) % len(serving)
+        return serving[self._next], True
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        upstream_writer = None
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            worker, assign = self.choose(head)
+            if worker is None:
+                writer.write(b'HTTP/1.1 503 Service Unavailable\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                return
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_unix_connection(worker.address, limit=MAX_HEAD_BYTES)
+            except OSError:
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                return
+            upstream_writer.write(head)
+            cookie = f'{WORKER_COOKIE}={worker.index}' if assign else None
+            await asyncio.gather(
+                self._pipe(reader, upstream_writer),
+                self._pipe(upstream_reader, writer, cookie),
+                return_exceptions=True
+            )
+        except ConnectionError:
+            pass
+        finally:
+            for stream in (upstream_writer, writer):
+                if stream is not None:
+                    stream.close()
+
+    @staticmethod
+    async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, cookie: Optional[str] = None):
+        """Copy one direction of a connection, setting `cookie` in the first response head"""
+        try:
+            if cookie is not None:
+                head = await reader.readuntil(b'\r\n\r\n')
+                writer.write(head[:-2] + f'set-cookie: {cookie}; Path=/; HttpOnly; SameSite=Lax\r\n\r\n'.encode())
+            while True:
+                data = await reader.read(PIPE_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        finally:
+            # Pass the end of this direction on; the other one may still be sending
+            if writer.can_write_eof() and not writer.is_closing():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    pass
+
+class Supervisor:
+    """Owns the shared socket, the catalog snapshot and the worker processes"""
+
+    def __init__(self, settings: Settings, snapshot_path: str):
+        self.settings = settings
+        self.snapshot_path = snapshot_path
+        self.context = multiprocessing.get_context('spawn')
+        self.socket: Optional[socket.socket] = None
+        self.workers: List[Worker] = [Worker(index) for index in range(settings.workers)]
+        self.proxy = StickyProxy(lambda: self.workers)
+        # Worker sockets; every spawn gets a new one, so a replacement never shares its predecessor's
+        self.run_dir = tempfile.mkdtemp(prefix='store-workers-')
+        self._spawns = count()
+        self._stopping = asyncio.Event()
+        self._restart_requested = False
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET6 if ':' in self.settings.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.settings.host, self.settings.port))
+        sock.listen(2048)
+        self.socket = sock
+
+    def spawn(self, worker: Worker) -> Worker:
+        worker.heartbeat = self.context.Value('d', 0.0, lock=False)
+        worker.address = os.path.join(self.run_dir, f'worker-{worker.index}-{next(self._spawns)}.sock')
+        worker.process = self.context.Process(
+            target=_worker_main,
+            args=(worker.address, worker.index, worker.heartbeat),
+            name=f'store-worker-{worker.index}',
+            daemon=False
+        )
+        worker.started_at = time.time()
+        worker.process.start()
+        return worker
+
+    def stop_process(self, process: multiprocessing.Process):
+        """Ask a worker to finish in-flight requests, then force it if needed"""
+        if process.is_alive():
+            process.terminate()
+            process.join(SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            logger.warning('Worker pid %d did not stop in time, killing it', process.pid)
+            process.kill()
+            process.join()
+
+    async def run(self):
+        from app.main import create_product_service
+        from core.snapshot import write_snapshot
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stopping.set)
+        loop.add_signal_handler(signal.SIGHUP, self._request_restart)
+
+        service = create_product_service(self.settings)
+        products = await self._first_load(service)
+        if products is None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            return
+        version = 1
+        await asyncio.to_thread(write_snapshot, self.snapshot_path, products, version)
+        logger.info('Published catalog v%d (%d products) to %s', version, len(products), self.snapshot_path)
+
+        self.bind()
+        server = await asyncio.start_server(self.proxy.handle, sock=self.socket, limit=MAX_HEAD_BYTES)
+        for worker in self.workers:
+            self.spawn(worker)
+        logger.info('Serving on %s:%d with %d workers', self.settings.host, self.settings.port, len(self.workers))
+
+        next_refresh = time.time() + self.settings.catalog_refresh_interval
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                if self._stopping.is_set():
+                    break
+                now = time.time()
+                await self._check_workers(now)
+                if self._restart_requested:
+                    self._restart_requested = False
+                    await self._rolling_restart()
+                if self.settings.catalog_refresh_interval > 0 and now >= next_refresh:
+                    next_refresh = now + self.settings.catalog_refresh_interval
+                    try:
+                        refreshed = await service.load_products()
+                    except Exception:
+                        logger.exception('Catalog refresh failed; workers keep the current snapshot')
+                        continue
+                    if refreshed is not products:
+                        products = refreshed
+                        version += 1
+                        await asyncio.to_thread(write_snapshot, self.snapshot_path, products, version)
+                        logger.info('Published catalog v%d (%d products)', version, len(products))
+        finally:
+            server.close()
+            await asyncio.gather(*(
+                asyncio.to_thread(self.stop_process, worker.process)
+                for worker in self.workers if worker.process is not None
+            ))
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            logger.info('All workers stopped')
+
+    async def _first_load(self, service):
+        """Load the catalog, retrying with backoff until it succeeds or shutdown is requested"""
+        from core.catalog import RETRY_BACKOFF_MAX, RETRY_BACKOFF_MIN
+
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                return await service.load_products()
+            except Exception:
+                failures += 1
+                backoff = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_MIN * 2 ** (failures - 1))
+                logger.exception('Initial catalog load failed (%d in a row); retrying in %.0fs', failures, backoff)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    def _request_restart(self):
+        self._restart_requested = True
+
+    async def _check_workers(self, now: float):
+        """Restart failed workers, each once its own backoff has passed"""
+        for worker in self.workers:
+            if worker.restart_at is None:
+                if worker.healthy(now):
+                    if worker.ready:
+                        worker.failures = 0
+                    continue
+                process = worker.process
+                if process is not None and process.is_alive():
+                    logger.warning('Worker %d (pid %d) stopped heartbeating; restarting it', worker.index, process.pid)
+                    await asyncio.to_thread(self.stop_process, process)
+                else:
+                    logger.warning('Worker %d exited with code %s; restarting it', worker.index, process.exitcode if process else None)
+                backoff = min(RESTART_BACKOFF_MAX, 2 ** worker.failures - 1)
+                worker.failures += 1
+                worker.restart_at = now + backoff
+                if backoff:
+                    logger.info('Worker %d will be restarted in %.0fs', worker.index, backoff)
+            if now >= worker.restart_at:
+                worker.restart_at = None
+                self.spawn(worker)
+
+    async def _rolling_restart(self):
+        """Replace workers one at a time, starting each new one before stopping the old"""
+        logger.info('Rolling restart of %d workers', len(self.workers))
+        for index, old in enumerate(self.workers):
+            new = self.spawn(Worker(index))
+            deadline = time.time() + STARTUP_TIMEOUT
+            while not new.ready and new.process.is_alive() and time.time() < deadline:
+                await asyncio.sleep(0.2)
+            if not new.ready:
+                logger.error('Replacement for worker %d did not become ready; keeping the old one', index)
+                await asyncio.to_thread(self.stop_process, new.process)
+                continue
+            self.workers[index] = new
+            if old.process is not None:
+                await asyncio.to_thread(self.stop_process, old.process)
+
+def run_workers(settings: Settings):
+    """Run the store with `settings.workers` processes behind one listening socket"""
+    from app.assets import build_assets
+
+    logging.basicConfig(level=logging.DEBUG if settings.debug else logging.INFO)
+    # Built once here so workers never race each other writing static files
+    build_assets()
+    snapshot_path = os.path.abspath(os.path.join('data', 'catalog.snapshot'))
+    # Spawned workers inherit the environment, so they pick up the snapshot
+    # through Settings.catalog_snapshot_path instead of the upstream source
+    os.environ['CATALOG_SNAPSHOT_PATH'] = snapshot_path
+    asyncio.run(Supervisor(settings, snapshot_path).run())
@@ -0,0 +1,75 @@
+"""
+Benchmark: memory of Product objects vs. columnar catalog storage
+
+Run from the repository root:
+    python -m benchmarks.bench_catalog_memory [--sizes 10000 100000 300000]
+
+Each representation is built from freshly parsed JSON records (as the
+catalog loaders do) while tracemalloc is tracing; the figure reported is
+the memory still allocated once construction finishes, so temporaries are
+excluded. "objects" is a list of Product dataclasses plus an id lookup
+dict, the shape the store used to hold. "columns" is ProductColumns and
+"columns+index" adds the ProductIndex built over it. "snapshot" is the
+private memory of columns mapped from a snapshot file; the file itself is
+shared page cache and its size is listed separately.
+"""
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+from dataclasses import asdict
+from typing import Callable, List
+
+from benchmarks.bench_product_index import make_products
+from core.columnar import ProductColumns
+from core.index import ProductIndex
+from core.snapshot import read_snapshot, write_snapshot
+from models.product import Product
+
+def retained_mb(build: Callable[[], object]) -> float:
+    """Megabytes still allocated by `build` once it has returned"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1e6
+
+def run(sizes: List[int]):
+    print(f"{'products':>9} {'objects MB':>11} {'columns MB':>11} {'+index MB':>10} {'snapshot MB':>12} {'file MB':>8} {'ratio':>6}")
+    for size in sizes:
+        payload = json.dumps([asdict(product) for product in make_products(size)])
+
+        def objects():
+            products = [Product(**record) for record in json.loads(payload)]
+            return products, {product.id: product for product in products}
+
+        def columns():
+            return ProductColumns.from_products(Product(**record) for record in json.loads(payload))
+
+        def indexed():
+            return ProductIndex(columns())
+
+        objects_mb = retained_mb(objects)
+        columns_mb = retained_mb(columns)
+        indexed_mb = retained_mb(indexed)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.snapshot')
+            write_snapshot(path, columns(), version=1)
+            snapshot_mb = retained_mb(lambda: read_snapshot(path))
+            file_mb = os.path.getsize(path) / 1e6
+        print(
+            f"{size:>9} {objects_mb:>11.1f} {columns_mb:>11.1f} {indexed_mb:>10.1f} "
+            f"{snapshot_mb:>12.2f} {file_mb:>8.1f} {objects_mb / columns_mb:>5.1f}x"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 300_000])
+    args = parser.parse_args()
+    run(args.sizes)
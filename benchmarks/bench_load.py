@@ -0,0 +1,416 @@
+"""
+Load test: simulated shoppers browsing, searching and checking out
+
+Run from the repository root:
+    python -m benchmarks.bench_load [--clients 50] [--duration 60] [--workers 1]
+        [--save benchmarks/results/baseline.json] [--compare benchmarks/results/baseline.json]
+
+Method: the store is started with `python main.py` on a free port (or an
+already running server is targeted with --url). Each simulated shopper
+behaves like a browser: it fetches a page over HTTP, reads the element tree
+and socket.io query NiceGUI embeds in the HTML, connects the websocket and
+then sends the same `event` messages the browser would for clicks and input
+changes. One flow is
+
+    browse      GET /, websocket connect and the products streamed in after it
+    search      type a query into the search input
+    add_to_cart click a random "Add to Cart" button
+    checkout    GET /checkout and websocket connect
+    place_order click "Place Order"
+
+An event's latency is the time until the server's first reply (element
+update, notification or navigation) arrives on the socket. Shoppers pause
+for an exponentially distributed think time between steps.
+
+While the shoppers run, `/healthz` is polled every 100 ms; it does no work,
+so its latency is dominated by how long requests wait for the event loop
+and is reported as event-loop lag. Server memory is the RSS of the server
+process and its children (Linux /proc) before the shoppers connect and
+with all of them connected; the difference divided by the number of
+shoppers is the per-client cost.
+
+--save writes the results as JSON. --compare diffs a run against such a
+file and exits with status 1 when a latency percentile, the loop lag or
+per-client memory grew, or throughput fell, by more than --threshold.
+"""
+
+import argparse
+import ast
+import asyncio
+import html
+import json
+import os
+import random
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+import socketio
+
+ACTIONS = ('browse', 'search', 'add_to_cart', 'checkout', 'place_order')
+SEARCH_TERMS = ['air', 'zoom', 'max', 'run', 'jordan', 'react', 'free', 'court', 'pegasus', 'dunk']
+REPLY_EVENTS = ('update', 'notify', 'navigate', 'open')
+EVENT_TIMEOUT = 10.0
+
+ELEMENTS_PATTERN = re.compile(r'parseElements\(String\.raw`(.*?)`\)', re.S)
+QUERY_PATTERN = re.compile(r'^\s*query: (\{.*\}),\s*$', re.M)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def rss_mb(pid: int) -> float:
+    """Resident memory of a process and its children"""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total / 1024
+
+class PageError(Exception):
+    """A page did not render or did not behave like the store"""
+
+class Shopper:
+    """One simulated browser session: cookies, the current page and its socket"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=30, follow_redirects=True)
+        self.sio: Optional[socketio.AsyncClient] = None
+        self.elements: Dict[str, Dict[str, Any]] = {}
+        self.client_id = ''
+        self._replies: asyncio.Queue = asyncio.Queue()
+
+    async def open(self, path: str, streamed: bool = False):
+        """Load a page and connect its websocket, as a browser does
+
+        With `streamed`, also wait for the first update the page pushes after
+        connecting, which is when a streamed page shows its content.
+        """
+        await self.disconnect()
+        response = await self.http.get(path)
+        response.raise_for_status()
+        elements = ELEMENTS_PATTERN.search(response.text)
+        query = QUERY_PATTERN.search(response.text)
+        if elements is None or query is None:
+            raise PageError(f'{path} is not a NiceGUI page')
+        self.elements = json.loads(html.unescape(elements.group(1)))
+        params = ast.literal_eval(query.group(1))
+        self.client_id = params['client_id']
+        params.update(tab_id=f'bench-{id(self)}', document_id=f'bench-{time.monotonic_ns()}')
+        params = {key: str(value).lower() if isinstance(value, bool) else value for key, value in params.items()}
+
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self._replies = asyncio.Queue()
+        self.sio.on('update', self._on_update)
+        for event in REPLY_EVENTS[1:]:
+            self.sio.on(event, self._on_reply(event))
+        await self.sio.connect(
+            f'{self.base_url}?{urlencode(params)}',
+            socketio_path='/_nicegui_ws/socket.io',
+            transports=['websocket'],
+            headers={'Cookie': '; '.join(f'{k}={v}' for k, v in self.http.cookies.items())},
+            wait_timeout=EVENT_TIMEOUT
+        )
+        if streamed:
+            await asyncio.wait_for(self._replies.get(), EVENT_TIMEOUT)
+
+    async def disconnect(self):
+        if self.sio is not None:
+            await self.sio.disconnect()
+            self.sio = None
+
+    async def close(self):
+        await self.disconnect()
+        await self.http.aclose()
+
+    def find(self, text: Optional[str] = None, **props: Any) -> List[str]:
+        """Ids of elements with the given text and props"""
+        return [
+            element_id for element_id, element in self.elements.items()
+            if (text is None or element.get('text') == text or element.get('props', {}).get('label') == text)
+            and all(element.get('props', {}).get(key) == value for key, value in props.items())
+        ]
+
+    async def trigger(self, element_id: str, event_type: str, *args: Any) -> float:
+        """Send a UI event and return the seconds until the server replies"""
+        element = self.elements[element_id]
+        listener = next(
+            (listener for listener in element.get('events', []) if listener['type'] == event_type), None
+        )
+        if listener is None:
+            raise PageError(f'element {element_id} has no {event_type} listener')
+        while not self._replies.empty():
+            self._replies.get_nowait()
+        start = time.perf_counter()
+        await self.sio.emit('event', {
+            'id': int(element_id),
+            'client_id': self.client_id,
+            'listener_id': listener['listener_id'],
+            'args': [json.dumps(arg) for arg in args],
+        })
+        await asyncio.wait_for(self._replies.get(), EVENT_TIMEOUT)
+        return time.perf_counter() - start
+
+    def _on_update(self, message: Dict[str, Any]):
+        for element_id, element in message.items():
+            if element_id.startswith('_'):
+                continue
+            if element is None:
+                self.elements.pop(element_id, None)
+            else:
+                self.elements[element_id] = element
+        self._replies.put_nowait('update')
+
+    def _on_reply(self, event: str):
+        def handler(*_):
+            self._replies.put_nowait(event)
+        return handler
+
+class LoadTest:
+    """Runs shoppers against a server and collects their timings"""
+
+    def __init__(self, base_url: str, clients: int, duration: float, think: float, seed: int = 1):
+        self.base_url = base_url
+        self.clients = clients
+        self.duration = duration
+        self.think = think
+        self.seed = seed
+        self.latencies: Dict[str, List[float]] = {action: [] for action in ACTIONS}
+        self.errors: Dict[str, int] = {action: 0 for action in ACTIONS}
+        self.flows = 0
+        self.loop_lag: List[float] = []
+        self._connected = 0
+        self._all_connected = asyncio.Event()
+
+    async def timed(self, action: str, step) -> bool:
+        start = time.perf_counter()
+        try:
+            elapsed = await step()
+        except Exception:
+            self.errors[action] += 1
+            return False
+        self.latencies[action].append(elapsed if elapsed is not None else time.perf_counter() - start)
+        return True
+
+    async def shopper(self, index: int, deadline: float):
+        rng = random.Random(self.seed * 1000 + index)
+        shopper = Shopper(self.base_url)
+        first = True
+        try:
+            while time.monotonic() < deadline:
+                if not await self.timed('browse', lambda: shopper.open('/', streamed=True)):
+                    await asyncio.sleep(1)
+                    continue
+                if first:
+                    first = False
+                    self._connected += 1
+                    if self._connected == self.clients:
+                        self._all_connected.set()
+                await self.pause(rng)
+
+                inputs = shopper.find(placeholder='Search Nike shoes...')
+                if inputs:
+                    term = rng.choice(SEARCH_TERMS)
+                    await self.timed('search', lambda: shopper.trigger(inputs[0], 'update:value', term))
+                    await self.pause(rng)
+
+                buttons = shopper.find('Add to Cart')
+                if buttons:
+                    await self.timed('add_to_cart', lambda: shopper.trigger(rng.choice(buttons), 'click', {}))
+                    await self.pause(rng)
+
+                if not await self.timed('checkout', lambda: shopper.open('/checkout')):
+                    continue
+                await self.pause(rng)
+                place = shopper.find('Place Order')
+                if place and await self.timed('place_order', lambda: shopper.trigger(place[0], 'click', {})):
+                    self.flows += 1
+        finally:
+            await shopper.close()
+
+    async def pause(self, rng: random.Random):
+        if self.think > 0:
+            await asyncio.sleep(rng.expovariate(1 / self.think))
+
+    async def probe_loop_lag(self, deadline: float):
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=30) as client:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    await client.get('/healthz')
+                    self.loop_lag.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+    async def run(self, server_pid: Optional[int]) -> Dict[str, Any]:
+        idle_mb = rss_mb(server_pid) if server_pid else 0.0
+        start = time.monotonic()
+        deadline = start + self.duration
+        tasks = [asyncio.create_task(self.shopper(index, deadline)) for index in range(self.clients)]
+        probe = asyncio.create_task(self.probe_loop_lag(deadline))
+        try:
+            await asyncio.wait_for(self._all_connected.wait(), self.duration)
+            loaded_mb = rss_mb(server_pid) if server_pid else 0.0
+        except asyncio.TimeoutError:
+            loaded_mb = rss_mb(server_pid) if server_pid else 0.0
+        await asyncio.gather(*tasks, probe)
+        elapsed = time.monotonic() - start
+        return self.report(elapsed, idle_mb, loaded_mb)
+
+    def report(self, elapsed: float, idle_mb: float, loaded_mb: float) -> Dict[str, Any]:
+        actions = {}
+        for action in ACTIONS:
+            values = self.latencies[action]
+            actions[action] = {
+                'count': len(values),
+                'errors': self.errors[action],
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+                'mean_ms': statistics.mean(values) * 1000 if values else 0.0,
+            }
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'config': {'clients': self.clients, 'duration': self.duration, 'think': self.think, 'seed': self.seed},
+            'actions': actions,
+            'throughput': {
+                'flows_per_s': self.flows / elapsed,
+                'actions_per_s': sum(len(values) for values in self.latencies.values()) / elapsed,
+            },
+            'loop_lag': {
+                'p50_ms': percentile(self.loop_lag, 0.50) * 1000,
+                'p99_ms': percentile(self.loop_lag, 0.99) * 1000,
+                'max_ms': max(self.loop_lag, default=0.0) * 1000,
+            },
+            'memory': {
+                'idle_mb': idle_mb,
+                'loaded_mb': loaded_mb,
+                'per_client_kb': (loaded_mb - idle_mb) * 1024 / self.clients if idle_mb else 0.0,
+            },
+        }
+
+def print_report(result: Dict[str, Any]):
+    print(f"{'action':<12} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for action, stats in result['actions'].items():
+        print(
+            f"{action:<12} {stats['count']:>7} {stats['errors']:>7} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    throughput, lag, memory = result['throughput'], result['loop_lag'], result['memory']
+    print(f"throughput   {throughput['flows_per_s']:.2f} flows/s, {throughput['actions_per_s']:.1f} actions/s")
+    print(f"loop lag     p50 {lag['p50_ms']:.1f} ms, p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+    if memory['idle_mb']:
+        print(
+            f"memory       {memory['idle_mb']:.1f} MB idle, {memory['loaded_mb']:.1f} MB loaded, "
+            f"{memory['per_client_kb']:.0f} kB per client"
+        )
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Human-readable regressions of `result` against `baseline`"""
+    regressions = []
+
+    def check(label: str, new: float, old: float, higher_is_worse: bool = True):
+        if old <= 0:
+            return
+        change = (new - old) / old
+        print(f"{label:<28} {old:>10.1f} -> {new:>10.1f} ({change:+.0%})")
+        if (change if higher_is_worse else -change) > threshold:
+            regressions.append(f'{label} {change:+.0%}')
+
+    for action, stats in result['actions'].items():
+        old = baseline['actions'].get(action)
+        if old is not None:
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                check(f'{action} {key}', stats[key], old[key])
+    check('flows/s', result['throughput']['flows_per_s'], baseline['throughput']['flows_per_s'], False)
+    check('loop lag p99_ms', result['loop_lag']['p99_ms'], baseline['loop_lag']['p99_ms'])
+    check('memory per_client_kb', result['memory']['per_client_kb'], baseline['memory']['per_client_kb'])
+    return regressions
+
+async def wait_until_ready(base_url: str, timeout: float = 90):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f'{base_url}/healthz')).json().get('products'):
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f'{base_url} did not become ready')
+
+def main(args: argparse.Namespace) -> int:
+    process = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        env = dict(os.environ, PORT=str(port), HOST='127.0.0.1', WORKERS=str(args.workers), DEBUG='false')
+        process = subprocess.Popen([sys.executable, 'main.py'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_until_ready(base_url))
+        test = LoadTest(base_url, args.clients, args.duration, args.think, args.seed)
+        result = asyncio.run(test.run(process.pid if process else args.pid))
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    result['config']['workers'] = args.workers
+    print_report(result)
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f"saved {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print('REGRESSIONS: ' + ', '.join(regressions))
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--think', type=float, default=0.5, help='mean pause between steps in seconds')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--pid', type=int, help='server pid for memory figures when using --url')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to diff against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression')
+    sys.exit(main(parser.parse_args()))
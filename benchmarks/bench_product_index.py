@@ -0,0 +1,108 @@
+"""
+Benchmark: indexed product queries vs. a naive linear scan
+
+Run from the repository root:
+    python -m benchmarks.bench_product_index [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List, Optional
+
+from core.index import ProductIndex, tokenize
+from models.product import Product
+
+CATEGORIES = ['running', 'basketball', 'lifestyle', 'training']
+WORDS = [
+    'air', 'zoom', 'max', 'pegasus', 'react', 'flyknit', 'court', 'retro', 'low', 'high',
+    'trail', 'free', 'metcon', 'vapor', 'dunk', 'force', 'blazer', 'cortez', 'waffle', 'invincible',
+    'cushion', 'foam', 'mesh', 'leather', 'grip', 'light', 'stable', 'classic', 'premium', 'street',
+]
+
+def make_products(count: int, seed: int = 7) -> List[Product]:
+    """Generate a synthetic catalog"""
+    rng = random.Random(seed)
+    return [
+        Product(
+            id=f'sku-{i}',
+            name='Nike ' + ' '.join(rng.sample(WORDS, 3)) + f' {i % 50}',
+            price=round(rng.uniform(40, 300), 2),
+            category=rng.choice(CATEGORIES),
+            description=' '.join(rng.choices(WORDS, k=12)),
+            stock=rng.randint(0, 100)
+        )
+        for i in range(count)
+    ]
+
+def naive_query(
+    products: List[Product],
+    category: Optional[str] = None,
+    search_query: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None
+) -> List[Product]:
+    """The linear scan the index replaces, with identical semantics
+
+    tests/test_index.py checks the index against it.
+    """
+    query_tokens = tokenize(search_query) if search_query else []
+    results = []
+    for product in products:
+        if category and product.category != category:
+            continue
+        if min_price is not None and product.price < min_price:
+            continue
+        if max_price is not None and product.price >= max_price:
+            continue
+        if query_tokens:
+            tokens = tokenize(product.name) + tokenize(product.description)
+            if not all(any(t.startswith(q) for t in tokens) for q in query_tokens):
+                continue
+        results.append(product)
+    if sort_by == 'price_asc':
+        results.sort(key=lambda p: p.price)
+    elif sort_by == 'price_desc':
+        results.sort(key=lambda p: p.price, reverse=True)
+    elif sort_by == 'name':
+        results.sort(key=lambda p: p.name.lower())
+    return results[offset:offset + limit] if limit is not None else results[offset:]
+
+SCENARIOS = [
+    ('category', dict(category='running', limit=24)),
+    ('price range', dict(min_price=100, max_price=150, limit=24)),
+    ('search', dict(search_query='zoom', limit=24)),
+    ('search prefix', dict(search_query='air pe', limit=24)),
+    ('combined + sort', dict(category='lifestyle', search_query='retro', min_price=100, max_price=200, sort_by='price_asc', limit=24)),
+]
+
+def time_call(fn: Callable[[], object], repeat: int) -> float:
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def run(sizes: List[int], repeat: int):
+    print(f"{'products':>9} {'scenario':<16} {'naive ms':>10} {'index ms':>10} {'speedup':>8}")
+    for size in sizes:
+        products = make_products(size)
+        start = time.perf_counter()
+        index = ProductIndex(products)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"{size:>9} {'index build':<16} {'':>10} {build_ms:>10.2f}")
+        for name, kwargs in SCENARIOS:
+            scan_repeat = max(1, repeat * 1000 // size)
+            naive_ms = time_call(lambda: naive_query(products, **kwargs), scan_repeat)
+            index_ms = time_call(lambda: index.query(**kwargs), repeat)
+            print(f"{size:>9} {name:<16} {naive_ms:>10.3f} {index_ms:>10.3f} {naive_ms / index_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,63 @@
+"""
+Benchmark: recommendation index build, incremental update and lookup
+
+Run from the repository root:
+    python -m benchmarks.bench_recommendations [--sizes 10000 100000] [--changes 100]
+
+"full" builds the index from scratch, "update" indexes the same catalog
+with `--changes` products repriced, renamed or replaced, as a catalog
+refresh does. "lookup" is one `similar` call, which is all a request does.
+"""
+
+import argparse
+import dataclasses
+import random
+import time
+from typing import List
+
+from benchmarks.bench_product_index import make_products
+from core.columnar import ProductColumns
+from core.recommendations import RecommendationIndex
+
+def changed_catalog(products, changes: int, seed: int = 0):
+    """A copy of `products` with `changes` products modified, removed or added"""
+    rng = random.Random(seed)
+    products = list(products)
+    for i in range(changes):
+        pos = rng.randrange(len(products))
+        kind = i % 3
+        if kind == 0:
+            products[pos] = dataclasses.replace(products[pos], price=round(products[pos].price * 1.25, 2))
+        elif kind == 1:
+            products[pos] = dataclasses.replace(products[pos], name=products[pos].name + ' SE')
+        else:
+            products[pos] = dataclasses.replace(products[pos], id=f'new-{i}')
+    return products
+
+def run(sizes: List[int], changes: int, k: int):
+    print(f"{'products':>9} {'full s':>8} {'update s':>9} {'rescored':>9} {'lookup us':>10} {'MB':>6}")
+    for size in sizes:
+        products = make_products(size)
+        columns = ProductColumns.from_products(products)
+        index = RecommendationIndex.build(columns, k)
+
+        updated = index.updated(ProductColumns.from_products(changed_catalog(products, changes)))
+
+        ids = [product.id for product in products[:1000]]
+        start = time.perf_counter()
+        for product_id in ids:
+            updated.similar(product_id)
+        lookup_us = (time.perf_counter() - start) * 1e6 / len(ids)
+
+        print(
+            f'{size:>9} {index.build_seconds:>8.2f} {updated.build_seconds:>9.2f} {updated.rescored:>9}'
+            f' {lookup_us:>10.1f} {updated.stats()["bytes"] / 1e6:>6.1f}'
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('-k', type=int, default=8)
+    args = parser.parse_args()
+    run(args.sizes, args.changes, args.k)
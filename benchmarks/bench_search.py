@@ -0,0 +1,99 @@
+"""
+Benchmark: ranked search engine build and query latency
+
+Run from the repository root:
+    python -m benchmarks.bench_search [--sizes 10000 100000] [--repeat 50]
+
+"cold" is a query with the result cache cleared before every call, "cached"
+a repeat of the same query and "filtered" a cached query narrowed to one
+category, as switching filters does. The "type" rows are the mean cold
+time per keystroke of typing TYPED one character at a time, searching the
+whole catalog each time or refining the previous keystroke's result as the
+store page does. The last rows time indexing a new catalog version with one
+product renamed, incrementally and from scratch.
+"""
+
+import argparse
+import dataclasses
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.bench_product_index import make_products
+from core.columnar import ProductColumns
+from core.search import SearchEngine
+
+QUERIES = [
+    ('one word', 'zoom'),
+    ('short prefix', 'p'),
+    ('two words', 'air pe'),
+    ('stemmed', 'cushioning'),
+    ('typo', 'pegasos'),
+    ('typo + word', 'invincble foam'),
+    ('no match', 'zzzz'),
+]
+TYPED = 'air pegasus cushion'
+
+def time_call(fn: Callable[[], object], repeat: int) -> float:
+    """Mean milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def time_typing(engine: SearchEngine, text: str, refine: bool, repeat: int) -> float:
+    """Mean cold milliseconds per keystroke of typing `text`"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        previous = None
+        for end in range(1, len(text) + 1):
+            engine._cache.clear()
+            result = engine.refine(text[:end], previous) if refine and previous is not None else None
+            previous = result if result is not None else engine.search(text[:end])
+    return (time.perf_counter() - start) * 1000 / (repeat * len(text))
+
+def run(sizes: List[int], repeat: int):
+    print(f"{'products':>9} {'query':<14} {'matches':>8} {'cold ms':>9} {'cached ms':>10} {'filtered ms':>11}")
+    for size in sizes:
+        columns = ProductColumns.from_products(make_products(size))
+        start = time.perf_counter()
+        engine = SearchEngine(columns)
+        print(f"{size:>9} {'build':<14} {'':>8} {(time.perf_counter() - start) * 1000:>9.1f}")
+
+        def cold(query: str):
+            engine._cache.clear()
+            return engine.search(query)
+
+        category = columns.pools['category'][0]
+        in_category = [row for row, product in enumerate(columns) if product.category == category]
+        candidates = np.array(in_category, dtype=np.int32)
+
+        for name, query in QUERIES:
+            matches = len(cold(query))
+            cold_ms = time_call(lambda: cold(query), repeat)
+            cached_ms = time_call(lambda: engine.search(query), repeat)
+            filtered_ms = time_call(lambda: engine.search(query, candidates), repeat)
+            print(f"{size:>9} {name:<14} {matches:>8} {cold_ms:>9.3f} {cached_ms:>10.4f} {filtered_ms:>11.3f}")
+        type_repeat = max(1, repeat // 10)
+        for name, refine in (('type, full', False), ('type, refine', True)):
+            print(f"{size:>9} {name:<14} {'':>8} {time_typing(engine, TYPED, refine, type_repeat):>9.3f}")
+
+        products = list(columns)
+        products[size // 2] = dataclasses.replace(products[size // 2].to_product(), name='Nike Quasar Runner')
+        changed = ProductColumns.from_products(products)
+        start = time.perf_counter()
+        engine.updated(changed)
+        update_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        SearchEngine(changed)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+        print(f"{size:>9} {'update 1':<14} {'':>8} {update_ms:>9.1f}")
+        print(f"{size:>9} {'rebuild':<14} {'':>8} {rebuild_ms:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
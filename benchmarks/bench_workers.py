@@ -0,0 +1,206 @@
+"""
+Benchmark: throughput and memory of the multi-worker mode
+
+Run from the repository root:
+    python -m benchmarks.bench_workers [--workers 1 2 4 8] [--seconds 15]
+
+Method: for each worker count the store is started with `python main.py`
+(WORKERS=n, on a free port) and `/healthz` is polled until every worker has
+published the catalog. A warm-up of a few seconds is discarded, then
+`--concurrency` HTTP clients request the home page (`/`) back to back for
+`--seconds`. Reported are completed requests per second, failed requests,
+the p50/p99 latency and the resident memory (RSS from /proc, Linux only) of
+the supervisor and each worker after the run. PSS is reported alongside RSS
+because pages of the mapped catalog snapshot and of the interpreter are
+shared between workers and RSS counts them once per process.
+
+Plain GETs never open a websocket, so they cannot tell whether a page's
+websocket reaches the worker that rendered it. After the load, `--shoppers`
+simulated browsers (bench_load's Shopper, each with its own cookies) load
+the store page, connect its websocket, wait for the streamed products and
+type a search. Their failures and p50 time are reported as "page" columns;
+any failure means the proxy sent a websocket to the wrong worker.
+
+Results with the 12-product sample catalog, 64 clients, 15 s per row and 16
+page shoppers, on a machine with a single CPU core and 6 GB of RAM. All
+connections go through the supervisor's sticky proxy.
+
+    workers     req/s errors   p50 ms   p99 ms page err  page ms  sup MB rss/worker pss/worker
+          1      33.3      0   1669.0   7700.2        0   2152.0     0.0      240.1      217.0
+          2      31.1      0   2067.2   6712.9        0   2563.1    80.2      114.0       95.0
+          4      26.9      0   1947.6   7393.9        0   1932.9    80.2      100.4       77.7
+          8      34.9      0   1425.8   8279.9        0   2220.7    80.4       97.5       72.0
+
+With one core, every worker and the proxy compete for the same CPU, so
+req/s stays flat. These numbers show the memory cost per worker and that
+pages keep working with any worker count. They do not show scaling, which
+has to be measured on a machine with at least 8 cores. Each extra worker
+costs about 75 MB of PSS on top of the supervisor's 80 MB.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.bench_load import Shopper
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def no_cookies() -> CookieJar:
+    """A cookie jar that keeps nothing, so the proxy spreads requests over the workers"""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RSS and PSS of a process in kB"""
+    result = {'rss': 0, 'pss': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    result[key.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return result
+
+def child_pids(pid: int) -> List[int]:
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+async def wait_until_ready(client: httpx.AsyncClient, url: str, workers: int, timeout: float = 90):
+    """Poll /healthz until `workers` distinct pids report a loaded catalog"""
+    ready = set()
+    deadline = time.monotonic() + timeout
+    while len(ready) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'only {len(ready)} of {workers} workers became ready')
+        try:
+            response = await client.get(f'{url}/healthz')
+            data = response.json()
+            if data['products']:
+                ready.add(data['pid'])
+                continue
+        except (httpx.HTTPError, ValueError):
+            pass
+        await asyncio.sleep(0.2)
+
+async def load(url: str, concurrency: int, seconds: float) -> Tuple[List[float], int]:
+    """Latencies of the requests that succeeded, and how many failed"""
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30, cookies=no_cookies()) as client:
+        end = time.monotonic() + seconds
+
+        async def user():
+            nonlocal errors
+            while time.monotonic() < end:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f'{url}/')
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+async def browse(url: str, shoppers: int) -> Tuple[List[float], int]:
+    """Seconds each shopper took to load the store page and search once, and how many failed"""
+    latencies: List[float] = []
+    errors = 0
+
+    async def shop():
+        nonlocal errors
+        shopper = Shopper(url)
+        try:
+            start = time.perf_counter()
+            await shopper.open('/', streamed=True)
+            await shopper.trigger(shopper.find(placeholder='Search Nike shoes...')[0], 'update:value', 'air')
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+        finally:
+            await shopper.close()
+
+    await asyncio.gather(*(shop() for _ in range(shoppers)))
+    return latencies, errors
+
+async def measure(workers: int, concurrency: int, seconds: float, warmup: float, shoppers: int) -> Dict[str, float]:
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, WORKERS=str(workers), PORT=str(port), HOST='127.0.0.1', DEBUG='false')
+    env.pop('CATALOG_SNAPSHOT_PATH', None)
+    process = subprocess.Popen(
+        [sys.executable, 'main.py'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        # A new connection per poll, so the kernel hands polls to different workers
+        async with httpx.AsyncClient(timeout=5, limits=httpx.Limits(max_keepalive_connections=0), cookies=no_cookies()) as client:
+            await wait_until_ready(client, url, workers)
+        await load(url, concurrency, warmup)
+        latencies, errors = await load(url, concurrency, seconds)
+        page_latencies, page_errors = await browse(url, shoppers)
+        pids = child_pids(process.pid) if workers > 1 else []
+        supervisor = memory_kb(process.pid)
+        worker_memory = [memory_kb(pid) for pid in pids] or [supervisor]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    latencies.sort()
+    return {
+        'workers': workers,
+        'rps': len(latencies) / seconds,
+        'errors': errors,
+        'page_errors': page_errors,
+        'page_p50_ms': statistics.median(page_latencies) * 1000 if page_latencies else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'supervisor_mb': supervisor['rss'] / 1024 if workers > 1 else 0.0,
+        'worker_rss_mb': statistics.mean(m['rss'] for m in worker_memory) / 1024,
+        'worker_pss_mb': statistics.mean(m['pss'] for m in worker_memory) / 1024,
+    }
+
+def run(worker_counts: List[int], concurrency: int, seconds: float, warmup: float, shoppers: int):
+    print(
+        f"{'workers':>7} {'req/s':>9} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'page err':>8} {'page ms':>8} "
+        f"{'sup MB':>7} {'rss/worker':>10} {'pss/worker':>10}"
+    )
+    for workers in worker_counts:
+        result = asyncio.run(measure(workers, concurrency, seconds, warmup, shoppers))
+        print(
+            f"{result['workers']:>7} {result['rps']:>9.1f} {result['errors']:>6} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+            f"{result['page_errors']:>8} {result['page_p50_ms']:>8.1f} "
+            f"{result['supervisor_mb']:>7.1f} {result['worker_rss_mb']:>10.1f} {result['worker_pss_mb']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--shoppers', type=int, default=16)
+    args = parser.parse_args()
+    run(args.workers, args.concurrency, args.seconds, args.warmup, args.shoppers)
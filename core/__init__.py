@@ -0,0 +1 @@
+"""Core store logic package"""
@@ -0,0 +1,112 @@
+"""Shopping cart management"""
+
+from typing import Callable, Dict, List, Optional
+
+from models.product import Product
+
+ProductLookup = Callable[[str], Optional[Product]]
+
+class CartItem:
+    """A product and the quantity of it in a cart"""
+    __slots__ = ('product', 'quantity')
+
+    def __init__(self, product: Product, quantity: int):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def total(self) -> float:
+        return self.product.price * self.quantity
+
+class CartManager:
+    """A single shopping cart
+
+    Only product ids and quantities are stored; products are resolved through
+    `product_lookup` when the cart is read, so a cart stays small and always
+    reflects the current catalog.
+    """
+    __slots__ = ('_quantities', '_lookup', '_on_change')
+
+    def __init__(
+        self,
+        product_lookup: ProductLookup,
+        quantities: Optional[Dict[str, int]] = None,
+        on_change: Optional[Callable[['CartManager'], None]] = None
+    ):
+        self._quantities: Dict[str, int] = dict(quantities) if quantities else {}
+        self._lookup = product_lookup
+        self._on_change = on_change
+
+    def add_item(self, product: Product, quantity: int = 1):
+        """Add a product to the cart"""
+        self._quantities[product.id] = self._quantities.get(product.id, 0) + quantity
+        self._changed()
+
+    def remove_item(self, product_id: str):
+        """Remove a product from the cart"""
+        if self._quantities.pop(product_id, None) is not None:
+            self._changed()
+
+    def update_quantity(self, product_id: str, quantity: int):
+        """Set the quantity of a product, removing it when quantity drops to zero"""
+        if quantity <= 0:
+            self.remove_item(product_id)
+        else:
+            self._quantities[product_id] = quantity
+            self._changed()
+
+    def replace(self, quantities: Dict[str, int]):
+        """Overwrite the contents with state loaded from storage, without reporting a change"""
+        self._quantities = dict(quantities)
+
+    def get_items(self) -> List[CartItem]:
+        """Get cart items for products still in the catalog"""
+        items = []
+        for product_id, quantity in self._quantities.items():
+            product = self._lookup(product_id)
+            if product is not None:
+                items.append(CartItem(product, quantity))
+        return items
+
+    def get_quantities(self) -> Dict[str, int]:
+        """Get a copy of the product id to quantity mapping"""
+        return dict(self._quantities)
+
+    def get_item_count(self) -> int:
+        """Get the total number of units in the cart"""
+        return sum(self._quantities.values())
+
+    def get_subtotal(self) -> float:
+        """Get the cart subtotal before tax"""
+        return sum(item.total for item in self.get_items())
+
+    def subtract(self, quantities: Dict[str, int]):
+        """Take quantities out of the cart, removing products that drop to zero"""
+        changed = False
+        for product_id, quantity in quantities.items():
+            if product_id not in self._quantities:
+                continue
+            left = self._quantities[product_id] - quantity
+            if left > 0:
+                self._quantities[product_id] = left
+            else:
+                del self._quantities[product_id]
+            changed = True
+        if changed:
+            self._changed()
+
+    def clear(self):
+        """Remove all items from the cart"""
+        if self._quantities:
+            self._quantities.clear()
+            self._changed()
+
+    def is_empty(self) -> bool:
+        return not self._quantities
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def __len__(self) -> int:
+        return len(self._quantities)
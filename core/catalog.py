@@ -0,0 +1,175 @@
+"""Catalog lifecycle: load once, refresh in the background, swap atomically"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from core.events import EventBus
+from core.store import StoreManager
+from models.product import Product
+from services.product_service import ProductService
+
+logger = logging.getLogger(__name__)
+
+# Delay before retrying a failed load, doubled with each consecutive failure
+RETRY_BACKOFF_MIN = 1.0
+RETRY_BACKOFF_MAX = 60.0
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """An immutable, fully built view of the catalog"""
+    version: int
+    store: StoreManager
+    loaded_at: datetime = field(default_factory=datetime.now)
+    build_seconds: float = 0.0
+
+    @property
+    def products(self) -> List[Product]:
+        return self.store.get_all_products()
+
+class CatalogManager:
+    """Owns the current catalog snapshot and keeps it fresh
+
+    With `events`, each new snapshot is published as a `catalog` event, and
+    every product someone subscribed to as a `product` event if its price,
+    stock or name changed or it was removed, so only the pages showing it
+    hear about it. Failed loads, including the first, are retried with
+    backoff until one succeeds.
+    """
+
+    def __init__(self, product_service: ProductService, refresh_interval: float = 0, events: Optional[EventBus] = None):
+        self.product_service = product_service
+        self.refresh_interval = refresh_interval
+        self.events = events
+        self._snapshot = CatalogSnapshot(version=0, store=StoreManager())
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+        self._refresh_lock = asyncio.Lock()
+        self._invalidated = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._source_products: Optional[List[Product]] = None
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """The current snapshot; never partially built"""
+        return self._snapshot
+
+    @property
+    def store(self) -> StoreManager:
+        return self._snapshot.store
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def add_listener(self, callback: Callable[[CatalogSnapshot], None]):
+        """Call `callback` with every newly published snapshot"""
+        self._listeners.append(callback)
+
+    @property
+    def ready(self) -> bool:
+        """Whether a catalog has been published yet"""
+        return self._ready.is_set()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the first catalog has been published; False if `timeout` passed first"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def start(self):
+        """Load the initial catalog and start the background refresher
+
+        A failed first load is logged rather than raised, and the refresher
+        retries it, so the process stays up and recovers with its upstream.
+        """
+        await self._try_refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def invalidate(self):
+        """Request a background refresh as soon as possible"""
+        self._invalidated.set()
+
+    async def refresh(self) -> CatalogSnapshot:
+        """Build a new snapshot off to the side, then publish it in one assignment"""
+        async with self._refresh_lock:
+            start = time.perf_counter()
+            products = await self.product_service.load_products()
+            if products is self._source_products:
+                # Unchanged upstream; keep the current snapshot and version
+                return self._snapshot
+            self._source_products = products
+            # Building the columns and indexes of a large catalog takes a while; keep the loop serving
+            store = await asyncio.to_thread(self._snapshot.store.updated, products)
+            snapshot = CatalogSnapshot(
+                version=self._snapshot.version + 1,
+                store=store,
+                build_seconds=time.perf_counter() - start
+            )
+            previous, self._snapshot = self._snapshot, snapshot
+            self._ready.set()
+        logger.info('Catalog v%d loaded with %d products', snapshot.version, len(store))
+        if self.events is not None:
+            self._publish_changes(previous.store, store)
+            self.events.publish('catalog', None, snapshot)
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception('Catalog listener failed')
+        return snapshot
+
+    def _publish_changes(self, old: StoreManager, new: StoreManager):
+        """Publish products with subscribers whose shown details differ between catalogs"""
+        for product_id in self.events.keys('product'):
+            after = new.get_product(product_id)
+            if _shown(old.get_product(product_id)) != _shown(after):
+                self.events.publish('product', product_id, after)
+
+    async def _refresh_loop(self):
+        while True:
+            await self._wait_for_trigger()
+            await self._try_refresh()
+
+    async def _try_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Keep serving the previous snapshot, if any, until the next attempt
+            self.failures += 1
+            self.last_error = f'{type(e).__name__}: {e}'
+            logger.exception('Catalog refresh failed (%d in a row)', self.failures)
+        else:
+            self.failures = 0
+            self.last_error = None
+
+    async def _wait_for_trigger(self):
+        timeout = self.refresh_interval if self.refresh_interval > 0 else None
+        if self.failures:
+            timeout = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_MIN * 2 ** (self.failures - 1))
+        try:
+            await asyncio.wait_for(self._invalidated.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._invalidated.clear()
+
+def _shown(product: Optional[Product]) -> Optional[tuple]:
+    return None if product is None else (product.name, product.price, product.stock)
@@ -0,0 +1,237 @@
+"""Compact column-oriented product storage"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.product import Product
+
+STRING_FIELDS = ('id', 'name', 'category', 'description', 'image_url')
+
+class StringPool:
+    """Distinct strings stored back to back as UTF-8 with an offsets array"""
+
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob, offsets: np.ndarray):
+        self.blob = memoryview(blob)
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, values: Iterable[str]) -> Tuple['StringPool', np.ndarray]:
+        """Intern `values`, returning the pool and one code per value"""
+        codes_by_value: Dict[str, int] = {}
+        codes = []
+        for value in values:
+            code = codes_by_value.get(value)
+            if code is None:
+                code = codes_by_value[value] = len(codes_by_value)
+            codes.append(code)
+        encoded = [value.encode() for value in codes_by_value]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets), np.array(codes, dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code: int) -> str:
+        return str(self.blob[self.offsets[code]:self.offsets[code + 1]], 'utf-8')
+
+    def values(self) -> List[str]:
+        """Every string in code order, decoded in one pass over the blob"""
+        data = bytes(self.blob)
+        bounds = self.offsets.tolist()
+        text = data.decode()
+        if len(text) == len(data):
+            # Pure ASCII: byte offsets are character offsets
+            return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+        return [data[start:end].decode() for start, end in zip(bounds, bounds[1:])]
+
+    @property
+    def nbytes(self) -> int:
+        return self.blob.nbytes + self.offsets.nbytes
+
+class ProductView:
+    """Read-only product backed by a row of ProductColumns
+
+    Views are created on demand and only hold the columns and a row number,
+    so they cost a few dozen bytes no matter how long the product's strings
+    are. Attribute names match Product.
+    """
+
+    __slots__ = ('_columns', '_pos')
+
+    def __init__(self, columns: 'ProductColumns', pos: int):
+        self._columns = columns
+        self._pos = pos
+
+    @property
+    def id(self) -> str:
+        return self._columns.string('id', self._pos)
+
+    @property
+    def name(self) -> str:
+        return self._columns.string('name', self._pos)
+
+    @property
+    def price(self) -> float:
+        return float(self._columns.prices[self._pos])
+
+    @property
+    def category(self) -> str:
+        return self._columns.string('category', self._pos)
+
+    @property
+    def description(self) -> str:
+        return self._columns.string('description', self._pos)
+
+    @property
+    def image_url(self) -> str:
+        return self._columns.string('image_url', self._pos)
+
+    @property
+    def stock(self) -> int:
+        return int(self._columns.stocks[self._pos])
+
+    def to_product(self) -> Product:
+        return Product(
+            id=self.id,
+            name=self.name,
+            price=self.price,
+            category=self.category,
+            description=self.description,
+            image_url=self.image_url,
+            stock=self.stock
+        )
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ProductView) and other._columns is self._columns:
+            return other._pos == self._pos
+        if isinstance(other, (ProductView, Product)):
+            return self.to_product() == (other.to_product() if isinstance(other, ProductView) else other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'ProductView(id={self.id!r}, name={self.name!r}, price={self.price!r})'
+
+class ProductColumns(Sequence[Product]):
+    """An immutable catalog stored as typed arrays and interned string pools
+
+    Numeric fields are numpy arrays, every string field is a per-row code into
+    a StringPool, so repeated values such as categories are stored once. The
+    arrays can wrap any buffer, including a memory-mapped snapshot file shared
+    between processes. Indexing yields ProductViews.
+    """
+
+    def __init__(
+        self,
+        prices: np.ndarray,
+        stocks: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        pools: Dict[str, StringPool],
+        id_order: np.ndarray
+    ):
+        self.prices = prices
+        self.stocks = stocks
+        self.codes = codes
+        self.pools = pools
+        self.id_order = id_order
+
+    @classmethod
+    def from_products(cls, products: Iterable[Product]) -> 'ProductColumns':
+        """Build columns from Product objects (or views of other columns)"""
+        products = list(products)
+        codes = {}
+        pools = {}
+        for name in STRING_FIELDS:
+            pools[name], codes[name] = StringPool.build(getattr(product, name) for product in products)
+        ids = [product.id for product in products]
+        return cls(
+            prices=np.array([product.price for product in products], dtype=np.float64),
+            stocks=np.array([product.stock for product in products], dtype=np.int64),
+            codes=codes,
+            pools=pools,
+            id_order=np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.uint32)
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence['ProductColumns']) -> 'ProductColumns':
+        """Join several column sets into one"""
+        if len(parts) == 1:
+            return parts[0]
+        return cls.from_products(product for part in parts for product in part)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Every backing array by name, for serialization"""
+        arrays = {'prices': self.prices, 'stocks': self.stocks, 'id_order': self.id_order}
+        for name in STRING_FIELDS:
+            arrays[f'{name}.codes'] = self.codes[name]
+            arrays[f'{name}.offsets'] = self.pools[name].offsets
+            arrays[f'{name}.blob'] = np.frombuffer(self.pools[name].blob, dtype=np.uint8)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ProductColumns':
+        """Wrap arrays produced by `arrays`, without copying them"""
+        return cls(
+            prices=arrays['prices'],
+            stocks=arrays['stocks'],
+            codes={name: arrays[f'{name}.codes'] for name in STRING_FIELDS},
+            pools={name: StringPool(arrays[f'{name}.blob'], arrays[f'{name}.offsets']) for name in STRING_FIELDS},
+            id_order=arrays['id_order']
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays().values())
+
+    def string(self, name: str, pos: int) -> str:
+        return self.pools[name][self.codes[name][pos]]
+
+    def strings(self, name: str) -> List[str]:
+        """A whole string column decoded, one entry per row"""
+        values = self.pools[name].values()
+        return [values[code] for code in self.codes[name].tolist()]
+
+    def position_of(self, product_id: str) -> Optional[int]:
+        """Row of a product id, by binary search over the id order
+
+        With duplicate ids the last row wins, like building a dict would.
+        """
+        order = self.id_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if product_id < self.string('id', order[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo and self.string('id', order[lo - 1]) == product_id:
+            return int(order[lo - 1])
+        return None
+
+    def get(self, product_id: str) -> Optional[ProductView]:
+        pos = self.position_of(product_id)
+        return ProductView(self, pos) if pos is not None else None
+
+    def owns(self, product: Product) -> bool:
+        """Whether `product` is a view of these columns rather than of another catalog"""
+        return isinstance(product, ProductView) and product._columns is self
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [ProductView(self, pos) for pos in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('product index out of range')
+        return ProductView(self, item)
+
+    def __iter__(self) -> Iterator[ProductView]:
+        return (ProductView(self, pos) for pos in range(len(self)))
@@ -0,0 +1,138 @@
+"""In-process publish/subscribe and coalesced update batches"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Any], None]
+
+class EventBus:
+    """Publish/subscribe keyed by topic and key
+
+    Subscribers name the exact key they care about, such as one session's
+    cart or one product, so publishing only reaches the subscribers of that
+    key no matter how many clients are connected. A key of None subscribes to
+    events published for the whole topic.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Tuple[str, Hashable], Dict[int, Handler]] = {}
+        self._next_id = 0
+        self._published_total = 0
+        self._delivered_total = 0
+
+    def subscribe(self, topic: str, key: Hashable, handler: Handler) -> Callable[[], None]:
+        """Call `handler` with the payload of every event for `key`, returning an unsubscribe function"""
+        channel = (topic, key)
+        subscription = self._next_id
+        self._next_id += 1
+        self._subscribers.setdefault(channel, {})[subscription] = handler
+
+        def unsubscribe():
+            handlers = self._subscribers.get(channel)
+            if handlers is not None and handlers.pop(subscription, None) is not None and not handlers:
+                del self._subscribers[channel]
+        return unsubscribe
+
+    def publish(self, topic: str, key: Hashable, payload: Any = None):
+        """Deliver an event to the subscribers of its key"""
+        self._published_total += 1
+        handlers = self._subscribers.get((topic, key))
+        if not handlers:
+            return
+        # Handlers may unsubscribe while being called
+        for handler in list(handlers.values()):
+            self._delivered_total += 1
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception('Handler for %s event failed', topic)
+
+    def keys(self, topic: str) -> List[Hashable]:
+        """Keys of a topic that currently have subscribers"""
+        return [key for channel_topic, key in self._subscribers if channel_topic == topic and key is not None]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'channels': len(self._subscribers),
+            'subscriptions': sum(len(handlers) for handlers in self._subscribers.values()),
+            'published_total': self._published_total,
+            'delivered_total': self._delivered_total
+        }
+
+class UpdateBatch:
+    """Collects named updates and applies them together shortly after
+
+    Scheduling an update under a name that is already pending replaces it,
+    so a burst of events costs one update per name. `run` receives the
+    pending updates in scheduling order and is expected to call them; it can
+    wrap them in whatever context they need.
+    """
+
+    def __init__(self, run: Optional[Callable[[List[Callable[[], None]]], None]] = None, delay: float = 0.05):
+        self.run = run or _run_all
+        self.delay = delay
+        self._pending: Dict[str, Callable[[], None]] = {}
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+
+    def schedule(self, name: str, update: Callable[[], None]):
+        """Apply `update` with the next batch, replacing any pending update of the same name"""
+        if self._closed:
+            return
+        self._pending.pop(name, None)
+        self._pending[name] = update
+        if self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self.delay, self.flush)
+
+    def flush(self):
+        """Apply everything pending now"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending:
+            return
+        updates, self._pending = list(self._pending.values()), {}
+        try:
+            self.run(updates)
+        except Exception:
+            logger.exception('Applying %d updates failed', len(updates))
+
+    def close(self):
+        """Drop pending updates and ignore new ones"""
+        self._closed = True
+        self._pending.clear()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+def _run_all(updates: List[Callable[[], None]]):
+    for update in updates:
+        update()
+
+class Subscriptions:
+    """The subscriptions of one consumer, changed in bulk and cancelled together"""
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._active: Dict[Tuple[str, Hashable], Callable[[], None]] = {}
+
+    def subscribe(self, topic: str, key: Hashable, handler: Handler):
+        """Subscribe to one key unless already subscribed"""
+        if (topic, key) not in self._active:
+            self._active[(topic, key)] = self.bus.subscribe(topic, key, handler)
+
+    def follow(self, topic: str, keys: Iterable[Hashable], handler: Handler):
+        """Subscribe to exactly `keys` of a topic, dropping keys no longer wanted"""
+        wanted: Set[Hashable] = set(keys)
+        for channel in [channel for channel in self._active if channel[0] == topic and channel[1] not in wanted]:
+            self._active.pop(channel)()
+        for key in wanted:
+            self.subscribe(topic, key, handler)
+
+    def cancel(self):
+        for unsubscribe in self._active.values():
+            unsubscribe()
+        self._active.clear()
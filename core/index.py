@@ -0,0 +1,292 @@
+"""In-memory product index for fast catalog queries"""
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from core.columnar import ProductColumns, ProductView
+from models.product import Product
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+SORT_OPTIONS = ('price_asc', 'price_desc', 'name')
+
+POSITION_DTYPE = np.int32
+
+_EMPTY = np.zeros(0, dtype=POSITION_DTYPE)
+_EMPTY.flags.writeable = False
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+@dataclass
+class QueryResult:
+    """One page of query results plus the total number of matches"""
+    products: List[Product]
+    total: int
+    offset: int = 0
+    limit: Optional[int] = None
+
+class ResultView(Sequence[Product]):
+    """Ordered query results that resolve products only when accessed"""
+
+    def __init__(self, products: Sequence[Product], positions: np.ndarray):
+        self._products = products
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._products[pos] for pos in self._positions[item].tolist()]
+        return self._products[int(self._positions[item])]
+
+class ProductIndex:
+    """Category, price and token indexes over columnar product storage
+
+    Products are addressed by their row in the columns, so every filter
+    yields a sorted array of row numbers. Token filters combine by sorted
+    intersection; category and price filters are evaluated over the
+    candidate rows' columns in one vectorized step.
+    """
+
+    def __init__(self, products: Union[ProductColumns, Iterable[Product]]):
+        if not isinstance(products, ProductColumns):
+            products = ProductColumns.from_products(products)
+        self._columns = products
+        count = len(products)
+        self._all_ids = _read_only(np.arange(count, dtype=POSITION_DTYPE))
+
+        # Rows grouped by category code
+        self._category_codes = products.codes['category']
+        category_names = products.pools['category'].values()
+        by_category = np.argsort(self._category_codes, kind='stable').astype(POSITION_DTYPE)
+        bounds = np.cumsum(np.bincount(self._category_codes, minlength=len(category_names)))
+        self._code_for_category: Dict[str, int] = {}
+        self._categories: Dict[str, np.ndarray] = {}
+        start = 0
+        for code, (name, end) in enumerate(zip(category_names, bounds.tolist())):
+            if end > start:
+                self._code_for_category[name] = code
+                self._categories[name] = _read_only(by_category[start:end])
+            start = end
+
+        # Rows ordered by price, with the sorted prices for binary search
+        self._prices = products.prices
+        self._price_order = np.argsort(self._prices, kind='stable').astype(POSITION_DTYPE)
+        self._sorted_prices = self._prices[self._price_order]
+        self._price_rank = _ranks(self._price_order)
+        # Not the ascending order reversed: equal prices stay in catalog order
+        self._price_desc_order = np.argsort(-self._prices, kind='stable').astype(POSITION_DTYPE)
+        self._price_desc_rank = _ranks(self._price_desc_order)
+        names = [name.lower() for name in products.strings('name')]
+        self._name_order = np.array(sorted(range(count), key=names.__getitem__), dtype=POSITION_DTYPE)
+        self._name_rank = _ranks(self._name_order)
+        del names
+
+        self._build_tokens(products)
+
+    def _build_tokens(self, products: ProductColumns):
+        """Build a sorted vocabulary and one concatenated postings array"""
+        token_codes: Dict[str, int] = {}
+        description_tokens: Dict[int, Set[int]] = {}
+        row_tokens: List[int] = []
+        row_counts: List[int] = []
+        description_codes = products.codes['description'].tolist()
+        descriptions = products.pools['description']
+        for row, name in enumerate(products.strings('name')):
+            code = description_codes[row]
+            tokens = description_tokens.get(code)
+            if tokens is None:
+                # Interned descriptions are tokenized once however often they repeat
+                tokens = description_tokens[code] = {
+                    token_codes.setdefault(token, len(token_codes)) for token in tokenize(descriptions[code])
+                }
+            tokens = tokens.union(token_codes.setdefault(token, len(token_codes)) for token in tokenize(name))
+            row_tokens.extend(tokens)
+            row_counts.append(len(tokens))
+        del description_tokens
+
+        self._vocabulary: List[str] = sorted(token_codes)
+        vocabulary_rank = np.empty(len(token_codes), dtype=POSITION_DTYPE)
+        vocabulary_rank[[token_codes[token] for token in self._vocabulary]] = np.arange(len(token_codes))
+        token_ranks = vocabulary_rank[np.array(row_tokens, dtype=POSITION_DTYPE)]
+        rows = np.repeat(np.arange(len(row_counts), dtype=POSITION_DTYPE), row_counts)
+        del row_tokens, row_counts
+        # Stable, so each token's rows stay in ascending order
+        order = np.argsort(token_ranks, kind='stable')
+        self._postings = _read_only(rows[order])
+        self._posting_offsets = np.zeros(len(self._vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(token_ranks, minlength=len(self._vocabulary)), out=self._posting_offsets[1:])
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    @property
+    def columns(self) -> ProductColumns:
+        return self._columns
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self._categories)
+
+    def ids_for_category(self, category: str) -> np.ndarray:
+        """Rows of products in a category"""
+        return self._categories.get(category, _EMPTY)
+
+    def ids_in_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Rows of products with min_price <= price < max_price"""
+        lo = 0 if min_price is None else np.searchsorted(self._sorted_prices, min_price, side='left')
+        hi = len(self._sorted_prices) if max_price is None else np.searchsorted(self._sorted_prices, max_price, side='left')
+        return np.sort(self._price_order[lo:hi])
+
+    def ids_for_prefix(self, prefix: str) -> np.ndarray:
+        """Rows of products having a token that starts with `prefix`"""
+        lo = bisect_left(self._vocabulary, prefix)
+        hi = bisect_left(self._vocabulary, prefix + '\uffff', lo)
+        # Tokens sharing a prefix are adjacent, so their postings are one slice
+        rows = self._postings[self._posting_offsets[lo]:self._posting_offsets[hi]]
+        return rows if hi - lo <= 1 else np.unique(rows)
+
+    def ids_matching(self, search_query: str, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows of products where every query token prefixes a name or description token"""
+        arrays = [self.ids_for_prefix(token) for token in tokenize(search_query)]
+        if candidates is not None:
+            arrays.append(candidates)
+        return _intersect(arrays) if arrays else self._all_ids
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        search_query: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        candidates: Optional[np.ndarray] = None
+    ) -> QueryResult:
+        """Filter, sort and paginate the catalog"""
+        ids = self.query_ids(category, search_query, min_price, max_price, candidates)
+        if limit is not None and (offset + limit) * 8 < len(ids):
+            # Only the requested page needs ordering, so select it with a partial sort
+            page = self.top_ids(ids, sort_by, offset + limit)[offset:]
+        else:
+            ordered = self.sort_ids(ids, sort_by)
+            page = ordered[offset:offset + limit] if limit is not None else ordered[offset:]
+        return QueryResult(
+            products=[ProductView(self._columns, pos) for pos in page.tolist()],
+            total=len(ids),
+            offset=offset,
+            limit=limit
+        )
+
+    def query_ids(
+        self,
+        category: Optional[str] = None,
+        search_query: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        candidates: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Sorted rows matching all given filters
+
+        The returned array may be shared with the index and is read-only.
+        """
+        arrays: List[np.ndarray] = []
+        if candidates is not None:
+            arrays.append(candidates)
+        if search_query:
+            arrays.extend(self.ids_for_prefix(token) for token in tokenize(search_query))
+        has_price = min_price is not None or max_price is not None
+
+        if arrays:
+            ids = _intersect(arrays)
+        elif category:
+            ids = self.ids_for_category(category)
+            category = None
+        elif has_price:
+            return self.ids_in_price_range(min_price, max_price)
+        else:
+            return self._all_ids
+
+        if category and len(ids):
+            code = self._code_for_category.get(category)
+            ids = ids[self._category_codes[ids] == code] if code is not None else _EMPTY
+        if has_price and len(ids):
+            prices = self._prices[ids]
+            mask = np.ones(len(ids), dtype=bool)
+            if min_price is not None:
+                mask &= prices >= min_price
+            if max_price is not None:
+                mask &= prices < max_price
+            ids = ids[mask]
+        return ids
+
+    def sort_ids(self, ids: np.ndarray, sort_by: Optional[str] = None) -> np.ndarray:
+        """Order rows by the requested sort, defaulting to catalog order"""
+        if sort_by is None:
+            return ids
+        order, ranks = self._sort_arrays(sort_by)
+        if len(ids) == len(self._columns):
+            return order
+        return ids[np.argsort(ranks[ids])]
+
+    def top_ids(self, ids: np.ndarray, sort_by: Optional[str], count: int) -> np.ndarray:
+        """The first `count` rows of `sort_ids(ids, sort_by)` without sorting them all"""
+        if sort_by is None:
+            return ids[:count]
+        ranks = self._sort_arrays(sort_by)[1][ids]
+        if count < len(ranks):
+            selected = np.argpartition(ranks, count - 1)[:count]
+            selected = selected[np.argsort(ranks[selected])]
+        else:
+            selected = np.argsort(ranks)
+        return ids[selected]
+
+    def _sort_arrays(self, sort_by: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows in the order of a sort option, and each row's position in it"""
+        if sort_by == 'name':
+            return self._name_order, self._name_rank
+        if sort_by == 'price_asc':
+            return self._price_order, self._price_rank
+        if sort_by == 'price_desc':
+            return self._price_desc_order, self._price_desc_rank
+        raise ValueError(f"Unknown sort option: {sort_by}")
+
+    def product_at(self, pos: int) -> ProductView:
+        return ProductView(self._columns, int(pos))
+
+    def view(self, ids: np.ndarray, sort_by: Optional[str] = None) -> ResultView:
+        """Sorted results as a lazy sequence of products"""
+        return ResultView(self._columns, self.sort_ids(ids, sort_by))
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+def _ranks(order: np.ndarray) -> np.ndarray:
+    """Inverse permutation: the position of each row within `order`"""
+    ranks = np.empty(len(order), dtype=POSITION_DTYPE)
+    ranks[order] = np.arange(len(order), dtype=POSITION_DTYPE)
+    return ranks
+
+def _intersect(arrays: List[np.ndarray]) -> np.ndarray:
+    """Intersect sorted row arrays starting from the smallest"""
+    if len(arrays) == 1:
+        return arrays[0]
+    arrays = sorted(arrays, key=len)
+    result = arrays[0]
+    for other in arrays[1:]:
+        if not len(result) or not len(other):
+            return _EMPTY
+        # Binary search each remaining row in the larger array
+        found = np.searchsorted(other, result)
+        found[found == len(other)] = 0
+        result = result[other[found] == result]
+    return result
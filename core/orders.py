@@ -0,0 +1,409 @@
+"""Order placement through a background job queue"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.cart import CartItem
+from models.product import Product
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+def to_money(value) -> Decimal:
+    """Round a price to whole cents
+
+    Floats go through their shortest repr, so 19.99 becomes Decimal('19.99')
+    rather than the binary approximation.
+    """
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+@dataclass(frozen=True)
+class OrderLine:
+    """A product, its price at checkout and the quantity ordered"""
+    product_id: str
+    name: str
+    unit_price: Decimal
+    quantity: int
+
+    @property
+    def total(self) -> Decimal:
+        return self.unit_price * self.quantity
+
+@dataclass(frozen=True)
+class OrderTotals:
+    """Amounts owed for an order, in whole cents"""
+    subtotal: Decimal
+    tax: Decimal
+    total: Decimal
+
+def order_lines(items: Iterable[CartItem]) -> List[OrderLine]:
+    """Snapshot cart items so later catalog or cart changes cannot alter them"""
+    return [
+        OrderLine(item.product.id, item.product.name, to_money(item.product.price), item.quantity)
+        for item in items if item.quantity > 0
+    ]
+
+def compute_totals(lines: Iterable[OrderLine], tax_rate: float) -> OrderTotals:
+    """Subtotal, tax and total of order lines, rounding tax once per order"""
+    subtotal = sum((line.total for line in lines), Decimal('0.00'))
+    tax = (subtotal * Decimal(str(tax_rate))).quantize(CENT, rounding=ROUND_HALF_UP)
+    return OrderTotals(subtotal=subtotal, tax=tax, total=subtotal + tax)
+
+@dataclass
+class Order:
+    """A placed order"""
+    id: str
+    idempotency_key: str
+    session_id: str
+    lines: List[OrderLine]
+    totals: OrderTotals
+    status: str = 'accepted'
+    created_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'lines': [[line.product_id, line.name, str(line.unit_price), line.quantity] for line in self.lines],
+            'totals': [str(self.totals.subtotal), str(self.totals.tax), str(self.totals.total)]
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'Order':
+        order_id, key, session_id, payload, status, created_at = row
+        data = json.loads(payload)
+        return cls(
+            id=order_id,
+            idempotency_key=key,
+            session_id=session_id,
+            lines=[OrderLine(product_id, name, Decimal(price), quantity) for product_id, name, price, quantity in data['lines']],
+            totals=OrderTotals(*(Decimal(value) for value in data['totals'])),
+            status=status,
+            created_at=created_at
+        )
+
+class OrderStore:
+    """Orders and units sold, kept in SQLite
+
+    Like the SQLite cart backend, one executor thread owns the connection so
+    statements never run on the event loop. The idempotency key is unique,
+    which also catches a repeated submit that reaches another worker process.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id TEXT PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            session_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS units_sold (
+            product_id TEXT PRIMARY KEY,
+            quantity INTEGER NOT NULL
+        );
+    '''
+
+    COLUMNS = 'id, idempotency_key, session_id, payload, status, created_at'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-sqlite')
+
+    async def start(self):
+        await self._run(self._connect)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    async def insert(self, orders: List[Order]) -> List[Order]:
+        """Store orders in one transaction, returning what is stored under each key
+
+        An order whose idempotency key is already taken is not stored again;
+        the earlier order is returned in its place.
+        """
+        return await self._run(self._insert, orders)
+
+    async def fulfil(self, order: Order) -> Dict[str, int]:
+        """Mark an order confirmed and count its units as sold
+
+        Returns the units sold so far of each product in the order, including
+        sales stored by other processes.
+        """
+        return await self._run(self._fulfil, order)
+
+    async def get(self, order_id: str) -> Optional[Order]:
+        row = await self._run(self._select, 'id', order_id)
+        return Order.from_row(row) if row else None
+
+    async def units_sold(self) -> Dict[str, int]:
+        return await self._run(self._units_sold)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # The methods below run on the executor thread
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(self.SCHEMA)
+        self._connection = connection
+
+    def _select(self, column: str, value: str):
+        return self._connection.execute(f'SELECT {self.COLUMNS} FROM orders WHERE {column} = ?', (value,)).fetchone()
+
+    def _insert(self, orders: List[Order]) -> List[Order]:
+        connection = self._connection
+        stored = []
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for order in orders:
+                inserted = connection.execute(
+                    'INSERT INTO orders (id, idempotency_key, session_id, payload, status, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING',
+                    (order.id, order.idempotency_key, order.session_id, order.to_json(), order.status, order.created_at)
+                ).rowcount
+                stored.append(order if inserted else Order.from_row(self._select('idempotency_key', order.idempotency_key)))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return stored
+
+    def _fulfil(self, order: Order) -> Dict[str, int]:
+        connection = self._connection
+        product_ids = [line.product_id for line in order.lines]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Only the first confirmation of an order counts its units
+            if connection.execute(
+                "UPDATE orders SET status = 'confirmed' WHERE id = ? AND status = 'accepted'", (order.id,)
+            ).rowcount:
+                connection.executemany(
+                    'INSERT INTO units_sold (product_id, quantity) VALUES (?, ?) '
+                    'ON CONFLICT(product_id) DO UPDATE SET quantity = quantity + excluded.quantity',
+                    [(line.product_id, line.quantity) for line in order.lines]
+                )
+            sold = dict(connection.execute(
+                f'SELECT product_id, quantity FROM units_sold WHERE product_id IN ({", ".join("?" * len(product_ids))})',
+                product_ids
+            ).fetchall())
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return sold
+
+    def _units_sold(self) -> Dict[str, int]:
+        return dict(self._connection.execute('SELECT product_id, quantity FROM units_sold').fetchall())
+
+_STOP = object()
+
+class OrderPipeline:
+    """Accepts orders through an asyncio queue and fulfils them in the background
+
+    `submit` snapshots the cart, prices it and queues the order; it returns
+    once the order is stored, which is all a checkout needs to wait for. A
+    single writer drains the queue and stores whatever has piled up in one
+    transaction, so a burst of checkouts costs a few commits rather than one
+    each. Confirmation and the inventory decrement then run on `workers`
+    follow-up tasks, and listeners are told about each confirmed order.
+
+    Submits with the same idempotency key share one order: a repeat that
+    arrives while the first is queued waits for it, and a repeat after that
+    is answered from the store.
+
+    Units sold live in the store, shared by every worker process. Each
+    process keeps a copy for `available`, updated from the store whenever it
+    confirms an order and reloaded every `sold_refresh_interval` seconds, so
+    sales made by other workers show up within that interval.
+    """
+
+    def __init__(
+        self,
+        store: OrderStore,
+        tax_rate: float,
+        workers: int = 2,
+        queue_size: int = 1000,
+        batch_size: int = 100,
+        recent_keys: int = 10_000,
+        sold_refresh_interval: float = 5.0
+    ):
+        self.store = store
+        self.tax_rate = tax_rate
+        self.workers = workers
+        self.batch_size = batch_size
+        self.recent_keys = recent_keys
+        self.sold_refresh_interval = sold_refresh_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._followups: asyncio.Queue = asyncio.Queue()
+        self._pending: 'OrderedDict[str, asyncio.Future]' = OrderedDict()
+        self._sold: Dict[str, int] = {}
+        self._listeners: List[Callable[[Order], None]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._sold_task: Optional[asyncio.Task] = None
+        self._accepted_total = 0
+        self._confirmed_total = 0
+        self._duplicate_total = 0
+
+    def add_listener(self, callback: Callable[[Order], None]):
+        """Call `callback` with every order once it is confirmed"""
+        self._listeners.append(callback)
+
+    async def start(self):
+        """Open the store and start the writer and follow-up workers"""
+        await self.store.start()
+        await self.reload_sold()
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._write_loop()))
+            self._tasks.extend(asyncio.create_task(self._followup_loop()) for _ in range(self.workers))
+        if self._sold_task is None and self.sold_refresh_interval > 0:
+            self._sold_task = asyncio.create_task(self._sold_loop())
+
+    async def stop(self):
+        """Finish queued work, stop the workers and close the store"""
+        if self._sold_task is not None:
+            self._sold_task.cancel()
+            try:
+                await self._sold_task
+            except asyncio.CancelledError:
+                pass
+            self._sold_task = None
+        if self._tasks:
+            await self._queue.put(_STOP)
+            await self._tasks[0]
+            for _ in range(self.workers):
+                self._followups.put_nowait(_STOP)
+            await asyncio.gather(*self._tasks[1:])
+            self._tasks = []
+        await self.store.close()
+
+    def quote(self, items: Iterable[CartItem]) -> Tuple[List[OrderLine], OrderTotals]:
+        """Order lines and totals for cart items, as checkout shows them"""
+        lines = order_lines(items)
+        return lines, compute_totals(lines, self.tax_rate)
+
+    async def submit(self, idempotency_key: str, session_id: str, items: Iterable[CartItem]) -> Order:
+        """Place an order for cart items, at most once per idempotency key"""
+        future = self._pending.get(idempotency_key)
+        if future is None:
+            lines, totals = self.quote(items)
+            if not lines:
+                raise ValueError('Cannot place an empty order')
+            order = Order(
+                id=uuid.uuid4().hex,
+                idempotency_key=idempotency_key,
+                session_id=session_id,
+                lines=lines,
+                totals=totals
+            )
+            future = asyncio.get_running_loop().create_future()
+            self._remember(idempotency_key, future)
+            # Waits here only when the queue is full, pushing back on new checkouts
+            await self._queue.put((order, future))
+        else:
+            self._duplicate_total += 1
+        # Shielded so a page that goes away cannot cancel an order others await
+        return await asyncio.shield(future)
+
+    def available(self, product: Product) -> int:
+        """Units of a product left after the orders fulfilled so far"""
+        return max(0, product.stock - self._sold.get(product.id, 0))
+
+    async def reload_sold(self):
+        """Reload the units sold of every product from the store"""
+        self._sold = await self.store.units_sold()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self._queue.qsize(),
+            'followups': self._followups.qsize(),
+            'accepted_total': self._accepted_total,
+            'confirmed_total': self._confirmed_total,
+            'duplicate_total': self._duplicate_total
+        }
+
+    def _remember(self, key: str, future: asyncio.Future):
+        self._pending[key] = future
+        while len(self._pending) > self.recent_keys:
+            oldest_key, oldest = next(iter(self._pending.items()))
+            if not oldest.done():
+                break
+            del self._pending[oldest_key]
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stopping = any(job is _STOP for job in batch)
+            jobs = [job for job in batch if job is not _STOP]
+            if jobs:
+                await self._write(jobs)
+            if stopping:
+                return
+
+    async def _write(self, jobs: List[Tuple[Order, asyncio.Future]]):
+        try:
+            stored = await self.store.insert([order for order, _ in jobs])
+        except Exception as e:
+            logger.exception('Storing %d orders failed', len(jobs))
+            for order, future in jobs:
+                # Forget the key so the shopper can try again
+                self._pending.pop(order.idempotency_key, None)
+                future.set_exception(e)
+            return
+        for (order, future), result in zip(jobs, stored):
+            future.set_result(result)
+            if result is order:
+                self._accepted_total += 1
+                self._followups.put_nowait(result)
+            else:
+                self._duplicate_total += 1
+
+    async def _followup_loop(self):
+        while True:
+            order = await self._followups.get()
+            if order is _STOP:
+                return
+            try:
+                sold = await self.store.fulfil(order)
+            except Exception:
+                # The order stays accepted in the store and can be fulfilled later
+                logger.exception('Fulfilling order %s failed', order.id)
+                continue
+            order.status = 'confirmed'
+            self._sold.update(sold)
+            self._confirmed_total += 1
+            for callback in self._listeners:
+                try:
+                    callback(order)
+                except Exception:
+                    logger.exception('Order listener failed')
+
+    async def _sold_loop(self):
+        while True:
+            await asyncio.sleep(self.sold_refresh_interval)
+            try:
+                await self.reload_sold()
+            except Exception:
+                logger.exception('Reloading units sold failed')
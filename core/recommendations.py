@@ -0,0 +1,289 @@
+"""Precomputed "similar products" recommendations"""
+
+import asyncio
+import logging
+import math
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.columnar import ProductColumns, ProductView
+from core.index import POSITION_DTYPE, tokenize
+from core.search import stem
+
+logger = logging.getLogger(__name__)
+
+# Term vectors are hashed into a fixed number of dimensions, so a product's
+# vector depends only on the product itself and survives catalog changes
+TEXT_DIMENSIONS = 64
+NAME_WEIGHT = 2.0
+# Half-octave price bands from $8 upwards; neighbouring bands partly overlap
+PRICE_BANDS = 16
+BANDS_PER_OCTAVE = 2
+PRICE_FLOOR = 8.0
+# Share of the similarity score from the text and the price band
+TEXT_SHARE = 0.6
+PRICE_SHARE = 0.4
+# Rows scored per matrix product, bounding the scratch matrix to BLOCK_ROWS x category size
+BLOCK_ROWS = 512
+
+def term_vector(name: str, description: str) -> np.ndarray:
+    """Unit-length hashed vector of the stemmed name and description terms"""
+    counts: Counter = Counter()
+    for token in tokenize(name):
+        counts[stem(token)] += NAME_WEIGHT
+    for token in tokenize(description):
+        counts[stem(token)] += 1.0
+    vector = np.zeros(TEXT_DIMENSIONS, dtype=np.float32)
+    for term, count in counts.items():
+        vector[zlib.crc32(term.encode()) % TEXT_DIMENSIONS] += 1.0 + math.log(count)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def price_vectors(prices: np.ndarray) -> np.ndarray:
+    """Unit-length price band encodings; same band scores 1, the next band 2/3, the one after 1/6"""
+    bands = np.floor(np.log2(np.maximum(prices, PRICE_FLOOR) / PRICE_FLOOR) * BANDS_PER_OCTAVE)
+    bands = np.clip(bands, 0, PRICE_BANDS - 1).astype(np.intp)
+    vectors = np.zeros((len(prices), PRICE_BANDS + 2), dtype=np.float32)
+    rows = np.arange(len(prices))
+    # Padded by one band on each side so edge bands need no special case
+    vectors[rows, bands] = 0.5
+    vectors[rows, bands + 1] = 1.0
+    vectors[rows, bands + 2] = 0.5
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def product_vectors(products: ProductColumns, rows: np.ndarray) -> np.ndarray:
+    """Feature vectors of `rows`; a dot product of two is their similarity in [0, 1]"""
+    names = products.pools['name'].values()
+    descriptions = products.pools['description'].values()
+    text = np.zeros((len(rows), TEXT_DIMENSIONS), dtype=np.float32)
+    for i, row in enumerate(rows.tolist()):
+        text[i] = term_vector(names[products.codes['name'][row]], descriptions[products.codes['description'][row]])
+    return np.hstack([
+        text * np.float32(math.sqrt(TEXT_SHARE)),
+        price_vectors(products.prices[rows]) * np.float32(math.sqrt(PRICE_SHARE))
+    ])
+
+def _features(products: ProductColumns) -> List[tuple]:
+    """What similarity depends on, per row"""
+    return list(zip(
+        products.strings('name'), products.strings('description'),
+        products.strings('category'), products.prices.tolist()
+    ))
+
+def _top_k(scores: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best `k` candidates per row of `scores`, best first, padded with -1"""
+    neighbours = np.full((len(scores), k), -1, dtype=POSITION_DTYPE)
+    best = np.full((len(scores), k), -np.inf, dtype=np.float32)
+    take = min(k, scores.shape[1])
+    if take == 0:
+        return neighbours, best
+    top = np.argpartition(-scores, take - 1, axis=1)[:, :take] if take < scores.shape[1] else \
+        np.broadcast_to(np.arange(take), (len(scores), take))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    best[:, :take] = np.take_along_axis(top_scores, order, axis=1)
+    neighbours[:, :take] = candidates[top]
+    # Candidates ruled out with -inf (the row itself) are padding too
+    neighbours[~np.isfinite(best)] = -1
+    return neighbours, best
+
+class RecommendationIndex:
+    """Top-K most similar products of every product, as two (n, k) arrays
+
+    Similarity combines hashed name/description term vectors with a price
+    band kernel, and only products of the same category are compared. All of
+    it is computed when the index is built; `similar` is an array lookup.
+    """
+
+    def __init__(
+        self,
+        products: ProductColumns,
+        vectors: np.ndarray,
+        neighbours: np.ndarray,
+        scores: np.ndarray,
+        build_seconds: float = 0.0,
+        rescored: int = 0,
+        rows: Optional[Dict[str, int]] = None
+    ):
+        self.products = products
+        self.rows = rows if rows is not None else {product_id: row for row, product_id in enumerate(products.strings('id'))}
+        self.vectors = vectors
+        self.neighbours = neighbours
+        self.scores = scores
+        self.build_seconds = build_seconds
+        self.rescored = rescored
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    @classmethod
+    def empty(cls, k: int = 8) -> 'RecommendationIndex':
+        return cls.build(ProductColumns.from_products([]), k)
+
+    @classmethod
+    def build(cls, products: ProductColumns, k: int = 8) -> 'RecommendationIndex':
+        """Index every product from scratch"""
+        return cls._build(products, k, None)
+
+    def updated(self, products: ProductColumns) -> 'RecommendationIndex':
+        """Index a new version of the catalog, reusing everything unaffected by the changes
+
+        Products whose name, description, category and price are unchanged
+        keep their vectors. Their neighbour lists are only merged with the
+        changed products of their category, unless a former neighbour
+        changed or disappeared, in which case the list is recomputed.
+        """
+        return self._build(products, self.k, self)
+
+    @classmethod
+    def _build(cls, products: ProductColumns, k: int, previous: Optional['RecommendationIndex']) -> 'RecommendationIndex':
+        start = time.perf_counter()
+        count = len(products)
+        ids = products.strings('id')
+        kept = np.full(count, -1, dtype=np.int64)
+        if previous is not None and len(previous.products):
+            old_rows: Dict[tuple, int] = {
+                (product_id, features): row for row, (product_id, features) in
+                enumerate(zip(previous.products.strings('id'), _features(previous.products)))
+            }
+            kept = np.array([old_rows.get(key, -1) for key in zip(ids, _features(products))], dtype=np.int64).reshape(count)
+
+        unchanged = kept >= 0
+        vectors = np.empty((count, TEXT_DIMENSIONS + PRICE_BANDS + 2), dtype=np.float32)
+        vectors[unchanged] = previous.vectors[kept[unchanged]] if unchanged.any() else 0
+        changed_rows = np.flatnonzero(~unchanged)
+        if len(changed_rows):
+            vectors[changed_rows] = product_vectors(products, changed_rows)
+
+        neighbours = np.full((count, k), -1, dtype=POSITION_DTYPE)
+        scores = np.full((count, k), -np.inf, dtype=np.float32)
+        merged = np.zeros(count, dtype=bool)
+        if unchanged.any():
+            # Old neighbour lists in new row numbers; changed or removed products become -1
+            # One extra slot so the -1 padding of old lists maps to -1 as well
+            old_to_new = np.full(len(previous.products) + 1, -1, dtype=POSITION_DTYPE)
+            old_to_new[kept[unchanged]] = np.flatnonzero(unchanged)
+            old_lists = previous.neighbours[kept[unchanged]]
+            carried = old_to_new[old_lists]
+            intact = ((carried >= 0) | (old_lists < 0)).all(axis=1)
+            rows = np.flatnonzero(unchanged)[intact]
+            neighbours[rows] = carried[intact]
+            scores[rows] = previous.scores[kept[rows]]
+            merged[rows] = True
+
+        rescored = 0
+        categories = products.codes['category']
+        for category in np.unique(categories):
+            members = np.flatnonzero(categories == category).astype(POSITION_DTYPE)
+            fresh = members[~unchanged[members]]
+            stale = members[~merged[members]]
+            rescored += len(stale)
+            # Lists still valid only need the changed products of their category considered
+            if len(fresh):
+                valid = members[merged[members]]
+                for block in range(0, len(valid), BLOCK_ROWS):
+                    rows = valid[block:block + BLOCK_ROWS]
+                    candidates = np.hstack([neighbours[rows], np.broadcast_to(fresh, (len(rows), len(fresh)))])
+                    candidate_scores = np.hstack([scores[rows], vectors[rows] @ vectors[fresh].T])
+                    order = np.argsort(-candidate_scores, axis=1, kind='stable')[:, :k]
+                    best = np.take_along_axis(candidate_scores, order, axis=1)
+                    neighbours[rows] = np.where(np.isfinite(best), np.take_along_axis(candidates, order, axis=1), -1)
+                    scores[rows] = best
+            for block in range(0, len(stale), BLOCK_ROWS):
+                rows = stale[block:block + BLOCK_ROWS]
+                block_scores = vectors[rows] @ vectors[members].T
+                block_scores[np.arange(len(rows)), np.searchsorted(members, rows)] = -np.inf
+                neighbours[rows], scores[rows] = _top_k(block_scores, members, k)
+
+        rows = {product_id: row for row, product_id in enumerate(ids)}
+        return cls(products, vectors, neighbours, scores, time.perf_counter() - start, rescored, rows)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def similar(self, product_id: str, limit: Optional[int] = None) -> List[ProductView]:
+        """The products most similar to `product_id`, best first, as views of the indexed catalog"""
+        row = self.rows.get(product_id)
+        if row is None:
+            return []
+        rows = self.neighbours[row, :limit]
+        return [ProductView(self.products, neighbour) for neighbour in rows[rows >= 0].tolist()]
+
+    def suggest(self, product_ids: Iterable[str], limit: int) -> List[ProductView]:
+        """Products similar to any of `product_ids`, excluding those, best first"""
+        rows = {self.rows[product_id] for product_id in product_ids if product_id in self.rows}
+        best: Dict[int, float] = {}
+        for row in rows:
+            for neighbour, score in zip(self.neighbours[row].tolist(), self.scores[row].tolist()):
+                if neighbour >= 0 and neighbour not in rows and score > best.get(neighbour, -math.inf):
+                    best[neighbour] = score
+        ranked = sorted(best, key=lambda neighbour: -best[neighbour])[:limit]
+        return [ProductView(self.products, neighbour) for neighbour in ranked]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'products': len(self),
+            'k': self.k,
+            'build_seconds': self.build_seconds,
+            'rescored_products': self.rescored,
+            'bytes': self.neighbours.nbytes + self.scores.nbytes + self.vectors.nbytes
+        }
+
+class Recommender:
+    """Keeps a RecommendationIndex in step with the catalog
+
+    Each new catalog is indexed in a worker thread after it is published, so
+    the catalog is served right away and recommendations follow once built.
+    If catalogs arrive while a build runs, only the latest is indexed next.
+    """
+
+    def __init__(self, k: int = 8):
+        self._index = RecommendationIndex.empty(k)
+        self._pending: Optional[ProductColumns] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def index(self) -> RecommendationIndex:
+        return self._index
+
+    def catalog_changed(self, products: ProductColumns):
+        """Schedule indexing of a new catalog"""
+        self._pending = products
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._build_loop())
+
+    async def wait_built(self):
+        """Wait until every scheduled catalog has been indexed"""
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return self._index.stats()
+
+    async def _build_loop(self):
+        while self._pending is not None:
+            products, self._pending = self._pending, None
+            try:
+                self._index = await asyncio.to_thread(self._index.updated, products)
+            except Exception:
+                logger.exception('Building recommendations failed')
+                continue
+            logger.info(
+                'Recommendations for %d products built in %.2fs (%d rescored)',
+                len(self._index), self._index.build_seconds, self._index.rescored
+            )
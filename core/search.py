@@ -0,0 +1,499 @@
+"""Ranked full-text product search"""
+
+import copy
+import math
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import AbstractSet, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from core.columnar import ProductColumns
+from core.index import POSITION_DTYPE, tokenize
+from models.product import Product
+
+# Weight of a token occurrence in each indexed field
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('description', 1.0))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Score factor for terms matched only through typo tolerance
+FUZZY_PENALTY = 0.5
+
+# Share of the catalog the side segment may hold before `updated` rebuilds instead
+REBUILD_SHARE = 0.05
+
+VOWELS = frozenset('aeiouy')
+
+_EMPTY_ROWS = np.zeros(0, dtype=POSITION_DTYPE)
+_EMPTY_ROWS.flags.writeable = False
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Strip common English inflections"""
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith('sses') or token.endswith('ies'):
+        return token[:-2]
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    for suffix in ('ing', 'ed'):
+        base = token[:-len(suffix)]
+        if token.endswith(suffix) and len(base) >= 3 and VOWELS.intersection(base):
+            if len(base) > 3 and base[-1] == base[-2] and base[-1] not in 'lsz':
+                base = base[:-1]
+            return base
+    if token.endswith('ly') and len(token) > 5:
+        return token[:-2]
+    return token
+
+def trigrams(token: str) -> Set[str]:
+    padded = f'^{token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent transpositions, or `limit + 1` once it exceeds `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = char_a != char_b
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def max_edits(token: str) -> int:
+    """Typos tolerated in a query token of this length"""
+    return 0 if len(token) < 4 else 1 if len(token) < 8 else 2
+
+@dataclass(frozen=True)
+class SearchResult:
+    """Matching rows, best first, with their scores"""
+    rows: np.ndarray
+    scores: np.ndarray
+    # Whether any query token only matched through typo tolerance
+    fuzzy: bool = False
+    # The stems each query token expanded to, and the scores summed over all
+    # tokens but the last; `refine` builds on both
+    terms: Tuple[FrozenSet[str], ...] = ()
+    partial: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def within(self, candidates: np.ndarray) -> 'SearchResult':
+        """The results restricted to `candidates`, keeping their order"""
+        if not len(self.rows):
+            return self
+        mask = np.zeros(int(max(self.rows.max(), candidates.max(initial=0))) + 1, dtype=bool)
+        mask[candidates] = True
+        keep = mask[self.rows]
+        partial = self.partial[keep] if self.partial is not None else None
+        return SearchResult(self.rows[keep], self.scores[keep], self.fuzzy, self.terms, partial)
+
+class _Vocabulary(dict):
+    """Word to stem id, assigning ids to unseen words and stems"""
+
+    def __init__(self, stem_ids: Dict[str, int]):
+        super().__init__()
+        self.stem_ids = stem_ids
+
+    def __missing__(self, word: str) -> int:
+        term = self[word] = self.stem_ids.setdefault(stem(word), len(self.stem_ids))
+        return term
+
+class SearchEngine:
+    """BM25 search over product names, categories and descriptions
+
+    Tokens are stemmed and indexed per field with a weight, then scored with
+    BM25. Every query token must match: a token matches indexed words that
+    start with it or share its stem, so partially typed words find results.
+    A token matching nothing falls back to words within a small edit
+    distance, found through a trigram index over the vocabulary, and the
+    result is flagged as fuzzy.
+
+    The bulk of the index is an immutable segment of numpy postings built
+    from the catalog columns. `updated` indexes a new version of the catalog
+    without rebuilding it: unchanged products keep their postings under their
+    new rows, and the text of changed products goes to a small in-memory
+    segment that is searched alongside. Full results of recent queries are
+    kept in an LRU cache, and `refine` narrows a result as its query is typed
+    further.
+    """
+
+    def __init__(self, products: Union[ProductColumns, Iterable[Product]], cache_size: int = 256):
+        if not isinstance(products, ProductColumns):
+            products = ProductColumns.from_products(products)
+        # The catalog the rows of results refer to
+        self.products = products
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, SearchResult]' = OrderedDict()
+        self._size = len(products)
+        self._base_count = self._size
+        # Rows whose base postings count; changed and removed rows are masked out
+        self._in_base = np.ones(self._size, dtype=bool)
+        self._masked = 0
+        self._build_base(products)
+        # Products changed since the build: row -> weighted term frequencies
+        self._delta: Dict[int, Dict[str, float]] = {}
+        self._delta_lengths: Dict[int, float] = {}
+        self._delta_postings: Dict[str, Dict[int, float]] = {}
+        self._delta_words: List[str] = []
+        self._delta_word_stems: Dict[str, str] = {}
+
+    def _build_base(self, products: ProductColumns):
+        """Weighted term frequencies per row, laid out as postings sorted by stem
+
+        Each distinct string of a field is tokenized once; its stem counts are
+        then spread to every row holding that string with array operations, so
+        Python work grows with the distinct strings rather than the rows.
+        """
+        stem_ids: Dict[str, int] = {}
+        word_stems = _Vocabulary(stem_ids)
+        count = len(products)
+        row_parts: List[np.ndarray] = []
+        term_parts: List[np.ndarray] = []
+        frequency_parts: List[np.ndarray] = []
+        for name, weight in FIELD_WEIGHTS:
+            # Every occurrence of a word is listed; repeats are summed below
+            string_terms: List[int] = []
+            string_lengths: List[int] = []
+            for text in products.pools[name].values():
+                before = len(string_terms)
+                string_terms.extend(map(word_stems.__getitem__, tokenize(text)))
+                string_lengths.append(len(string_terms) - before)
+            string_offsets = np.zeros(len(string_lengths) + 1, dtype=np.int64)
+            np.cumsum(string_lengths, out=string_offsets[1:])
+            codes = products.codes[name]
+            per_row = np.diff(string_offsets)[codes]
+            # Position of every (row, occurrence) pair within string_terms
+            firsts = np.cumsum(per_row) - per_row
+            positions = np.repeat(string_offsets[:-1][codes] - firsts, per_row) + np.arange(int(per_row.sum()))
+            row_parts.append(np.repeat(np.arange(count, dtype=np.int64), per_row))
+            term_parts.append(np.array(string_terms, dtype=np.int64)[positions])
+            frequency_parts.append(np.full(len(positions), weight, dtype=np.float32))
+
+        # One posting per stem and row; keys ordered by stem then row are CSR order
+        keys, inverse = np.unique(np.concatenate(term_parts) * max(count, 1) + np.concatenate(row_parts), return_inverse=True)
+        frequencies = np.bincount(inverse, weights=np.concatenate(frequency_parts)).astype(np.float32)
+        del row_parts, term_parts, frequency_parts, inverse
+        terms = keys // max(count, 1)
+        rows = (keys % max(count, 1)).astype(POSITION_DTYPE)
+        del keys
+
+        self._stems: List[str] = list(stem_ids)
+        self._stem_ids = stem_ids
+        self._word_stems = {word: self._stems[term] for word, term in word_stems.items()}
+        self._words: List[str] = sorted(word_stems)
+        self._grams: Dict[str, List[int]] = {}
+        for position, word in enumerate(self._words):
+            for gram in trigrams(word):
+                self._grams.setdefault(gram, []).append(position)
+
+        self._lengths = np.bincount(rows, weights=frequencies, minlength=count).astype(np.float32)
+        self._average_length = float(self._lengths.mean()) if count else 1.0
+        self._postings = rows
+        # Everything in BM25 except the idf, which is applied per query
+        self._posting_impacts = self._impacts(frequencies, self._lengths[rows])
+        self._document_frequency = np.bincount(terms, minlength=len(self._stems)).astype(np.int64)
+        self._offsets = np.zeros(len(self._stems) + 1, dtype=np.int64)
+        np.cumsum(self._document_frequency, out=self._offsets[1:])
+
+    def _impacts(self, frequencies, lengths):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self._average_length, 1e-9))
+        return (frequencies * (BM25_K1 + 1) / (frequencies + norm)).astype(np.float32)
+
+    def __len__(self) -> int:
+        # Changed base rows are both masked and in the delta, so they count once
+        return self._base_count - self._masked + len(self._delta)
+
+    # Incremental updates
+
+    def updated(self, products: ProductColumns, rebuild_share: float = REBUILD_SHARE) -> 'SearchEngine':
+        """Index a new version of the catalog, re-indexing only products whose text changed
+
+        Products with the same id, name, category and description keep their
+        postings under their row in `products`; changed and new products go
+        to the side segment, removed ones are dropped. Once the side segment
+        would hold more than `rebuild_share` of the catalog, the engine is
+        built from scratch instead, which also compacts it. This engine is
+        left as it was, so it can keep serving the previous catalog.
+        """
+        indexed = {key: row for row, key in enumerate(_texts(self.products))}
+        old_to_new = np.full(len(self.products), -1, dtype=np.int64)
+        changed: List[int] = []
+        for row, key in enumerate(_texts(products)):
+            old_row = indexed.pop(key, None)
+            if old_row is None:
+                changed.append(row)
+            else:
+                old_to_new[old_row] = row
+        if len(changed) + len(self._delta) > rebuild_share * len(products):
+            return SearchEngine(products, self.cache_size)
+
+        engine = self._renumbered(old_to_new, len(products))
+        for row in changed:
+            engine._index_row(row, products[row])
+        engine.products = products
+        return engine
+
+    def _renumbered(self, old_to_new: np.ndarray, size: int) -> 'SearchEngine':
+        """A copy with every row moved to `old_to_new[row]`, dropping rows mapped to -1
+
+        The vocabulary and trigram index are shared with this engine; only
+        the postings are rewritten, with array operations.
+        """
+        engine = copy.copy(self)
+        engine._cache = OrderedDict()
+        engine._size = size
+
+        keep = old_to_new[self._postings] >= 0
+        if self._masked:
+            keep &= self._in_base[self._postings]
+        terms = np.repeat(np.arange(len(self._stems)), self._document_frequency)
+        engine._postings = old_to_new[self._postings[keep]].astype(POSITION_DTYPE)
+        engine._posting_impacts = self._posting_impacts[keep]
+        engine._document_frequency = np.bincount(terms[keep], minlength=len(self._stems)).astype(np.int64)
+        engine._offsets = np.zeros(len(self._stems) + 1, dtype=np.int64)
+        np.cumsum(engine._document_frequency, out=engine._offsets[1:])
+
+        base_rows = old_to_new[np.flatnonzero(self._in_base[:len(old_to_new)])]
+        base_rows = base_rows[base_rows >= 0]
+        engine._in_base = np.zeros(size, dtype=bool)
+        engine._in_base[base_rows] = True
+        engine._base_count = len(base_rows)
+        engine._masked = 0
+
+        engine._delta = {}
+        engine._delta_lengths = {}
+        engine._delta_postings = {}
+        engine._delta_words = list(self._delta_words)
+        engine._delta_word_stems = dict(self._delta_word_stems)
+        for row, frequencies in self._delta.items():
+            new_row = int(old_to_new[row]) if row < len(old_to_new) else -1
+            if new_row >= 0:
+                engine._add_delta(new_row, frequencies)
+        return engine
+
+    def _index_row(self, row: int, product: Product):
+        """Index one product's text in the side segment, replacing what `row` had"""
+        self._drop_row(row)
+        combined = Counter()
+        for name, weight in FIELD_WEIGHTS:
+            for word in tokenize(getattr(product, name)):
+                term = stem(word)
+                combined[term] += weight
+                if word not in self._delta_word_stems:
+                    self._delta_word_stems[word] = term
+                    insort(self._delta_words, word)
+        self._add_delta(row, dict(combined))
+        self._size = max(self._size, row + 1)
+
+    def _add_delta(self, row: int, frequencies: Dict[str, float]):
+        self._delta[row] = frequencies
+        self._delta_lengths[row] = sum(frequencies.values())
+        for term, frequency in frequencies.items():
+            self._delta_postings.setdefault(term, {})[row] = frequency
+
+    def _drop_row(self, row: int):
+        """Remove whatever is indexed for `row`"""
+        if row < len(self._in_base) and self._in_base[row]:
+            self._in_base[row] = False
+            self._masked += 1
+        for term in self._delta.pop(row, {}):
+            postings = self._delta_postings[term]
+            del postings[row]
+            if not postings:
+                del self._delta_postings[term]
+        self._delta_lengths.pop(row, None)
+        self._cache.clear()
+
+    # Queries
+
+    def search(self, query: str, candidates: Optional[np.ndarray] = None) -> SearchResult:
+        """Rows matching every query token, best first, optionally only among `candidates`
+
+        The whole catalog is scored and cached either way; restricting a
+        cached result afterwards is far cheaper than scoring again per filter.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return SearchResult(_EMPTY_ROWS, np.zeros(0, dtype=np.float32))
+        key = ' '.join(tokens)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached if candidates is None else cached.within(candidates)
+
+        result = self._score([self._expand(token) for token in tokens])
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result if candidates is None else result.within(candidates)
+
+    def refine(self, query: str, previous: SearchResult) -> Optional[SearchResult]:
+        """Search `query` among the rows of `previous`, the result of a broader query
+
+        This is how typing narrows a search. The tokens of `query` must expand
+        to the same stems as the previous query's, except that the last one
+        may expand to a subset of its stems and more tokens may follow, so
+        every match is among the previous rows. Only the changed and added
+        tokens are scored, and only for those rows, on top of the previous
+        sums; the result equals `search(query).within(previous.rows)`.
+        Returns None when `query` is not such a refinement, or when either
+        query matched through typo tolerance.
+        """
+        tokens = tokenize(query)
+        count = len(previous.terms)
+        if previous.fuzzy or not count or len(tokens) < count:
+            return None
+        cached = self._cache.get(' '.join(tokens))
+        if cached is not None:
+            return cached.within(previous.rows) if _narrows(cached.terms, cached.fuzzy, previous) else None
+        expansions = [self._expand(token) for token in tokens]
+        terms = tuple(frozenset(token_terms) for token_terms, _ in expansions)
+        if not _narrows(terms, any(is_fuzzy for _, is_fuzzy in expansions), previous):
+            return None
+        if terms == previous.terms:
+            return previous
+        if terms[count - 1] != previous.terms[count - 1]:
+            # The last token now matches fewer stems; score it again from the sums before it
+            result = self._score(expansions[count - 1:], (previous.rows, previous.partial))
+        else:
+            result = self._score(expansions[count:], (previous.rows, previous.scores))
+        return replace(result, terms=terms)
+
+    def _expand(self, token: str) -> Tuple[Dict[str, float], bool]:
+        """Stems a query token matches, with a score factor for each"""
+        terms: Dict[str, float] = {}
+        stemmed = stem(token)
+        for words, word_stems in ((self._words, self._word_stems), (self._delta_words, self._delta_word_stems)):
+            lo = bisect_left(words, token)
+            hi = bisect_left(words, token + '\uffff', lo)
+            for word in words[lo:hi]:
+                terms[word_stems[word]] = 1.0
+        if stemmed in self._stem_ids or stemmed in self._delta_postings:
+            terms[stemmed] = 1.0
+        if terms:
+            return terms, False
+
+        limit = max_edits(token)
+        if limit:
+            for word in self._similar_words(token, limit):
+                terms[self._word_stems.get(word) or self._delta_word_stems[word]] = FUZZY_PENALTY
+        return terms, True
+
+    def _similar_words(self, token: str, limit: int) -> List[str]:
+        """Indexed words within `limit` edits of `token`, or starting with such a prefix"""
+        grams = trigrams(token)
+        # An edit changes at most three trigrams, a transposition four, and
+        # the closing trigram of a token never occurs in a longer word
+        needed = max(1, len(grams) - 4 * limit - 1)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        candidates = [self._words[position] for position, count in shared.items() if count >= needed]
+        candidates.extend(word for word in self._delta_words if len(trigrams(word) & grams) >= needed)
+        return [
+            word for word in candidates
+            if edit_distance(token, word, limit) <= limit or edit_distance(token, word[:len(token)], limit) <= limit
+        ]
+
+    def _score(
+        self,
+        expansions: List[Tuple[Dict[str, float], bool]],
+        base: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> SearchResult:
+        """Score the rows matching every expanded token
+
+        With `base`, a previous result's rows and its sums over the tokens
+        before `expansions`, only those rows are scored, continuing the sums.
+        """
+        fuzzy = any(is_fuzzy for _, is_fuzzy in expansions)
+        terms = tuple(frozenset(token_terms) for token_terms, _ in expansions)
+        empty = SearchResult(_EMPTY_ROWS, np.zeros(0, dtype=np.float32), fuzzy, terms, np.zeros(0, dtype=np.float32))
+        # Base postings of removed or changed rows must not count
+        live_rows = self._in_base if self._masked else None
+        live = len(self) or 1
+        if base is None:
+            size = self._size
+            totals = np.zeros(size, dtype=np.float32)
+        else:
+            # Scores are summed per position in the base rows
+            base_rows, totals = base[0], base[1].copy()
+            size = len(base_rows)
+            slots = np.full(self._size, -1, dtype=POSITION_DTYPE)
+            slots[base_rows] = np.arange(size, dtype=POSITION_DTYPE)
+        matched = np.zeros(size, dtype=np.int32)
+        partial = totals
+        for token_terms, _ in expansions:
+            # A row can match several stems of one token; it scores the best of them
+            best = np.zeros(size, dtype=np.float32)
+            found = False
+            for rows, scores in self._term_postings(token_terms, live, live_rows):
+                if base is not None:
+                    rows = slots[rows]
+                    keep = rows >= 0
+                    rows, scores = rows[keep], scores[keep]
+                # Each stem has one posting per row, so rows never repeat within a part
+                best[rows] = np.maximum(best[rows], scores) if found else scores
+                found = found or len(rows) > 0
+            if not found:
+                return empty
+            partial = totals.copy()
+            totals += best
+            matched += best > 0
+        positions = np.flatnonzero(matched == len(expansions))
+        scores = totals[positions]
+        if base is None:
+            rows = positions.astype(POSITION_DTYPE)
+            order = np.argsort(-scores, kind='stable')
+        else:
+            # Equal scores in row order, as a full search has them
+            rows = base_rows[positions]
+            order = np.lexsort((rows, -scores))
+        return SearchResult(rows[order], scores[order], fuzzy, terms, partial[positions][order])
+
+    def _term_postings(
+        self,
+        terms: Dict[str, float],
+        live: int,
+        live_rows: Optional[np.ndarray]
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Rows and scores of each stem a query token expanded to, per segment"""
+        for term, factor in terms.items():
+            term_id = self._stem_ids.get(term)
+            delta = self._delta_postings.get(term, {})
+            frequency = (self._document_frequency[term_id] if term_id is not None else 0) + len(delta)
+            idf = math.log(1 + (live - frequency + 0.5) / (frequency + 0.5)) * factor
+            if term_id is not None:
+                lo, hi = self._offsets[term_id], self._offsets[term_id + 1]
+                rows = self._postings[lo:hi]
+                impacts = self._posting_impacts[lo:hi]
+                if live_rows is not None:
+                    keep = live_rows[rows]
+                    rows, impacts = rows[keep], impacts[keep]
+                yield rows, impacts * idf
+            if delta:
+                rows = np.fromiter(delta.keys(), dtype=POSITION_DTYPE, count=len(delta))
+                frequencies = np.fromiter(delta.values(), dtype=np.float32, count=len(delta))
+                lengths = np.array([self._delta_lengths[row] for row in delta], dtype=np.float32)
+                yield rows, self._impacts(frequencies, lengths) * idf
+
+def _narrows(terms: Iterable[AbstractSet[str]], fuzzy: bool, previous: SearchResult) -> bool:
+    """Whether tokens expanding to `terms` can only match rows that `previous` matched"""
+    return not fuzzy and all(token_terms <= before for token_terms, before in zip(terms, previous.terms))
+
+def _texts(products: ProductColumns) -> Iterator[Tuple[str, ...]]:
+    """Id and indexed text of every row"""
+    return zip(products.strings('id'), *(products.strings(name) for name, _ in FIELD_WEIGHTS))
@@ -0,0 +1,219 @@
+"""Session-scoped cart storage with TTL expiry"""
+
+import asyncio
+import heapq
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.cart import CartManager, ProductLookup
+from core.events import EventBus
+from core.storage import CartBackend, MemoryCartBackend
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CartMetrics:
+    """Point-in-time statistics about the cart store"""
+    live_carts: int
+    empty_carts: int
+    line_items: int
+    approx_bytes: int
+    expired_total: int
+    evicted_total: int
+
+class CartStore:
+    """Carts keyed by session id, expired when idle
+
+    Carts with items live for `cart_ttl` seconds after their last access and
+    empty carts for `empty_ttl`. Expiry uses a min-heap with lazy deletion:
+    entries that surface early are re-pushed with the cart's real deadline and
+    entries for discarded carts are dropped, so an expiry pass only looks at
+    carts that are due. When `max_carts` is reached the cart closest to expiry
+    is evicted.
+
+    Changes are handed to `backend`. With a shared backend, `load` re-reads
+    the cart so that workers see each other's changes, and expiring a cart
+    here only drops it from memory; the backend purges idle rows itself.
+    Changes are also published as `cart` events keyed by session id on
+    `events`, for the pages of that session to update themselves.
+    """
+
+    def __init__(
+        self,
+        product_lookup: ProductLookup,
+        cart_ttl: float = 7200,
+        empty_ttl: float = 3600,
+        max_carts: int = 100_000,
+        backend: Optional[CartBackend] = None,
+        events: Optional[EventBus] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.product_lookup = product_lookup
+        self.cart_ttl = cart_ttl
+        self.empty_ttl = empty_ttl
+        self.max_carts = max_carts
+        self.backend = backend or MemoryCartBackend()
+        self.events = events
+        self._clock = clock
+        self._carts: Dict[str, CartManager] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._expired_total = 0
+        self._evicted_total = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, session_id: str) -> CartManager:
+        """Get the cart for a session, creating it if needed, and mark it active"""
+        cart = self._carts.get(session_id)
+        if cart is None:
+            if len(self._carts) >= self.max_carts:
+                self._evict_one()
+            cart = CartManager(self.product_lookup, on_change=lambda c: self._changed(session_id, c))
+            self._carts[session_id] = cart
+        self.touch(session_id)
+        return cart
+
+    async def load(self, session_id: str) -> CartManager:
+        """Get the cart for a session with its latest stored contents"""
+        if not self.backend.shared:
+            return self.get(session_id)
+        quantities = await self.backend.load(session_id)
+        cart = self.get(session_id)
+        cart.replace(quantities or {})
+        return cart
+
+    def peek(self, session_id: str) -> Optional[CartManager]:
+        """Get the cart for a session without creating it or extending its life"""
+        return self._carts.get(session_id)
+
+    def touch(self, session_id: str):
+        """Restart the idle timer of a session's cart"""
+        if session_id not in self._carts:
+            return
+        now = self._clock()
+        previous = self._last_seen.get(session_id)
+        self._last_seen[session_id] = now
+        # Heap keys are lower bounds on the real deadline, which is re-derived
+        # from _last_seen when an entry surfaces; skipping tiny moves keeps the
+        # heap from filling with redundant entries on every click
+        min_ttl = min(self.empty_ttl, self.cart_ttl)
+        if previous is None or now - previous > min_ttl * 0.01:
+            heapq.heappush(self._heap, (now + min_ttl, session_id))
+            if previous is not None and not self._carts[session_id].is_empty():
+                self.backend.touch(session_id)
+            if len(self._heap) > 2 * len(self._carts) + 64:
+                self._compact()
+
+    def discard(self, session_id: str):
+        """Drop a session's cart"""
+        self._carts.pop(session_id, None)
+        self._last_seen.pop(session_id, None)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove carts whose deadline has passed and return how many were removed"""
+        now = self._clock() if now is None else now
+        removed = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, session_id = heapq.heappop(heap)
+            deadline = self._deadline(session_id)
+            if deadline is None:
+                continue
+            if deadline > now:
+                heapq.heappush(heap, (deadline, session_id))
+                continue
+            self.discard(session_id)
+            removed += 1
+        if len(heap) > 2 * len(self._carts) + 64:
+            self._compact()
+        self._expired_total += removed
+        return removed
+
+    def metrics(self) -> CartMetrics:
+        """Collect statistics about live carts and their approximate memory use"""
+        line_items = 0
+        empty = 0
+        approx_bytes = sys.getsizeof(self._carts) + sys.getsizeof(self._last_seen) + sys.getsizeof(self._heap)
+        for session_id, cart in self._carts.items():
+            count = len(cart)
+            line_items += count
+            if not count:
+                empty += 1
+            approx_bytes += sys.getsizeof(session_id) + sys.getsizeof(cart) + sys.getsizeof(cart._quantities)
+        return CartMetrics(
+            live_carts=len(self._carts),
+            empty_carts=empty,
+            line_items=line_items,
+            approx_bytes=approx_bytes,
+            expired_total=self._expired_total,
+            evicted_total=self._evicted_total
+        )
+
+    async def start(self, interval: float = 30):
+        """Open the backend and start the background expiry task"""
+        await self.backend.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._expiry_loop(interval))
+
+    async def stop(self):
+        """Stop the background expiry task and flush the backend"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.close()
+
+    async def _expiry_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.expire()
+            if removed:
+                logger.debug('Expired %d idle carts, %d live', removed, len(self._carts))
+            try:
+                purged = await self.backend.purge(self.cart_ttl)
+                if purged:
+                    logger.debug('Purged %d idle carts from storage', purged)
+            except Exception:
+                logger.exception('Purging idle carts failed')
+
+    def _changed(self, session_id: str, cart: CartManager):
+        if cart.is_empty() and session_id in self._last_seen:
+            # Entries re-pushed while the cart had items carry its longer deadline
+            heapq.heappush(self._heap, (self._deadline(session_id), session_id))
+        self.backend.save(session_id, cart.get_quantities())
+        if self.events is not None:
+            self.events.publish('cart', session_id, cart)
+
+    def _deadline(self, session_id: str) -> Optional[float]:
+        last_seen = self._last_seen.get(session_id)
+        if last_seen is None:
+            return None
+        cart = self._carts[session_id]
+        return last_seen + (self.empty_ttl if cart.is_empty() else self.cart_ttl)
+
+    def _evict_one(self):
+        heap = self._heap
+        while heap:
+            key, session_id = heapq.heappop(heap)
+            deadline = self._deadline(session_id)
+            if deadline is None:
+                continue
+            if deadline > key:
+                heapq.heappush(heap, (deadline, session_id))
+                continue
+            self.discard(session_id)
+            self._evicted_total += 1
+            return
+
+    def _compact(self):
+        self._heap = [(self._deadline(session_id), session_id) for session_id in self._last_seen]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._carts)
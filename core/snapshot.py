@@ -0,0 +1,102 @@
+"""Read-only catalog snapshot files shared between worker processes"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.columnar import ProductColumns
+from models.product import Product
+
+MAGIC = b'NSCAT\x00v2'
+HEADER = struct.Struct('<8sQQQ')  # magic, catalog version, product count, table of contents size
+ALIGNMENT = 8
+
+class SnapshotError(Exception):
+    """A snapshot file is missing or malformed"""
+
+def write_snapshot(path: str, products: Sequence[Product], version: int):
+    """Serialize products to `path`, replacing any previous snapshot atomically
+
+    Layout: header, a JSON table of contents, then the arrays of a
+    ProductColumns, each aligned to 8 bytes. Readers map the file and wrap
+    the arrays in place; replacing it by rename means open mappings keep
+    seeing the old file.
+    """
+    columns = products if isinstance(products, ProductColumns) else ProductColumns.from_products(products)
+    arrays = columns.arrays()
+    toc: List[Dict[str, object]] = []
+    offset = 0
+    for name, array in arrays.items():
+        toc.append({'name': name, 'dtype': array.dtype.str, 'offset': offset, 'length': len(array)})
+        offset = _align(offset + array.nbytes)
+    toc_data = json.dumps(toc, separators=(',', ':')).encode()
+    data_start = _align(HEADER.size + len(toc_data))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, version, len(columns), len(toc_data)))
+        f.write(toc_data)
+        for entry, array in zip(toc, arrays.values()):
+            f.seek(data_start + entry['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_snapshot(path: str) -> Tuple[int, ProductColumns]:
+    """Map a snapshot file and wrap its arrays without copying them
+
+    The mapping stays open for as long as the returned columns are used, so
+    every process reading the same snapshot shares its pages.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, toc_size = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f'{path} is not a catalog snapshot')
+        toc = json.loads(mapped[HEADER.size:HEADER.size + toc_size])
+        data_start = _align(HEADER.size + toc_size)
+        arrays = {
+            entry['name']: np.frombuffer(
+                mapped, dtype=np.dtype(entry['dtype']), count=entry['length'], offset=data_start + entry['offset']
+            )
+            for entry in toc
+        }
+        columns = ProductColumns.from_arrays(arrays)
+    except (OSError, ValueError, KeyError, struct.error) as error:
+        raise SnapshotError(f'Cannot read catalog snapshot {path}: {error}') from error
+    if len(columns) != count:
+        raise SnapshotError(f'{path} is truncated')
+    return version, columns
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+class SnapshotProductSource:
+    """Product source that follows a snapshot file written by another process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._products: Optional[ProductColumns] = None
+        self.version = 0
+
+    async def fetch_products(self) -> ProductColumns:
+        """Load the snapshot, returning the previous columns if the file is unchanged"""
+        stat = os.stat(self.path)
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp and self._products is not None:
+            return self._products
+        self.version, self._products = await asyncio.to_thread(read_snapshot, self.path)
+        self._stamp = stamp
+        return self._products
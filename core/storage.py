@@ -0,0 +1,246 @@
+"""Pluggable persistence for carts and sessions"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class CartBackend(ABC):
+    """Where cart contents and session activity are persisted
+
+    `save`, `touch` and `delete` only record intent and return immediately;
+    backends are free to batch them and must apply them in order per session.
+    """
+
+    # Whether other processes can change carts, so they must be re-read
+    shared = False
+
+    async def start(self):
+        """Prepare the backend for use"""
+
+    async def close(self):
+        """Write anything pending and release resources"""
+        await self.flush()
+
+    async def flush(self):
+        """Write anything pending now"""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[Dict[str, int]]:
+        """Get the stored cart for a session, or None if there is none"""
+
+    @abstractmethod
+    def save(self, session_id: str, quantities: Dict[str, int]):
+        """Store the cart contents of a session"""
+
+    @abstractmethod
+    def touch(self, session_id: str):
+        """Record activity for a session without changing its cart"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session's cart"""
+
+    @abstractmethod
+    async def purge(self, idle_seconds: float) -> int:
+        """Remove carts idle for longer than `idle_seconds` and return how many"""
+
+class MemoryCartBackend(CartBackend):
+    """Keeps carts only in the process's CartStore; nothing is persisted"""
+
+    async def load(self, session_id: str) -> Optional[Dict[str, int]]:
+        return None
+
+    def save(self, session_id: str, quantities: Dict[str, int]):
+        pass
+
+    def touch(self, session_id: str):
+        pass
+
+    def delete(self, session_id: str):
+        pass
+
+    async def purge(self, idle_seconds: float) -> int:
+        return 0
+
+_DELETED = object()
+
+class SQLiteCartBackend(CartBackend):
+    """SQLite storage in WAL mode, shareable by several worker processes
+
+    Writes are queued and coalesced per session, then flushed in one
+    transaction after `flush_interval` seconds, so a burst of clicks becomes a
+    single row update. Reads go through a write-through cache whose entries
+    are trusted for `cache_ttl` seconds before being re-read, which bounds how
+    stale a cart can look when another worker changed it.
+    """
+
+    shared = True
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS carts (
+            session_id TEXT PRIMARY KEY,
+            items TEXT NOT NULL,
+            last_seen REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS carts_last_seen ON carts (last_seen);
+    '''
+
+    def __init__(self, path: str, flush_interval: float = 0.05, cache_ttl: float = 2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self._connection: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection, which also serializes all statements
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cart-sqlite')
+        self._cache: Dict[str, tuple] = {}
+        self._pending: Dict[str, object] = {}
+        self._pending_touches: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._run(self._connect)
+
+    async def close(self):
+        await self.flush()
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    async def load(self, session_id: str) -> Optional[Dict[str, int]]:
+        pending = self._pending.get(session_id)
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return dict(pending)
+        cached = self._cache.get(session_id)
+        if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+            return dict(cached[0]) if cached[0] is not None else None
+
+        row = await self._run(self._select, session_id)
+        quantities = json.loads(row[0]) if row else None
+        self._cache[session_id] = (quantities, time.monotonic())
+        return dict(quantities) if quantities is not None else None
+
+    def save(self, session_id: str, quantities: Dict[str, int]):
+        if not quantities:
+            self.delete(session_id)
+            return
+        snapshot = dict(quantities)
+        self._cache[session_id] = (snapshot, time.monotonic())
+        self._pending[session_id] = snapshot
+        self._schedule_flush()
+
+    def touch(self, session_id: str):
+        self._pending_touches.add(session_id)
+        self._schedule_flush()
+
+    def delete(self, session_id: str):
+        self._cache[session_id] = (None, time.monotonic())
+        self._pending[session_id] = _DELETED
+        self._schedule_flush()
+
+    async def purge(self, idle_seconds: float) -> int:
+        await self.flush()
+        removed = await self._run(self._delete_idle, time.time() - idle_seconds)
+        # Other workers may have purged too; drop our view rather than serve ghosts
+        self._cache.clear()
+        return removed
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending and not self._pending_touches:
+            return
+        # Batches are handed to the single executor thread in order, so a later
+        # flush can never overtake an earlier one
+        pending, self._pending = self._pending, {}
+        touches, self._pending_touches = self._pending_touches, set()
+        try:
+            await self._run(self._write, pending, touches, time.time())
+        except Exception:
+            # Put the batch back unless newer writes replaced it meanwhile
+            for session_id, value in pending.items():
+                self._pending.setdefault(session_id, value)
+            self._pending_touches |= touches
+            raise
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self._background_flush())
+
+    async def _background_flush(self):
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Flushing carts to %s failed', self.path)
+            self._schedule_flush()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # The methods below run on the executor thread
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(self.SCHEMA)
+        self._connection = connection
+
+    def _select(self, session_id: str):
+        return self._connection.execute('SELECT items FROM carts WHERE session_id = ?', (session_id,)).fetchone()
+
+    def _write(self, pending: Dict[str, object], touches: Set[str], now: float):
+        upserts = [
+            (session_id, json.dumps(value, separators=(',', ':')), now)
+            for session_id, value in pending.items() if value is not _DELETED
+        ]
+        deletes = [(session_id,) for session_id, value in pending.items() if value is _DELETED]
+        touched = [(now, session_id) for session_id in touches if session_id not in pending]
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if upserts:
+                connection.executemany(
+                    'INSERT INTO carts (session_id, items, last_seen) VALUES (?, ?, ?) '
+                    'ON CONFLICT(session_id) DO UPDATE SET items = excluded.items, last_seen = excluded.last_seen',
+                    upserts
+                )
+            if deletes:
+                connection.executemany('DELETE FROM carts WHERE session_id = ?', deletes)
+            if touched:
+                connection.executemany('UPDATE carts SET last_seen = ? WHERE session_id = ?', touched)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _delete_idle(self, cutoff: float) -> int:
+        return self._connection.execute('DELETE FROM carts WHERE last_seen < ?', (cutoff,)).rowcount
+
+def create_cart_backend(kind: str, path: str = 'data/carts.db', flush_interval: float = 0.05, cache_ttl: float = 2.0) -> CartBackend:
+    """Create a cart backend by name"""
+    if kind == 'memory':
+        return MemoryCartBackend()
+    if kind == 'sqlite':
+        return SQLiteCartBackend(path, flush_interval=flush_interval, cache_ttl=cache_ttl)
+    raise ValueError(f"Unknown cart backend: {kind}")
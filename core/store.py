@@ -0,0 +1,119 @@
+"""Store catalog management"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from core.columnar import ProductColumns, ProductView
+from core.index import ProductIndex, QueryResult, tokenize
+from core.search import SearchEngine
+from models.product import Product
+
+class StoreManager:
+    """Holds the product catalog and answers product queries
+
+    Products are kept in columnar form; lookups and queries return
+    lightweight views rather than Product objects. Filters go through the
+    product index and search text through the ranked search engine.
+    """
+
+    def __init__(self):
+        self._products = ProductColumns.from_products([])
+        self._index = ProductIndex(self._products)
+        self._search = SearchEngine(self._products)
+
+    def set_products(self, products: Sequence[Product]):
+        """Replace the catalog with new products and rebuild the indexes"""
+        if not isinstance(products, ProductColumns):
+            products = ProductColumns.from_products(products)
+        self._products = products
+        self._index = ProductIndex(products)
+        self._search = SearchEngine(products)
+
+    def updated(self, products: Sequence[Product]) -> 'StoreManager':
+        """A new store for a new version of the catalog, leaving this one untouched
+
+        The search engine only re-indexes products whose text changed since
+        this store's catalog; the product index is rebuilt.
+        """
+        if not isinstance(products, ProductColumns):
+            products = ProductColumns.from_products(products)
+        store = StoreManager()
+        store._products = products
+        store._index = ProductIndex(products)
+        store._search = self._search.updated(products)
+        return store
+
+    @property
+    def index(self) -> ProductIndex:
+        return self._index
+
+    @property
+    def search(self) -> SearchEngine:
+        return self._search
+
+    def get_product(self, product_id: str) -> Optional[Product]:
+        """Get a product by id"""
+        return self._products.get(product_id)
+
+    def get_all_products(self) -> List[Product]:
+        """Get all products in the catalog"""
+        return list(self._products)
+
+    def get_categories(self) -> List[str]:
+        """Get the categories present in the catalog"""
+        return self._index.categories
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        search_query: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> QueryResult:
+        """Get one page of matching products together with the total match count
+
+        With search text, products are ranked by relevance unless `sort_by`
+        asks for another order.
+        """
+        if search_query and tokenize(search_query):
+            has_filters = category or min_price is not None or max_price is not None
+            candidates = self._index.query_ids(category, None, min_price, max_price) if has_filters else None
+            ids = self._search.search(search_query, candidates).rows
+            if sort_by is not None:
+                ids = self._index.sort_ids(np.sort(ids), sort_by)
+            page = ids[offset:offset + limit] if limit is not None else ids[offset:]
+            return QueryResult(
+                products=[ProductView(self._products, pos) for pos in page.tolist()],
+                total=len(ids),
+                offset=offset,
+                limit=limit
+            )
+        return self._index.query(
+            category=category,
+            search_query=search_query,
+            min_price=min_price,
+            max_price=max_price,
+            sort_by=sort_by,
+            offset=offset,
+            limit=limit
+        )
+
+    def get_filtered_products(
+        self,
+        category: Optional[str] = None,
+        search_query: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Product]:
+        """Get products matching a category, price range and search query"""
+        return self.query(category, search_query, min_price, max_price, sort_by, offset, limit).products
+
+    def __len__(self) -> int:
+        return len(self._products)
@@ -1,37 +1,54 @@
 """
 Nike Shoe Store - Main Application Entry Point
 Production-ready e-commerce application with modern UI
+
+    python main.py                     serve the store
+    python main.py --profile-startup   report import and init times, then exit
 """
 
-import os
+import argparse
+import time
+
+started = time.perf_counter()
+
 from dotenv import load_dotenv
 
+from app.startup import PhaseTimer, missing_packages
+
+timer = PhaseTimer()
+timer.phases.append(('entry imports', time.perf_counter() - started))
+
 # Load environment variables
-load_dotenv()
+with timer.phase('load .env'):
+    load_dotenv()
 
 def check_dependencies():
-    """Verify all required dependencies are available."""
-    required_packages = ['nicegui', 'uvicorn', 'python_dotenv', 'httpx']
-    missing_packages = []
+    """Verify all required dependencies are available without importing them."""
+    missing = missing_packages()
     
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-        except ImportError:
-            missing_packages.append(package)
-    
-    if missing_packages:
-        print(f"❌ Missing packages: {', '.join(missing_packages)}")
-        print(f"📦 Install with: pip install {' '.join(missing_packages)}")
+    if missing:
+        print(f"❌ Missing packages: {', '.join(missing)}")
+        print(f"📦 Install with: pip install {' '.join(missing)}")
         return False
     
     print("✅ All dependencies available")
     return True
 
 if __name__ == "__main__":
-    if check_dependencies():
+    parser = argparse.ArgumentParser(description='Nike Shoe Store')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print import-time and init-time breakdowns of a cold start and exit')
+    args = parser.parse_args()
+
+    with timer.phase('check dependencies'):
+        dependencies_ok = check_dependencies()
+    if not dependencies_ok:
+        exit(1)
+    if args.profile_startup:
+        from app.startup import profile_startup
+        if not profile_startup(timer):
+            exit(1)
+    else:
         # Import and start the application
         from app.main import start_app
         start_app()
-    else:
-        exit(1)
\ No newline at end of file
@@ -0,0 +1 @@
+"""Domain models package"""
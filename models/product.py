@@ -0,0 +1,14 @@
+"""Product model"""
+
+from dataclasses import dataclass
+
+@dataclass
+class Product:
+    """A product in the store catalog"""
+    id: str
+    name: str
+    price: float
+    category: str
+    description: str = ""
+    image_url: str = ""
+    stock: int = 0
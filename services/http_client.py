@@ -0,0 +1,33 @@
+"""Shared pooled HTTP client for outbound requests"""
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+_client: Optional['httpx.AsyncClient'] = None
+
+def get_http_client(max_connections: int = 20, timeout: float = 10.0) -> 'httpx.AsyncClient':
+    """Get the process-wide AsyncClient, creating it on first use
+
+    Connections are kept alive between requests, so every caller that goes
+    through this client shares one connection pool per upstream host.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        # Imported here so processes that never make an outbound request skip loading httpx
+        import httpx
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout),
+            follow_redirects=True,
+            headers={'User-Agent': 'nike-store/1.0'}
+        )
+    return _client
+
+async def close_http_client():
+    """Close the shared client and its connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,186 @@
+"""Product catalog loader for a paginated upstream HTTP API"""
+
+import asyncio
+import json
+import logging
+import random
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from core.columnar import ProductColumns
+from models.product import Product
+from services.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = {f.name for f in fields(Product)}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class ProductSourceError(Exception):
+    """The upstream product API could not be read"""
+
+class _RetryableStatus(Exception):
+    def __init__(self, response: httpx.Response):
+        super().__init__(f'HTTP {response.status_code}')
+        retry_after = response.headers.get('retry-after')
+        self.retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+
+@dataclass
+class _CachedPage:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    products: Sequence[Product] = field(default_factory=list)
+
+def parse_product(data: Dict[str, Any]) -> Product:
+    """Build a Product from an API record, ignoring unknown keys"""
+    values = {key: value for key, value in data.items() if key in PRODUCT_FIELDS}
+    values['id'] = str(values['id'])
+    values['price'] = float(values['price'])
+    if 'stock' in values:
+        values['stock'] = int(values['stock'])
+    return Product(**values)
+
+class HttpProductSource:
+    """Loads the catalog page by page from an upstream product API
+
+    Pages are requested as `GET <url>?page=N&page_size=M`. The first page
+    reports the total through an `X-Total-Pages` or `X-Total-Count` header and
+    the remaining pages are then fetched concurrently, at most `concurrency`
+    at a time. Newline-delimited JSON bodies are parsed line by line as they
+    stream in; JSON arrays (or `{"products": [...]}`) are parsed per page.
+    Each page remembers its ETag and Last-Modified, so unchanged pages come
+    back as 304 and are reused. Pages are kept in columnar form and joined
+    into one ProductColumns for the catalog.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        page_size: int = 500,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff_base: float = 0.25,
+        backoff_max: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None
+    ):
+        self.url = url
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = client
+        self._pages: Dict[int, _CachedPage] = {}
+        self._products: Optional[ProductColumns] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            return get_http_client(max_connections=self.concurrency)
+        return self._client
+
+    async def fetch_products(self) -> ProductColumns:
+        """Fetch the full catalog, returning the previous columns if nothing changed"""
+        first, changed, total_pages = await self._fetch_page(1)
+        pages = {1: first}
+
+        if total_pages is None:
+            # No total advertised: walk pages until a short one
+            page = 1
+            while len(pages[page]) >= self.page_size:
+                page += 1
+                pages[page], page_changed, _ = await self._fetch_page(page)
+                changed = changed or page_changed
+        elif total_pages > 1:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(page: int) -> Tuple[int, Sequence[Product], bool]:
+                async with semaphore:
+                    products, page_changed, _ = await self._fetch_page(page)
+                    return page, products, page_changed
+
+            for page, products, page_changed in await asyncio.gather(*(fetch(p) for p in range(2, total_pages + 1))):
+                pages[page] = products
+                changed = changed or page_changed
+
+        stale = [page for page in self._pages if page not in pages]
+        for page in stale:
+            del self._pages[page]
+        if not changed and not stale and self._products is not None:
+            return self._products
+
+        self._products = ProductColumns.concat([pages[page] for page in sorted(pages)])
+        return self._products
+
+    async def _fetch_page(self, page: int) -> Tuple[Sequence[Product], bool, Optional[int]]:
+        """Fetch one page with retries; returns (products, changed, total_pages)"""
+        attempt = 0
+        while True:
+            try:
+                return await self._request_page(page)
+            except (httpx.TransportError, _RetryableStatus) as error:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise ProductSourceError(f'Fetching page {page} from {self.url} failed: {error}') from error
+                delay = self._backoff(attempt, getattr(error, 'retry_after', None))
+                logger.warning('Page %d fetch failed (%s), retry %d in %.2fs', page, error, attempt, delay)
+                await asyncio.sleep(delay)
+
+    async def _request_page(self, page: int) -> Tuple[Sequence[Product], bool, Optional[int]]:
+        headers = {'Accept': 'application/x-ndjson, application/json'}
+        cached = self._pages.get(page)
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        params = {'page': page, 'page_size': self.page_size}
+        async with self.client.stream('GET', self.url, params=params, headers=headers) as response:
+            total_pages = self._total_pages(response)
+            if response.status_code == 304:
+                if cached is None:
+                    # Nothing was asked to be revalidated, so there is no body to fall back on
+                    raise ProductSourceError(f'{self.url} page {page} returned HTTP 304 to an unconditional request')
+                return cached.products, False, total_pages
+            if response.status_code in RETRY_STATUSES:
+                raise _RetryableStatus(response)
+            if response.status_code >= 400:
+                raise ProductSourceError(f'{self.url} page {page} returned HTTP {response.status_code}')
+
+            content_type = response.headers.get('content-type', '')
+            if 'ndjson' in content_type or 'jsonl' in content_type:
+                products = []
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        products.append(parse_product(json.loads(line)))
+            else:
+                data = json.loads(await response.aread())
+                records = data.get('products', []) if isinstance(data, dict) else data
+                products = [parse_product(record) for record in records]
+            products = ProductColumns.from_products(products)
+
+            self._pages[page] = _CachedPage(
+                etag=response.headers.get('etag'),
+                last_modified=response.headers.get('last-modified'),
+                products=products
+            )
+            return products, True, total_pages
+
+    def _total_pages(self, response: httpx.Response) -> Optional[int]:
+        pages = response.headers.get('x-total-pages')
+        if pages is not None:
+            return int(pages)
+        count = response.headers.get('x-total-count')
+        if count is not None:
+            return max(1, -(-int(count) // self.page_size))
+        return None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Exponential backoff with full jitter, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
@@ -0,0 +1,159 @@
+"""Product data service"""
+
+from typing import Dict, List, Optional, Protocol, Sequence
+
+from models.product import Product
+
+SAMPLE_PRODUCTS = [
+    {
+        'id': 'air-zoom-pegasus-40',
+        'name': 'Nike Air Zoom Pegasus 40',
+        'price': 130.00,
+        'category': 'running',
+        'description': 'A springy ride for every run, with responsive Zoom Air cushioning and a breathable mesh upper.',
+        'image_url': 'https://static.nike.com/a/images/pegasus-40.png',
+        'stock': 42,
+    },
+    {
+        'id': 'invincible-3',
+        'name': 'Nike Invincible 3',
+        'price': 180.00,
+        'category': 'running',
+        'description': 'Maximum cushioning with ZoomX foam to keep you comfortable on long road runs.',
+        'image_url': 'https://static.nike.com/a/images/invincible-3.png',
+        'stock': 18,
+    },
+    {
+        'id': 'vaporfly-3',
+        'name': 'Nike Vaporfly 3',
+        'price': 250.00,
+        'category': 'running',
+        'description': 'Race-day shoe with a full-length carbon fiber plate and lightweight ZoomX foam.',
+        'image_url': 'https://static.nike.com/a/images/vaporfly-3.png',
+        'stock': 7,
+    },
+    {
+        'id': 'revolution-7',
+        'name': 'Nike Revolution 7',
+        'price': 70.00,
+        'category': 'running',
+        'description': 'Soft foam and a supportive fit for everyday miles at an easy price.',
+        'image_url': 'https://static.nike.com/a/images/revolution-7.png',
+        'stock': 64,
+    },
+    {
+        'id': 'lebron-21',
+        'name': 'LeBron XXI',
+        'price': 200.00,
+        'category': 'basketball',
+        'description': 'Lightweight containment and Zoom Turbo cushioning built for explosive play.',
+        'image_url': 'https://static.nike.com/a/images/lebron-21.png',
+        'stock': 12,
+    },
+    {
+        'id': 'giannis-immortality-3',
+        'name': 'Giannis Immortality 3',
+        'price': 95.00,
+        'category': 'basketball',
+        'description': 'Grippy traction and a flexible forefoot for quick cuts and Euro steps.',
+        'image_url': 'https://static.nike.com/a/images/immortality-3.png',
+        'stock': 30,
+    },
+    {
+        'id': 'ja-1',
+        'name': 'Ja 1',
+        'price': 110.00,
+        'category': 'basketball',
+        'description': 'Low-profile court shoe with a secure fit for shifty guards.',
+        'image_url': 'https://static.nike.com/a/images/ja-1.png',
+        'stock': 25,
+    },
+    {
+        'id': 'air-force-1-07',
+        'name': "Nike Air Force 1 '07",
+        'price': 115.00,
+        'category': 'lifestyle',
+        'description': 'The classic hoops icon with crisp leather, bold details and Nike Air cushioning.',
+        'image_url': 'https://static.nike.com/a/images/air-force-1.png',
+        'stock': 80,
+    },
+    {
+        'id': 'air-max-90',
+        'name': 'Nike Air Max 90',
+        'price': 130.00,
+        'category': 'lifestyle',
+        'description': 'Visible Max Air cushioning and the waffle outsole that started it all.',
+        'image_url': 'https://static.nike.com/a/images/air-max-90.png',
+        'stock': 55,
+    },
+    {
+        'id': 'dunk-low-retro',
+        'name': 'Nike Dunk Low Retro',
+        'price': 115.00,
+        'category': 'lifestyle',
+        'description': 'Created for the hardwood, now a streetwear staple with padded low-cut collar.',
+        'image_url': 'https://static.nike.com/a/images/dunk-low.png',
+        'stock': 3,
+    },
+    {
+        'id': 'metcon-9',
+        'name': 'Nike Metcon 9',
+        'price': 150.00,
+        'category': 'training',
+        'description': 'Stable heel and durable rubber wrap for lifting, sprints and rope climbs.',
+        'image_url': 'https://static.nike.com/a/images/metcon-9.png',
+        'stock': 21,
+    },
+    {
+        'id': 'free-metcon-5',
+        'name': 'Nike Free Metcon 5',
+        'price': 120.00,
+        'category': 'training',
+        'description': 'Flexible forefoot and a stable heel for versatile gym workouts.',
+        'image_url': 'https://static.nike.com/a/images/free-metcon-5.png',
+        'stock': 33,
+    },
+]
+
+class ProductSource(Protocol):
+    """Anything that can fetch the full catalog"""
+
+    async def fetch_products(self) -> Sequence[Product]:
+        """Fetch all products, returning the previous object if unchanged"""
+
+class ProductService:
+    """Loads product data and provides lookups"""
+
+    def __init__(self, source: Optional[ProductSource] = None):
+        self.source = source
+        self._products: Sequence[Product] = []
+        self._by_id: Optional[Dict[str, Product]] = None
+
+    async def load_products(self) -> Sequence[Product]:
+        """Load the product catalog
+
+        Returns the previously loaded object when the source reports that
+        nothing changed.
+        """
+        if self.source is not None:
+            products = await self.source.fetch_products()
+            if products is self._products:
+                return products
+        elif self._products:
+            return self._products
+        else:
+            products = [Product(**data) for data in SAMPLE_PRODUCTS]
+        self._products = products
+        self._by_id = None
+        return products
+
+    def get_all_products(self) -> List[Product]:
+        """Get all loaded products"""
+        return list(self._products)
+
+    def get_product(self, product_id: str) -> Optional[Product]:
+        """Get a product by id"""
+        if self._by_id is None:
+            # Built on first use; the store answers lookups for the UI
+            self._by_id = {product.id: product for product in self._products}
+        return self._by_id.get(product_id)
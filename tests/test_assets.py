@@ -0,0 +1,29 @@
+"""Asset build: fingerprinting and pruning of earlier builds"""
+
+import json
+
+from app.assets import build_assets
+
+def test_rebuild_removes_files_of_earlier_builds(tmp_path):
+    source, static = tmp_path / 'assets', tmp_path / 'static'
+    source.mkdir()
+    (source / 'store.js').write_text('console.log(1);\n' * 50)
+    (source / 'store.css').write_text('body { margin: 0; }\n')
+    first = build_assets(str(source), str(static))
+    build = static / 'build'
+    old_js = build / first['store.js'].rsplit('/', 1)[1]
+    assert old_js.exists() and old_js.with_name(old_js.name + '.gz').exists()
+
+    (source / 'store.js').write_text('console.log(2);\n' * 50)
+    (static / 'logo.svg').write_text('<svg/>')
+    second = build_assets(str(source), str(static))
+
+    assert second['store.css'] == first['store.css']
+    assert second['store.js'] != first['store.js']
+    assert not old_js.exists() and not old_js.with_name(old_js.name + '.gz').exists()
+    current = {'manifest.json', *(url.rsplit('/', 1)[1] for url in second.values())}
+    compressed = {name + suffix for name in current for suffix in ('.gz', '.br')}
+    remaining = {path.name for path in build.iterdir()}
+    assert current <= remaining <= current | compressed
+    assert (static / 'logo.svg').exists()
+    assert json.loads((build / 'manifest.json').read_text()) == second
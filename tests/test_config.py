@@ -0,0 +1,126 @@
+"""Settings validation and hot reload of the .env file"""
+
+import logging
+import os
+from dataclasses import fields
+
+import pytest
+
+import app.config as config
+from app.config import LIVE_SETTINGS, Settings, SettingsWatcher, load_settings
+
+# Variables the watcher tests write to the .env file
+ENV_NAMES = ('STORE_NAME', 'STORE_TAGLINE', 'TAX_RATE', 'PORT')
+
+def test_defaults_are_valid():
+    assert load_settings({}) == Settings()
+
+@pytest.mark.parametrize('environ, message', [
+    ({'PORT': '80a'}, "PORT must be an integer, got '80a'"),
+    ({'WORKERS': '1.5'}, "WORKERS must be an integer, got '1.5'"),
+    ({'TAX_RATE': 'eight'}, "TAX_RATE must be a number, got 'eight'"),
+    ({'DEBUG': 'maybe'}, "DEBUG must be true or false, got 'maybe'"),
+    ({'METRICS_ENABLED': ''}, "METRICS_ENABLED must be true or false, got ''"),
+])
+def test_unparsable_values_are_rejected(environ, message):
+    with pytest.raises(ValueError, match=message):
+        load_settings(environ)
+
+@pytest.mark.parametrize('value, expected', [
+    ('true', True), ('True', True), ('1', True), ('yes', True), ('ON', True),
+    ('false', False), ('FALSE', False), ('0', False), ('no', False), ('off', False),
+])
+def test_bool_spellings(value, expected):
+    assert load_settings({'DEBUG': value, 'METRICS_ENABLED': value}).debug is expected
+
+@pytest.mark.parametrize('kwargs, message', [
+    (dict(workers='2'), "workers must be int, got '2'"),
+    (dict(port=True), 'port must be int, got True'),
+    (dict(debug='true'), "debug must be bool, got 'true'"),
+    (dict(metrics_enabled=1), 'metrics_enabled must be bool, got 1'),
+    (dict(tax_rate='0.1'), "tax_rate must be float, got '0.1'"),
+    (dict(port=0), 'port must be 1-65535'),
+    (dict(tax_rate=1.0), 'tax_rate must be a fraction'),
+    (dict(currency='usd'), 'currency must be an ISO 4217 code'),
+    (dict(default_image_size='400'), 'default_image_size must be WIDTHxHEIGHT'),
+    (dict(image_quality='101'), 'image_quality must be one of'),
+    (dict(cart_backend='redis'), 'cart_backend must be one of'),
+    (dict(max_carts=0), 'max_carts must be positive'),
+    (dict(cart_flush_ms=-1), 'cart_flush_ms must not be negative'),
+])
+def test_invalid_settings_are_rejected(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        Settings(**kwargs)
+
+def test_every_problem_is_reported():
+    with pytest.raises(ValueError) as error:
+        Settings(port=70000, tax_rate=-0.1, grid_page_size=0)
+    assert 'port must be' in str(error.value)
+    assert 'tax_rate must be' in str(error.value)
+    assert 'grid_page_size must be' in str(error.value)
+
+def test_live_settings_are_fields():
+    assert LIVE_SETTINGS <= {field.name for field in fields(Settings)}
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    """An empty .env file, with process-wide settings and listeners restored afterwards"""
+    for name in ENV_NAMES:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(config, '_settings', load_settings({}))
+    monkeypatch.setattr(config, '_listeners', [])
+    path = tmp_path / '.env'
+    path.write_text('')
+    return path
+
+def rewrite(path, text: str):
+    """Write the file and move its mtime on, as a coarse filesystem clock may not"""
+    stamp = os.stat(path).st_mtime + 1
+    path.write_text(text)
+    os.utime(path, (stamp, stamp))
+
+def test_watcher_applies_changes_and_tells_listeners(env_file, caplog):
+    calls = []
+    config.on_settings_change(lambda old, new: calls.append((old.store_name, new.store_name)))
+    watcher = SettingsWatcher(str(env_file))
+    assert watcher.check() == []
+    rewrite(env_file, 'STORE_NAME=Outlet\nPORT=9000\n')
+    with caplog.at_level(logging.WARNING, logger='app.config'):
+        assert watcher.check() == ['port', 'store_name']
+    assert config.get_settings().store_name == 'Outlet'
+    assert config.get_settings().port == 9000
+    assert calls == [('Nike Official Store', 'Outlet')]
+    assert 'Changes to port take effect after a restart' in caplog.text
+    # Unchanged since the last check
+    assert watcher.check() == []
+    assert os.environ['STORE_NAME'] == 'Outlet'
+
+def test_removed_variable_falls_back_to_its_default(env_file):
+    env_file.write_text('STORE_NAME=Outlet\n')
+    watcher = SettingsWatcher(str(env_file))
+    assert watcher.reload() == ['store_name']
+    rewrite(env_file, '')
+    assert watcher.check() == ['store_name']
+    assert config.get_settings().store_name == Settings().store_name
+    assert 'STORE_NAME' not in os.environ
+
+def test_invalid_file_keeps_the_current_settings(env_file, caplog):
+    watcher = SettingsWatcher(str(env_file))
+    rewrite(env_file, 'STORE_NAME=Outlet\nTAX_RATE=lots\n')
+    with caplog.at_level(logging.ERROR, logger='app.config'):
+        assert watcher.check() == []
+    assert config.get_settings() == Settings()
+    assert 'TAX_RATE must be a number' in caplog.text
+    assert 'STORE_NAME' not in os.environ
+    # Fixing the file applies it
+    rewrite(env_file, 'STORE_NAME=Outlet\nTAX_RATE=0.2\n')
+    assert watcher.check() == ['store_name', 'tax_rate']
+    assert config.get_settings().tax_rate == 0.2
+
+def test_real_environment_takes_precedence(env_file, monkeypatch):
+    monkeypatch.setenv('STORE_TAGLINE', 'From the environment')
+    monkeypatch.setattr(config, '_settings', load_settings())
+    watcher = SettingsWatcher(str(env_file))
+    rewrite(env_file, 'STORE_TAGLINE=From the file\nSTORE_NAME=Outlet\n')
+    assert watcher.check() == ['store_name']
+    assert config.get_settings().store_tagline == 'From the environment'
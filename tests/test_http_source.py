@@ -0,0 +1,149 @@
+"""Paginated loading, conditional requests and retries of the HTTP product source"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import services.http_source as http_source
+from services.http_source import HttpProductSource, ProductSourceError
+
+URL = 'http://upstream.test/products'
+
+def record(i: int) -> dict:
+    return {'id': i, 'name': f'Shoe {i}', 'price': '99.5', 'category': 'running', 'description': 'light', 'extra': 1}
+
+class Upstream:
+    """Serves `count` products in pages and records every request"""
+
+    def __init__(self, count: int, total_header: str = 'x-total-count', ndjson: bool = False):
+        self.count = count
+        self.total_header = total_header
+        self.ndjson = ndjson
+        self.version = 1
+        self.requests = []
+        self.failures = {}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        page = int(request.url.params['page'])
+        size = int(request.url.params['page_size'])
+        if self.failures.get(page):
+            self.failures[page] -= 1
+            return httpx.Response(503, headers={'retry-after': '0'})
+        headers = {'etag': f'"p{page}-v{self.version}"'}
+        if self.total_header == 'x-total-count':
+            headers['x-total-count'] = str(self.count)
+        elif self.total_header == 'x-total-pages':
+            headers['x-total-pages'] = str(-(-self.count // size))
+        if request.headers.get('if-none-match') == headers['etag']:
+            return httpx.Response(304, headers=headers)
+        records = [record(i) for i in range((page - 1) * size, min(page * size, self.count))]
+        if self.ndjson:
+            headers['content-type'] = 'application/x-ndjson'
+            return httpx.Response(200, headers=headers, content=''.join(json.dumps(r) + '\n' for r in records))
+        return httpx.Response(200, headers=headers, json={'products': records})
+
+    def pages(self):
+        return [int(request.url.params['page']) for request in self.requests]
+
+def make_source(upstream, **kwargs) -> HttpProductSource:
+    kwargs.setdefault('page_size', 10)
+    return HttpProductSource(URL, client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)), **kwargs)
+
+def ids(columns):
+    return [int(product.id) for product in columns]
+
+@pytest.mark.parametrize('total_header', ['x-total-count', 'x-total-pages', None])
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_fetches_every_page_in_order(total_header, ndjson):
+    upstream = Upstream(45, total_header, ndjson)
+    products = asyncio.run(make_source(upstream, concurrency=3).fetch_products())
+    assert ids(products) == list(range(45))
+    assert products[0].price == 99.5
+    assert sorted(upstream.pages()) == [1, 2, 3, 4, 5]
+
+def test_walks_pages_until_a_short_one_without_totals():
+    upstream = Upstream(30, None)
+    products = asyncio.run(make_source(upstream).fetch_products())
+    # Three full pages, then an empty one tells the walk to stop
+    assert ids(products) == list(range(30))
+    assert upstream.pages() == [1, 2, 3, 4]
+
+def test_unchanged_pages_are_reused_on_304():
+    upstream = Upstream(25)
+    source = make_source(upstream)
+
+    async def fetch_twice():
+        return await source.fetch_products(), await source.fetch_products()
+
+    first, second = asyncio.run(fetch_twice())
+    assert second is first
+    revalidations = upstream.requests[3:]
+    assert [request.headers['if-none-match'] for request in revalidations] == ['"p1-v1"', '"p2-v1"', '"p3-v1"']
+
+def test_changed_catalog_is_rebuilt_after_304s():
+    upstream = Upstream(25)
+    source = make_source(upstream)
+
+    async def fetch_after_change():
+        first = await source.fetch_products()
+        upstream.count, upstream.version = 12, 2
+        return first, await source.fetch_products()
+
+    first, second = asyncio.run(fetch_after_change())
+    assert second is not first
+    assert ids(second) == list(range(12))
+    # The page that disappeared upstream is no longer cached
+    assert sorted(source._pages) == [1, 2]
+
+def test_304_without_a_cached_page_is_an_error():
+    def not_modified(request):
+        return httpx.Response(304, headers={'x-total-count': '5'})
+
+    with pytest.raises(ProductSourceError, match='304'):
+        asyncio.run(make_source(not_modified).fetch_products())
+
+def test_retries_with_backoff(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(http_source.asyncio, 'sleep', sleep)
+    upstream = Upstream(25)
+    upstream.failures = {2: 2}
+    products = asyncio.run(make_source(upstream, concurrency=1, backoff_base=1.0).fetch_products())
+    assert ids(products) == list(range(25))
+    assert upstream.pages() == [1, 2, 2, 2, 3]
+    assert len(delays) == 2
+    # Full jitter stays within the exponential cap of each attempt
+    assert 0 <= delays[0] <= 1.0 and 0 <= delays[1] <= 2.0
+
+def test_retry_after_sets_the_minimum_delay():
+    source = HttpProductSource(URL, backoff_base=0.01)
+    assert source._backoff(1, 3.0) == 3.0
+    assert source._backoff(10, None) <= source.backoff_max
+
+def test_gives_up_after_max_retries(monkeypatch):
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(http_source.asyncio, 'sleep', sleep)
+    upstream = Upstream(5)
+    upstream.failures = {1: 10}
+    with pytest.raises(ProductSourceError, match='HTTP 503'):
+        asyncio.run(make_source(upstream, max_retries=3).fetch_products())
+    assert upstream.pages() == [1, 1, 1, 1]
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def missing(request):
+        calls.append(request)
+        return httpx.Response(404)
+
+    with pytest.raises(ProductSourceError, match='404'):
+        asyncio.run(make_source(missing).fetch_products())
+    assert len(calls) == 1
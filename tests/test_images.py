@@ -0,0 +1,124 @@
+"""Image format negotiation, shared renders and the shared disk cache"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+import app.images as images
+from app.images import DiskCache, ImageProxy
+
+CHROME = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+OLD_FIREFOX = 'image/webp,*/*'
+
+@pytest.fixture
+def proxy(tmp_path):
+    proxy = ImageProxy(lambda product_id: None, str(tmp_path / 'images'), max_cache_bytes=1 << 20)
+    proxy._formats = ['avif', 'webp', 'jpeg']
+    return proxy
+
+@pytest.mark.parametrize('accept, expected', [
+    (CHROME, 'avif'),
+    (OLD_FIREFOX, 'webp'),
+    ('*/*', 'jpeg'),
+    ('', 'jpeg'),
+    ('image/avif;q=0, image/webp', 'webp'),
+    ('image/webp;q=0,image/avif;q=0', 'jpeg'),
+    ('image/avif;q=0.5, image/webp;q=0.9', 'webp'),
+    ('image/webp;q=0.5, image/jpeg', 'jpeg'),
+    ('image/avif;q=0.8, image/webp;q=0.8', 'avif'),
+    ('IMAGE/WEBP', 'webp'),
+    ('image/avif-sequence', 'jpeg'),
+])
+def test_negotiate_format(proxy, accept, expected):
+    assert proxy.negotiate_format(accept) == expected
+
+def test_negotiate_format_skips_formats_the_encoder_lacks(proxy):
+    proxy._formats = ['jpeg']
+    assert proxy.negotiate_format(CHROME) == 'jpeg'
+
+def test_cancelled_render_releases_waiters(proxy, monkeypatch):
+    started = asyncio.Event()
+
+    class SlowClient:
+        async def get(self, url):
+            started.set()
+            await asyncio.sleep(60)
+
+    monkeypatch.setattr(images, 'get_http_client', lambda: SlowClient())
+
+    async def run():
+        args = ('key', str(proxy.cache.path_for('key', 'jpeg')), 'http://img.test/a.jpg', '200x200', 'jpeg')
+        leader = asyncio.create_task(proxy._render_once(*args))
+        await started.wait()
+        waiter = asyncio.create_task(proxy._render_once(*args))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(RuntimeError, match='cancelled'):
+            await asyncio.wait_for(waiter, timeout=1)
+        assert leader.cancelled()
+        return proxy._inflight
+
+    assert asyncio.run(run()) == {}
+
+def write(cache: DiskCache, key: str, size: int, age: float = 0.0) -> str:
+    path = cache.path_for(key, 'jpeg')
+    cache.write_file(path, b'x' * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return path
+
+def test_caches_sharing_a_directory_see_each_others_files(tmp_path):
+    ours = DiskCache(str(tmp_path), max_bytes=1000)
+    theirs = DiskCache(str(tmp_path), max_bytes=1000)
+    path = write(theirs, 'aa01', 300)
+    theirs.add(path, 300)
+    assert ours.get(path) == path
+    assert ours.total_bytes == 300
+    os.remove(path)
+    assert ours.get(path) is None
+    assert ours.total_bytes == 0
+
+def test_rescan_evicts_by_directory_size(tmp_path):
+    ours = DiskCache(str(tmp_path), max_bytes=1000)
+    theirs = DiskCache(str(tmp_path), max_bytes=1000)
+    for i, age in enumerate((30, 20, 10)):
+        theirs.add(write(theirs, f'bb{i:02}', 300, age), 300)
+    newest = write(ours, 'cc00', 300)
+    ours.add(newest, 300)
+    # This process has only written 300 bytes, the directory holds 1200
+    assert ours.total_bytes == 300
+    ours.rescan()
+    assert ours.total_bytes == 900
+    remaining = sorted(name for _, _, names in os.walk(tmp_path) for name in names)
+    assert remaining == ['bb01.jpeg', 'bb02.jpeg', 'cc00.jpeg']
+
+def test_hits_keep_files_from_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=600)
+    old = write(cache, 'dd00', 300, age=60)
+    write(cache, 'dd01', 300, age=30)
+    cache.rescan()
+    assert cache.get(old) == old
+    write(cache, 'dd02', 300)
+    cache.rescan()
+    assert os.path.exists(old)
+    assert not os.path.exists(cache.path_for('dd01', 'jpeg'))
+
+def test_rescan_keeps_recent_temp_files(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    recent, stale = tmp_path / 'a.jpeg.1.tmp', tmp_path / 'b.jpeg.2.tmp'
+    recent.write_bytes(b'x')
+    stale.write_bytes(b'x')
+    stamp = time.time() - images.STALE_TEMP_SECONDS - 1
+    os.utime(stale, (stamp, stamp))
+    cache.rescan()
+    assert recent.exists() and not stale.exists()
+    assert cache.total_bytes == 0
+
+def test_rescan_is_due_after_the_interval(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000, rescan_interval=0.05)
+    assert not cache.rescan_due
+    time.sleep(0.06)
+    assert cache.rescan_due
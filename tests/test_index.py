@@ -0,0 +1,63 @@
+"""ProductIndex queries must match the list-of-products scan they replaced"""
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_product_index import CATEGORIES, SCENARIOS, make_products, naive_query
+from core.index import SORT_OPTIONS, ProductIndex
+
+PRODUCTS = make_products(1500)
+INDEX = ProductIndex(PRODUCTS)
+SEARCHES = [None, 'zoom', 'air pe', 'Retro LOW', 'pegasus 1', 'p', 'nomatch', 'air-max', '']
+PRICES = [(None, None), (100, 150), (None, 60.5), (250, None), (300, 40)]
+
+def assert_same(kwargs):
+    expected = naive_query(PRODUCTS, **kwargs)
+    result = INDEX.query(**kwargs)
+    assert [product.id for product in result.products] == [product.id for product in expected], kwargs
+    unpaged = dict(kwargs, offset=0, limit=None)
+    assert result.total == len(naive_query(PRODUCTS, **unpaged)), kwargs
+
+@pytest.mark.parametrize('name, kwargs', SCENARIOS)
+def test_benchmark_scenarios(name, kwargs):
+    assert_same(kwargs)
+
+@pytest.mark.parametrize('category', [None, *CATEGORIES, 'sandals'])
+@pytest.mark.parametrize('sort_by', [None, *SORT_OPTIONS])
+def test_filter_combinations(category, sort_by):
+    for search_query, (min_price, max_price) in itertools.product(SEARCHES, PRICES):
+        assert_same(dict(
+            category=category, search_query=search_query, min_price=min_price, max_price=max_price, sort_by=sort_by
+        ))
+
+@pytest.mark.parametrize('sort_by', [None, *SORT_OPTIONS])
+def test_pages(sort_by):
+    # Small pages take the partial sort, large ones the full sort
+    for offset, limit in [(0, 1), (0, 24), (24, 24), (1490, 24), (0, 1000), (500, None), (2000, 10)]:
+        assert_same(dict(sort_by=sort_by, offset=offset, limit=limit))
+        assert_same(dict(category='running', sort_by=sort_by, offset=offset, limit=limit))
+
+def test_random_queries():
+    rng = random.Random(11)
+    for _ in range(150):
+        low = rng.choice([None, rng.uniform(30, 300)])
+        assert_same(dict(
+            category=rng.choice([None, *CATEGORIES]),
+            search_query=rng.choice(SEARCHES),
+            min_price=low,
+            max_price=rng.choice([None, (low or 30) + rng.uniform(0, 150)]),
+            sort_by=rng.choice([None, *SORT_OPTIONS]),
+            offset=rng.choice([0, 0, 10, 100]),
+            limit=rng.choice([None, 12, 24, 48])
+        ))
+
+def test_candidates_restrict_the_results():
+    rng = np.random.default_rng(3)
+    candidates = np.sort(rng.choice(len(PRODUCTS), size=400, replace=False)).astype(np.int32)
+    subset = [PRODUCTS[pos] for pos in candidates.tolist()]
+    for kwargs in [dict(), dict(category='training'), dict(search_query='air'), dict(min_price=100, sort_by='name')]:
+        expected = [product.id for product in naive_query(subset, **kwargs)]
+        assert [product.id for product in INDEX.query(candidates=candidates, **kwargs).products] == expected, kwargs
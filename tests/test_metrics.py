@@ -0,0 +1,18 @@
+"""Prometheus text exposition of the metrics registry"""
+
+from app.metrics import Metrics
+
+def test_label_values_and_help_are_escaped():
+    metrics = Metrics(enabled=True)
+    metrics.counter('requests', 'Requests\nby "path" \\ status').inc(path='/a"b\\c\nd')
+    lines = metrics.render().splitlines()
+    assert lines == [
+        '# HELP store_requests Requests\\nby "path" \\\\ status',
+        '# TYPE store_requests counter',
+        'store_requests_total{path="/a\\"b\\\\c\\nd"} 1',
+    ]
+
+def test_plain_labels_are_unchanged():
+    metrics = Metrics(enabled=True)
+    metrics.histogram('latency_seconds', 'Latency', (0.1,)).observe(0.05, route='/checkout')
+    assert 'store_latency_seconds_bucket{route="/checkout",le="0.1"} 1' in metrics.render()
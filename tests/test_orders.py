@@ -0,0 +1,149 @@
+"""Order pricing, idempotent submits, batched writes and units sold"""
+
+import asyncio
+from decimal import Decimal
+
+from core.cart import CartItem, CartManager
+from core.orders import OrderPipeline, OrderStore, compute_totals, order_lines
+from models.product import Product
+
+SHOE = Product(id='1', name='Pegasus', price=19.99, category='running', description='', stock=10)
+BOOT = Product(id='2', name='Trail', price=0.1, category='trail', description='', stock=5)
+
+def make_pipeline(tmp_path, **kwargs) -> OrderPipeline:
+    kwargs.setdefault('sold_refresh_interval', 0)
+    return OrderPipeline(OrderStore(str(tmp_path / 'orders.db')), tax_rate=0.0825, **kwargs)
+
+async def confirmed(pipeline: OrderPipeline, count: int):
+    while pipeline.stats()['confirmed_total'] < count:
+        await asyncio.sleep(0.01)
+
+def test_totals_are_exact_decimals():
+    lines = order_lines([CartItem(SHOE, 3), CartItem(BOOT, 3), CartItem(BOOT, 0)])
+    assert [line.unit_price for line in lines] == [Decimal('19.99'), Decimal('0.10')]
+    totals = compute_totals(lines, 0.0825)
+    # 0.1 * 3 is 0.30000000000000004 in floats
+    assert totals.subtotal == Decimal('60.27')
+    assert totals.tax == Decimal('4.97')
+    assert totals.total == Decimal('65.24')
+
+def test_concurrent_submits_with_one_key_place_one_order(tmp_path):
+    async def run():
+        pipeline = make_pipeline(tmp_path)
+        await pipeline.start()
+        orders = await asyncio.gather(*(
+            pipeline.submit('key-1', 'session', [CartItem(SHOE, 2)]) for _ in range(5)
+        ))
+        await confirmed(pipeline, 1)
+        # A repeat after the first has been stored is answered from the store
+        later = await pipeline.submit('key-1', 'session', [CartItem(SHOE, 2)])
+        sold = await pipeline.store.units_sold()
+        stats = pipeline.stats()
+        await pipeline.stop()
+        return orders, later, sold, stats
+
+    orders, later, sold, stats = asyncio.run(run())
+    assert len({order.id for order in orders}) == 1
+    assert later.id == orders[0].id
+    assert sold == {'1': 2}
+    assert stats['accepted_total'] == 1
+    assert stats['duplicate_total'] == 5
+
+def test_key_is_unique_across_pipelines(tmp_path):
+    async def run():
+        first, second = make_pipeline(tmp_path), make_pipeline(tmp_path)
+        await first.start()
+        await second.start()
+        a = await first.submit('shared', 'session', [CartItem(SHOE, 1)])
+        b = await second.submit('shared', 'session', [CartItem(SHOE, 1)])
+        await first.stop()
+        await second.stop()
+        return a, b
+
+    a, b = asyncio.run(run())
+    assert b.id == a.id
+    assert b.totals == a.totals
+
+def test_burst_is_stored_in_batches(tmp_path):
+    async def run():
+        pipeline = make_pipeline(tmp_path, batch_size=20)
+        batches = []
+        insert = pipeline.store.insert
+
+        async def recording_insert(orders):
+            batches.append(len(orders))
+            return await insert(orders)
+
+        pipeline.store.insert = recording_insert
+        await pipeline.start()
+        orders = await asyncio.gather(*(
+            pipeline.submit(f'key-{i}', 'session', [CartItem(BOOT, 1)]) for i in range(50)
+        ))
+        await confirmed(pipeline, 50)
+        stored = await pipeline.store.get(orders[-1].id)
+        await pipeline.stop()
+        return orders, batches, stored
+
+    orders, batches, stored = asyncio.run(run())
+    assert batches == [20, 20, 10]
+    assert len({order.id for order in orders}) == 50
+    assert stored.status == 'confirmed'
+    assert stored.totals.total == Decimal('0.11')
+
+def test_units_sold_by_another_process_are_picked_up(tmp_path):
+    async def run():
+        ours = make_pipeline(tmp_path)
+        theirs = make_pipeline(tmp_path)
+        await ours.start()
+        await theirs.start()
+        await theirs.submit('theirs-1', 'session', [CartItem(SHOE, 4)])
+        await confirmed(theirs, 1)
+        before = ours.available(SHOE)
+        await ours.reload_sold()
+        after_reload = ours.available(SHOE)
+        # Confirming an order of our own brings in their sales of the same product
+        await theirs.submit('theirs-2', 'session', [CartItem(SHOE, 1)])
+        await confirmed(theirs, 2)
+        await ours.submit('ours-1', 'session', [CartItem(SHOE, 1)])
+        await confirmed(ours, 1)
+        after_order = ours.available(SHOE)
+        await ours.stop()
+        await theirs.stop()
+        return before, after_reload, after_order
+
+    assert asyncio.run(run()) == (10, 6, 4)
+
+def test_sold_refresh_runs_in_the_background(tmp_path):
+    async def run():
+        ours = make_pipeline(tmp_path, sold_refresh_interval=0.05)
+        theirs = make_pipeline(tmp_path)
+        await ours.start()
+        await theirs.start()
+        await theirs.submit('theirs', 'session', [CartItem(BOOT, 5)])
+        await confirmed(theirs, 1)
+        await asyncio.sleep(0.2)
+        available = ours.available(BOOT)
+        await ours.stop()
+        await theirs.stop()
+        return available
+
+    assert asyncio.run(run()) == 0
+
+def test_subtract_keeps_items_added_after_the_order():
+    products = {SHOE.id: SHOE, BOOT.id: BOOT}
+    changes = []
+    cart = CartManager(products.get, on_change=changes.append)
+    cart.add_item(SHOE, 2)
+    ordered = {line.product_id: line.quantity for line in order_lines(cart.get_items())}
+    # Added while the order was being stored
+    cart.add_item(SHOE, 1)
+    cart.add_item(BOOT, 1)
+    changes.clear()
+    cart.subtract(ordered)
+    assert cart.get_quantities() == {SHOE.id: 1, BOOT.id: 1}
+    assert len(changes) == 1
+    cart.subtract({SHOE.id: 1, 'gone': 3})
+    assert cart.get_quantities() == {BOOT.id: 1}
+    changes.clear()
+    cart.subtract({'gone': 1})
+    assert not changes
@@ -0,0 +1,136 @@
+"""Incremental search index updates must match a full rebuild"""
+
+import dataclasses
+import random
+
+import numpy as np
+import pytest
+
+from core.columnar import ProductColumns
+from core.search import SearchEngine
+from models.product import Product
+
+WORDS = ['air', 'zoom', 'pegasus', 'react', 'flyknit', 'court', 'trail', 'metcon', 'dunk', 'foam', 'mesh', 'grip']
+QUERIES = ['zoom', 'pegasus', 'air pe', 'quasar', 'glow', 'cushioning', 'pegasos', 'court fom', 'zzzz']
+
+def make_catalog(count: int, rng: random.Random):
+    return [
+        Product(
+            id=f'sku-{i}',
+            name='Nike ' + ' '.join(rng.sample(WORDS, 3)),
+            price=round(rng.uniform(40, 300), 2),
+            category=rng.choice(['running', 'basketball', 'training']),
+            description=' '.join(rng.choices(WORDS, k=8))
+        )
+        for i in range(count)
+    ]
+
+def change(products, changes: int, rng: random.Random, tag: str):
+    """Reprice, rename, redescribe, remove and add products, shifting the rows of the rest"""
+    products = list(products)
+    for i in range(changes):
+        pos = rng.randrange(len(products))
+        kind = i % 5
+        if kind == 0:
+            products[pos] = dataclasses.replace(products[pos], price=products[pos].price + 1)
+        elif kind == 1:
+            products[pos] = dataclasses.replace(products[pos], name=f'Nike Quasar {tag}{i}')
+        elif kind == 2:
+            products[pos] = dataclasses.replace(products[pos], description='glowing cushioned foam')
+        elif kind == 3:
+            products.pop(pos)
+        else:
+            products.insert(pos, dataclasses.replace(products[pos], id=f'{tag}-{i}', name='Nike Quasar Glow'))
+    return products
+
+def assert_same_results(engine: SearchEngine, products: ProductColumns):
+    rebuilt = SearchEngine(products)
+    assert len(engine) == len(rebuilt) == len(products)
+    for query in QUERIES:
+        result, expected = engine.search(query), rebuilt.search(query)
+        assert sorted(result.rows.tolist()) == sorted(expected.rows.tolist()), query
+        assert result.fuzzy == expected.fuzzy, query
+        # Rows hold the current product, and scores only drift with the average document length
+        scores = dict(zip(result.rows.tolist(), result.scores.tolist()))
+        np.testing.assert_allclose(
+            [scores[row] for row in expected.rows.tolist()], expected.scores, rtol=1e-2, err_msg=query
+        )
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_updated_matches_rebuild(seed):
+    rng = random.Random(seed)
+    products = make_catalog(500, rng)
+    engine = SearchEngine(ProductColumns.from_products(products))
+    # Several refreshes in a row, so changes carried in the side segment get moved and replaced too
+    for refresh in range(3):
+        products = change(products, 20, rng, f'r{refresh}')
+        columns = ProductColumns.from_products(products)
+        engine = engine.updated(columns, rebuild_share=1.0)
+        assert engine.products is columns
+        assert engine._delta
+        assert_same_results(engine, columns)
+
+def test_updated_leaves_previous_engine_untouched():
+    rng = random.Random(4)
+    products = make_catalog(200, rng)
+    columns = ProductColumns.from_products(products)
+    engine = SearchEngine(columns)
+    before = {query: engine.search(query).rows.tolist() for query in QUERIES}
+    engine._cache.clear()
+    engine.updated(ProductColumns.from_products(change(products, 30, rng, 'x')), rebuild_share=1.0)
+    assert {query: engine.search(query).rows.tolist() for query in QUERIES} == before
+
+def test_updated_rebuilds_when_too_much_changed():
+    rng = random.Random(5)
+    products = make_catalog(200, rng)
+    engine = SearchEngine(ProductColumns.from_products(products))
+    columns = ProductColumns.from_products(change(products, 50, rng, 'y'))
+    rebuilt = engine.updated(columns, rebuild_share=0.05)
+    assert not rebuilt._delta
+    assert_same_results(rebuilt, columns)
+
+def typing(query: str):
+    return [query[:end] for end in range(1, len(query) + 1)]
+
+@pytest.mark.parametrize('seed', [6, 7])
+def test_refine_matches_a_full_search(seed):
+    rng = random.Random(seed)
+    products = change(make_catalog(800, rng), 40, rng, 'z')
+    columns = ProductColumns.from_products(products)
+    # A side segment too, so refinement covers both segments
+    engine = SearchEngine(ProductColumns.from_products(make_catalog(800, random.Random(seed)))).updated(columns, rebuild_share=1.0)
+    candidates = np.flatnonzero(columns.prices < 150).astype(np.int32)
+    refined = 0
+    for typed in ['air pegasus foam', 'quasar glow', 'court trial', 'mesh running', 'zoom zoom react']:
+        for within in (None, candidates):
+            # Refine keystroke by keystroke, as typing does, falling back to a full search
+            previous = None
+            for query in typing(typed):
+                engine._cache.clear()
+                result = engine.refine(query, previous) if previous is not None else None
+                expected = engine.search(query, within)
+                if result is None:
+                    previous = expected
+                    continue
+                refined += 1
+                assert result.rows.tolist() == expected.rows.tolist(), query
+                np.testing.assert_array_equal(result.scores, expected.scores)
+                np.testing.assert_array_equal(result.partial, expected.partial)
+                assert result.terms == expected.terms
+                # Answered from the cache as well
+                cached = engine.refine(query, previous)
+                assert cached.rows.tolist() == expected.rows.tolist(), query
+                previous = result
+    assert refined > 40
+
+def test_refine_declines_what_it_cannot_narrow():
+    engine = SearchEngine(ProductColumns.from_products(make_catalog(300, random.Random(8))))
+    air = engine.search('air')
+    # 'me' also matches 'metcon', which 'mes' does not
+    assert engine.refine('me', engine.search('mes')) is None
+    assert engine.refine('mes', engine.search('me')) is not None
+    assert engine.refine('air', engine.search('zoom')) is None
+    # Typos fall back to a full search, whose fuzzy matches need not be among the previous rows
+    assert engine.refine('airx', air) is None
+    assert engine.refine('zoom', engine.search('zooom')) is None
+    assert engine.refine('air zoom', air) is not None
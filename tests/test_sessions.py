@@ -0,0 +1,99 @@
+"""Cart expiry, renewal on access and the cart cap"""
+
+import pytest
+
+from core.sessions import CartStore
+from models.product import Product
+
+SHOE = Product(id='1', name='Pegasus', price=120.0, category='running', description='')
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def make_store(clock, **kwargs) -> CartStore:
+    kwargs.setdefault('cart_ttl', 100)
+    kwargs.setdefault('empty_ttl', 10)
+    return CartStore({SHOE.id: SHOE}.get, clock=clock, **kwargs)
+
+def test_empty_and_filled_carts_expire_after_their_ttl(clock):
+    store = make_store(clock)
+    store.get('empty')
+    store.get('filled').add_item(SHOE)
+    clock.now += 9
+    assert store.expire() == 0
+    clock.now += 2
+    assert store.expire() == 1
+    assert store.peek('empty') is None and store.peek('filled') is not None
+    clock.now += 88
+    assert store.expire() == 0
+    clock.now += 2
+    assert store.expire() == 1
+    assert len(store) == 0
+    assert store.metrics().expired_total == 2
+
+def test_access_restarts_the_idle_timer(clock):
+    store = make_store(clock)
+    store.get('session').add_item(SHOE)
+    for _ in range(5):
+        clock.now += 60
+        store.get('session')
+        assert store.expire() == 0
+    clock.now += 99
+    assert store.expire() == 0
+    clock.now += 2
+    assert store.expire() == 1
+
+def test_small_touches_still_count(clock):
+    # Touches closer together than 1% of the ttl push no heap entry, but move the deadline
+    store = make_store(clock, cart_ttl=1000, empty_ttl=1000)
+    store.get('session')
+    clock.now += 5
+    store.touch('session')
+    clock.now += 996
+    assert store.expire() == 0
+    clock.now += 5
+    assert store.expire() == 1
+
+def test_emptied_cart_falls_back_to_the_empty_ttl(clock):
+    store = make_store(clock)
+    cart = store.get('session')
+    cart.add_item(SHOE)
+    clock.now += 50
+    assert store.expire() == 0
+    cart.remove_item(SHOE.id)
+    clock.now += 1
+    assert store.expire() == 1
+
+def test_cap_evicts_the_cart_closest_to_expiry(clock):
+    store = make_store(clock, max_carts=3)
+    store.get('filled').add_item(SHOE)
+    clock.now += 1
+    store.get('old-empty')
+    clock.now += 1
+    store.get('new-empty')
+    clock.now += 1
+    store.get('newcomer')
+    assert len(store) == 3
+    assert store.peek('old-empty') is None
+    assert {'filled', 'new-empty', 'newcomer'} == set(store._carts)
+    assert store.metrics().evicted_total == 1
+
+def test_heap_stays_bounded_under_repeated_touches(clock):
+    store = make_store(clock)
+    for i in range(100):
+        store.get(f's{i}')
+    for _ in range(50):
+        clock.now += 1
+        for i in range(100):
+            store.touch(f's{i}')
+    assert len(store._heap) <= 2 * len(store) + 64
+    clock.now += 11
+    assert store.expire() == 100
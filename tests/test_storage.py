@@ -0,0 +1,130 @@
+"""Write coalescing and cross-worker visibility of the SQLite cart backend"""
+
+import asyncio
+
+from core.storage import SQLiteCartBackend
+
+def make_backend(tmp_path, **kwargs) -> SQLiteCartBackend:
+    kwargs.setdefault('flush_interval', 0.02)
+    return SQLiteCartBackend(str(tmp_path / 'carts.db'), **kwargs)
+
+def record_writes(backend: SQLiteCartBackend) -> list:
+    """Replace the executor-side write with one that also records each batch"""
+    batches = []
+    write = backend._write
+
+    def recording_write(pending, touches, now):
+        batches.append((dict(pending), set(touches)))
+        write(pending, touches, now)
+
+    backend._write = recording_write
+    return batches
+
+def test_burst_of_changes_is_one_write(tmp_path):
+    async def run():
+        backend = make_backend(tmp_path)
+        batches = record_writes(backend)
+        await backend.start()
+        for quantity in range(1, 21):
+            backend.save('a', {'1': quantity})
+        backend.save('b', {'2': 1})
+        backend.touch('a')
+        backend.touch('c')
+        backend.save('d', {'3': 1})
+        backend.delete('d')
+        await asyncio.sleep(0.1)
+        rows = backend._connection.execute('SELECT session_id, items FROM carts ORDER BY session_id').fetchall()
+        await backend.close()
+        return batches, rows
+
+    batches, rows = asyncio.run(run())
+    assert len(batches) == 1
+    pending, touches = batches[0]
+    assert pending['a'] == {'1': 20}
+    assert set(pending) == {'a', 'b', 'd'}
+    assert touches == {'a', 'c'}
+    assert rows == [('a', '{"1":20}'), ('b', '{"2":1}')]
+
+def test_reads_see_pending_writes_before_the_flush(tmp_path):
+    async def run():
+        backend = make_backend(tmp_path, flush_interval=60)
+        await backend.start()
+        backend.save('a', {'1': 2})
+        saved = await backend.load('a')
+        backend.delete('a')
+        deleted = await backend.load('a')
+        await backend.close()
+        return saved, deleted
+
+    assert asyncio.run(run()) == ({'1': 2}, None)
+
+def test_other_worker_sees_changes_once_its_cache_expires(tmp_path):
+    async def run():
+        ours = make_backend(tmp_path)
+        theirs = make_backend(tmp_path, cache_ttl=0.2)
+        await ours.start()
+        await theirs.start()
+        seen = [await theirs.load('a')]
+        ours.save('a', {'1': 1})
+        await ours.flush()
+        # Still within their cache ttl for 'a'
+        seen.append(await theirs.load('a'))
+        await asyncio.sleep(0.25)
+        seen.append(await theirs.load('a'))
+        ours.delete('a')
+        await ours.flush()
+        await asyncio.sleep(0.25)
+        seen.append(await theirs.load('a'))
+        await ours.close()
+        await theirs.close()
+        return seen
+
+    assert asyncio.run(run()) == [None, None, {'1': 1}, None]
+
+def test_purge_removes_idle_carts_of_every_worker(tmp_path):
+    async def run():
+        ours = make_backend(tmp_path)
+        theirs = make_backend(tmp_path)
+        await ours.start()
+        await theirs.start()
+        ours.save('idle', {'1': 1})
+        theirs.save('active', {'2': 1})
+        await ours.flush()
+        await theirs.flush()
+        await asyncio.sleep(0.3)
+        theirs.touch('active')
+        await theirs.flush()
+        removed = await theirs.purge(0.2)
+        loaded = await ours.load('idle'), await theirs.load('idle'), await ours.load('active')
+        await ours.close()
+        await theirs.close()
+        return removed, loaded
+
+    removed, loaded = asyncio.run(run())
+    assert removed == 1
+    # Our cache still held 'idle' from the save; it is trusted until it expires
+    assert loaded == ({'1': 1}, None, {'2': 1})
+
+def test_failed_flush_keeps_the_batch(tmp_path):
+    async def run():
+        backend = make_backend(tmp_path, flush_interval=60)
+        await backend.start()
+        write = backend._write
+
+        def failing_write(pending, touches, now):
+            raise OSError('disk full')
+
+        backend._write = failing_write
+        backend.save('a', {'1': 1})
+        try:
+            await backend.flush()
+        except OSError:
+            pass
+        backend.save('b', {'2': 1})
+        backend._write = write
+        await backend.flush()
+        rows = backend._connection.execute('SELECT session_id FROM carts ORDER BY session_id').fetchall()
+        await backend.close()
+        return rows
+
+    assert asyncio.run(run()) == [('a',), ('b',)]